@@ -4,9 +4,17 @@ KudoTrio's Flask app.
 
 
 # Imports
-from src import app
+import os
+from src import create_app
+
+
+# Create the app
+app = create_app()
 
 
 # Run the app
 if __name__ == '__main__':
+    # The development server shows the query stats in the browser
+    app.config['SERVER_TIMING'] = (
+        os.getenv('SERVER_TIMING', 'true').lower() == 'true')
     app.run(debug=True, host='0.0.0.0')
@@ -0,0 +1,341 @@
+"""
+Benchmarks - Routes
+Measures the latency and SQL query count of the main pages, in process,
+through the Flask test client.
+
+For every dataset size the database is seeded with seed_db, the admin user
+logs in, and every route is requested a number of times. The p50, p95 and
+p99 latency and the queries per request are compared with the baseline in
+benchmarks/baseline.json, and the run fails when a route got slower or
+runs more queries.
+
+Usage:
+    python -m benchmarks.routes                    # small and medium
+    python -m benchmarks.routes --sizes large
+    python -m benchmarks.routes --update-baseline  # save a new baseline
+"""
+
+# Imports
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# Datasets, as seed_db options
+SIZES = {
+    "small": {"users": 50, "departments": 5, "kudos": 1000},
+    "medium": {"users": 1000, "departments": 20, "kudos": 50000},
+    "large": {"users": 10000, "departments": 40, "kudos": 500000},
+}
+DEFAULT_SIZES = ("small", "medium")
+SEED = 1
+
+# Routes, the profile is the one of the user who received the most kudos
+ROUTES = (
+    "/kudos",
+    "/kudos/create",
+    "/profile/<id>",
+    "/settings/users",
+    "/settings/departments",
+)
+
+# A route regresses when its p95 latency grows by more than the tolerance
+# and by more than the noise floor, or when it runs more queries
+DEFAULT_TOLERANCE = 0.25
+NOISE_FLOOR_MS = 2.0
+
+# Meme templates served from a snapshot, so no request waits on the network
+MEME_TEMPLATES = [
+    {"id": "buzz", "name": "X, X Everywhere",
+     "url": "https://api.memegen.link/templates/buzz"},
+    {"id": "fry", "name": "Futurama Fry",
+     "url": "https://api.memegen.link/templates/fry"},
+]
+
+
+# Function - Percentile
+def percentile(values, percent):
+    """
+    Returns the nearest-rank percentile of the values.
+    """
+
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * percent // 100))
+    return ordered[int(rank) - 1]
+
+
+# Function - Summarize
+def summarize(durations, query_counts):
+    """
+    Returns the latency percentiles in milliseconds and the queries per
+    request of a route.
+    """
+
+    milliseconds = [duration * 1000 for duration in durations]
+    return {
+        "p50_ms": round(percentile(milliseconds, 50), 3),
+        "p95_ms": round(percentile(milliseconds, 95), 3),
+        "p99_ms": round(percentile(milliseconds, 99), 3),
+        # The median, so a cache expiring during the run is not counted
+        "queries": percentile(query_counts, 50),
+        "requests": len(durations),
+    }
+
+
+# Function - Compare Results
+def compare_results(results, baseline, tolerance=DEFAULT_TOLERANCE,
+                    noise_floor_ms=NOISE_FLOOR_MS):
+    """
+    Returns a message for every route that regressed against the baseline.
+    Routes and sizes missing from the baseline are skipped.
+    """
+
+    regressions = []
+    for size, routes in results.items():
+        for route, current in routes.items():
+            previous = baseline.get(size, {}).get(route)
+            if previous is None:
+                continue
+
+            limit = max(previous["p95_ms"] * (1 + tolerance),
+                        previous["p95_ms"] + noise_floor_ms)
+            if current["p95_ms"] > limit:
+                regressions.append(
+                    f"{size} {route}: p95 {current['p95_ms']:.1f} ms, "
+                    f"baseline {previous['p95_ms']:.1f} ms"
+                )
+            if current["queries"] > previous["queries"]:
+                regressions.append(
+                    f"{size} {route}: {current['queries']} queries, "
+                    f"baseline {previous['queries']}"
+                )
+    return regressions
+
+
+# Function - Prepare App
+def _prepare_app(work_dir):
+    """
+    Returns the app set up for benchmarking, with its database in the work
+    folder instead of the development database.
+    """
+
+    snapshot_path = os.path.join(work_dir, "meme_templates.json")
+    with open(snapshot_path, "w") as snapshot_file:
+        json.dump({"fetched_at": time.time(), "templates": MEME_TEMPLATES},
+                  snapshot_file)
+
+    from src import create_app
+
+    return create_app({
+        "TESTING": True,
+        "WTF_CSRF_ENABLED": False,
+        "SECRET_KEY": os.getenv("SECRET_KEY") or "benchmarks",
+        "SQLITE_LOCATION": work_dir,
+        "MEME_TEMPLATES_SNAPSHOT": snapshot_path,
+        "MEME_CACHE_DIR": os.path.join(work_dir, "meme_cache"),
+        "IDENTITY_CACHE_STAMP": os.path.join(work_dir, "identity.stamp"),
+        "DEPARTMENT_USER_COUNT_STAMP": os.path.join(
+            work_dir, "department_user_count.stamp"),
+    })
+
+
+# Function - Seed Size
+def _seed_size(app, size):
+    """
+    Rebuilds the database with the dataset of the size and returns the id
+    of the user who received the most kudos.
+    """
+
+    from src import db
+    from src.models import KudoUserCount
+    from src.cli_commands.seed import seed_database
+    from src.kudos.rollups import rebuild_kudo_rollups
+    from src.kudos.dashboard_cache import clear_fragments
+    from src.settings.get_department_user_count import (
+        invalidate_department_user_count,
+    )
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed_database(seed=SEED, **SIZES[size])
+        rebuild_kudo_rollups()
+        clear_fragments()
+        invalidate_department_user_count()
+        return (
+            db.session.query(KudoUserCount.user_id)
+            .order_by(KudoUserCount.received_count.desc(),
+                      KudoUserCount.user_id)
+            .limit(1)
+            .scalar()
+        )
+
+
+# Function - Benchmark Route
+def _benchmark_route(app, client, url, requests, warmup):
+    """
+    Requests the URL and returns the duration and query count of every
+    timed request.
+    """
+
+    from sqlalchemy import event
+    from src import db
+
+    with app.app_context():
+        engine = db.engine
+    query_count = [0]
+
+    def count_query(*args):
+        query_count[0] += 1
+
+    for _ in range(warmup):
+        client.get(url).close()
+    # Leftovers from the warmup and earlier routes are not this route's cost
+    gc.collect()
+
+    durations = []
+    query_counts = []
+    event.listen(engine, "before_cursor_execute", count_query)
+    try:
+        for _ in range(requests):
+            query_count[0] = 0
+            start = time.perf_counter()
+            response = client.get(url)
+            response.get_data()
+            durations.append(time.perf_counter() - start)
+            query_counts.append(query_count[0])
+            if response.status_code != 200:
+                raise RuntimeError(
+                    f"{url} returned {response.status_code}")
+            response.close()
+    finally:
+        event.remove(engine, "before_cursor_execute", count_query)
+
+    return durations, query_counts
+
+
+# Function - Run Benchmarks
+def run_benchmarks(sizes, requests, warmup, log=print):
+    """
+    Seeds each dataset size and benchmarks every route.
+    Returns the summaries by size and route.
+    """
+
+    work_dir = tempfile.mkdtemp(prefix="kudotrio-benchmarks-")
+    app = _prepare_app(work_dir)
+
+    results = {}
+    try:
+        for size in sizes:
+            log(f"Seeding {size} dataset: {SIZES[size]}")
+            profile_user_id = _seed_size(app, size)
+
+            client = app.test_client()
+            response = client.post("/login", data={
+                "email": "admin@healthtrio.com",
+                "password": "admin@healthtrio.com",
+            }, follow_redirects=True)
+            if b"Login successful." not in response.data:
+                raise RuntimeError("Could not log in as the admin user.")
+
+            results[size] = {}
+            for route in ROUTES:
+                url = route.replace("<id>", str(profile_user_id))
+                durations, query_counts = _benchmark_route(
+                    app, client, url, requests, warmup)
+                summary = summarize(durations, query_counts)
+                results[size][route] = summary
+                log(f"  {route:<24} p50 {summary['p50_ms']:>9.2f} ms  "
+                    f"p95 {summary['p95_ms']:>9.2f} ms  "
+                    f"p99 {summary['p99_ms']:>9.2f} ms  "
+                    f"{summary['queries']:>3} queries")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return results
+
+
+# Function - Environment
+def _environment():
+    """
+    Returns what the results were measured on, saved with the baseline.
+    """
+
+    return {
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "machine": platform.machine(),
+        "seed": SEED,
+    }
+
+
+# Function - Main
+def main(argv=None):
+    """
+    Runs the benchmarks from the command line.
+    Returns 1 when a route regressed against the baseline.
+    """
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--sizes", default=",".join(DEFAULT_SIZES),
+                        help="comma separated sizes: "
+                             + ", ".join(SIZES))
+    parser.add_argument("--requests", type=int, default=100,
+                        help="timed requests per route")
+    parser.add_argument("--warmup", type=int, default=5,
+                        help="untimed requests per route")
+    parser.add_argument("--baseline", default=BASELINE_PATH,
+                        help="baseline JSON file")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed p95 slowdown, 0.25 is 25%%")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="save the results as the new baseline")
+    args = parser.parse_args(argv)
+
+    sizes = [size.strip() for size in args.sizes.split(",") if size.strip()]
+    unknown = [size for size in sizes if size not in SIZES]
+    if unknown:
+        parser.error(f"unknown sizes: {', '.join(unknown)}")
+
+    results = run_benchmarks(sizes, args.requests, args.warmup)
+
+    try:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+    except FileNotFoundError:
+        baseline = {"environment": _environment(), "results": {}}
+
+    if args.update_baseline:
+        baseline["environment"] = _environment()
+        baseline["results"].update(results)
+        with open(args.baseline, "w") as baseline_file:
+            json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+            baseline_file.write("\n")
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if baseline["environment"] != _environment():
+        print("Warning: the baseline was measured on "
+              f"{baseline['environment']}, latencies may not compare.")
+
+    regressions = compare_results(results, baseline["results"],
+                                  tolerance=args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if regressions:
+        return 1
+    print("No regressions against the baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+"""
+Benchmarks - Startup
+Measures how long a new worker process takes to start: importing the src
+package, building the app with create_app and serving its first request.
+
+Every run starts a new Python process, so nothing is reused from an
+earlier run, as when a prefork server boots or recycles a worker. The run
+fails when the web app imports a module that only CLI commands need.
+
+Usage:
+    python -m benchmarks.startup
+    python -m benchmarks.startup --runs 20 --imports 20
+"""
+
+# Imports
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from benchmarks.routes import percentile
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules only CLI commands need, the web app must not import them
+CLI_ONLY_MODULES = ("faker", "alembic", "flask_migrate")
+
+PHASES = ("import_ms", "create_app_ms", "first_request_ms", "total_ms")
+
+# Run in the new process, with the work folder as its argument
+STARTUP_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import src
+imported = time.perf_counter()
+app = src.create_app({"TESTING": True, "SECRET_KEY": "startup",
+                      "SQLITE_LOCATION": sys.argv[1]})
+created = time.perf_counter()
+app.test_client().get("/login").close()
+served = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "create_app_ms": (created - imported) * 1000,
+    "first_request_ms": (served - created) * 1000,
+    "total_ms": (served - start) * 1000,
+    "modules": sorted(name for name in sys.modules if "." not in name),
+}))
+"""
+
+
+# Function - Measure Startup
+def measure_startup(work_dir, importtime=False):
+    """
+    Starts a new process that builds the app and serves one request.
+    Returns the phase durations and the top level modules it imported, and
+    the -X importtime report when asked for.
+    """
+
+    command = [sys.executable, "-c", STARTUP_SCRIPT, work_dir]
+    if importtime:
+        command[1:1] = ["-X", "importtime"]
+    process = subprocess.run(command, cwd=ROOT, capture_output=True,
+                             text=True, check=True)
+    return json.loads(process.stdout.splitlines()[-1]), process.stderr
+
+
+# Function - Slowest Imports
+def slowest_imports(report, count, max_depth=1):
+    """
+    Returns the name and cumulative milliseconds of the slowest imports in
+    a -X importtime report, down to the given nesting depth.
+    """
+
+    imports = []
+    for line in report.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth <= max_depth:
+            imports.append((name.strip(), int(cumulative) / 1000))
+    imports.sort(key=lambda item: item[1], reverse=True)
+    return imports[:count]
+
+
+# Function - Main
+def main(argv=None):
+    """
+    Runs the startup benchmark from the command line.
+    Returns 1 when the web app imported a CLI only module.
+    """
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--runs", type=int, default=10,
+                        help="processes started")
+    parser.add_argument("--imports", type=int, default=15,
+                        help="slowest imports listed, 0 to skip")
+    args = parser.parse_args(argv)
+
+    work_dir = tempfile.mkdtemp(prefix="kudotrio-startup-")
+    try:
+        # The first run warms the disk cache and writes the bytecode
+        measure_startup(work_dir)
+        runs = [measure_startup(work_dir)[0] for _ in range(args.runs)]
+        if args.imports:
+            report = measure_startup(work_dir, importtime=True)[1]
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    for phase in PHASES:
+        durations = [run[phase] for run in runs]
+        print(f"{phase[:-3]:<16} p50 {percentile(durations, 50):>8.1f} ms  "
+              f"min {min(durations):>8.1f} ms  "
+              f"max {max(durations):>8.1f} ms")
+
+    if args.imports:
+        print("\nSlowest imports of one run:")
+        for name, cumulative in slowest_imports(report, args.imports):
+            print(f"  {cumulative:>8.1f} ms  {name}")
+
+    imported = [name for name in CLI_ONLY_MODULES
+                if name in runs[0]["modules"]]
+    if imported:
+        print(f"\nFAILED the web app imported CLI only modules: "
+              f"{', '.join(imported)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,65 @@
+"""kudo search index
+
+Revision ID: 6d4e218a5639
+Revises: 82af4e0681fb
+Create Date: 2026-10-18 13:24:11.405505
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '6d4e218a5639'
+down_revision = '82af4e0681fb'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The search index is SQLite only, other databases use LIKE filters
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    op.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS kudo_search USING fts5(
+            kudo_message,
+            content = 'kudos',
+            content_rowid = 'id',
+            tokenize = 'porter unicode61 remove_diacritics 2'
+        )
+    """)
+    op.execute("""
+        CREATE TRIGGER IF NOT EXISTS kudo_search_insert
+        AFTER INSERT ON kudos BEGIN
+            INSERT INTO kudo_search (rowid, kudo_message)
+            VALUES (NEW.id, NEW.kudo_message);
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER IF NOT EXISTS kudo_search_update
+        AFTER UPDATE OF kudo_message ON kudos BEGIN
+            INSERT INTO kudo_search (kudo_search, rowid, kudo_message)
+            VALUES ('delete', OLD.id, OLD.kudo_message);
+            INSERT INTO kudo_search (rowid, kudo_message)
+            VALUES (NEW.id, NEW.kudo_message);
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER IF NOT EXISTS kudo_search_delete
+        AFTER DELETE ON kudos BEGIN
+            INSERT INTO kudo_search (kudo_search, rowid, kudo_message)
+            VALUES ('delete', OLD.id, OLD.kudo_message);
+        END
+    """)
+
+    op.execute("INSERT INTO kudo_search (kudo_search) VALUES ('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    for trigger in ['kudo_search_insert', 'kudo_search_update',
+                    'kudo_search_delete']:
+        op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+    op.execute('DROP TABLE IF EXISTS kudo_search')
@@ -0,0 +1,93 @@
+"""user search index
+
+Revision ID: 82af4e0681fb
+Revises: 45bed77ecd16
+Create Date: 2026-10-18 13:22:15.198427
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '82af4e0681fb'
+down_revision = '45bed77ecd16'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The search index is SQLite only, other databases use LIKE filters
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    op.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS user_search USING fts5(
+            firstname, lastname, email, department,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '1 2 3'
+        )
+    """)
+    op.execute("""
+        CREATE TRIGGER IF NOT EXISTS user_search_user_insert
+        AFTER INSERT ON users BEGIN
+            INSERT INTO user_search (rowid, firstname, lastname, email,
+                                     department)
+            SELECT NEW.id, NEW.firstname, NEW.lastname, NEW.email,
+                   (SELECT name FROM departments
+                    WHERE id = NEW.department_id);
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER IF NOT EXISTS user_search_user_update
+        AFTER UPDATE OF firstname, lastname, email, department_id ON users
+        BEGIN
+            DELETE FROM user_search WHERE rowid = OLD.id;
+            INSERT INTO user_search (rowid, firstname, lastname, email,
+                                     department)
+            SELECT NEW.id, NEW.firstname, NEW.lastname, NEW.email,
+                   (SELECT name FROM departments
+                    WHERE id = NEW.department_id);
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER IF NOT EXISTS user_search_user_delete
+        AFTER DELETE ON users BEGIN
+            DELETE FROM user_search WHERE rowid = OLD.id;
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER IF NOT EXISTS user_search_department_update
+        AFTER UPDATE OF name ON departments BEGIN
+            UPDATE user_search SET department = NEW.name
+            WHERE rowid IN (SELECT id FROM users
+                            WHERE department_id = NEW.id);
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER IF NOT EXISTS user_search_department_delete
+        AFTER DELETE ON departments BEGIN
+            UPDATE user_search SET department = NULL
+            WHERE rowid IN (SELECT id FROM users
+                            WHERE department_id = OLD.id);
+        END
+    """)
+
+    op.execute(
+        "INSERT INTO user_search (rowid, firstname, lastname, email, "
+        "department) "
+        "SELECT users.id, users.firstname, users.lastname, users.email, "
+        "departments.name FROM users "
+        "LEFT JOIN departments ON departments.id = users.department_id"
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    for trigger in ['user_search_user_insert', 'user_search_user_update',
+                    'user_search_user_delete',
+                    'user_search_department_update',
+                    'user_search_department_delete']:
+        op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+    op.execute('DROP TABLE IF EXISTS user_search')
@@ -0,0 +1,33 @@
+"""user search vocabulary
+
+Revision ID: a3c1e5f27d90
+Revises: 53b96dc55c0b
+Create Date: 2026-10-18 15:02:44.318502
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c1e5f27d90'
+down_revision = '53b96dc55c0b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The search index is SQLite only, other databases use LIKE filters
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    op.execute(
+        'CREATE VIRTUAL TABLE IF NOT EXISTS user_search_vocab '
+        'USING fts5vocab(user_search, row)'
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    op.execute('DROP TABLE IF EXISTS user_search_vocab')
@@ -1,5 +1,9 @@
 """
 KudoTrio's configuration and settings for the Flask app.
+
+The app is built by create_app. Importing this package only creates the
+extensions, so the blueprints and models are loaded when an app is built,
+and dependencies only some CLI commands need are loaded when they run.
 """
 
 # Imports
@@ -7,68 +11,261 @@ import os
 from dotenv import load_dotenv
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
 from flask_login import LoginManager
 from flask_mail import Mail
+from werkzeug.middleware.proxy_fix import ProxyFix
+from src.database.database import (
+    database_url,
+    engine_options,
+    configure_engine,
+    include_in_migrations,
+)
+from src.database.query_stats import instrument_engine, init_query_stats
+from src.assets.assets import init_assets
 
 
 # Read .env file
 load_dotenv()
-SECRET_KEY = os.getenv("SECRET_KEY")
-EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
 
 
-# SQLite database
-SQLITE_LOCATION = os.getenv(
-    "SQLITE_LOCATION", os.path.abspath(os.path.dirname(__file__))
-)
+# Extensions, bound to the app by create_app
+db = SQLAlchemy()
+login_manager = LoginManager()
+login_manager.login_view = "users.login"
+mail = Mail()
 
 
-# Flask initialization
-app = Flask(__name__)
-basedir = SQLITE_LOCATION
-app.config["SECRET_KEY"] = SECRET_KEY
-app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + os.path.join(
-    basedir, "database.db"
-)
+# Function - Default Config
+def default_config(sqlite_location=None):
+    """
+    Returns the app settings read from the environment. The SQLite
+    database and the cache files are kept in the SQLite location.
+    """
 
+    # SQLite database
+    basedir = sqlite_location or os.getenv(
+        "SQLITE_LOCATION", os.path.abspath(os.path.dirname(__file__))
+    )
 
-# Database initialization
-db = SQLAlchemy(app)
+    return {
+        "SECRET_KEY": os.getenv("SECRET_KEY"),
+        "SQLITE_LOCATION": basedir,
 
+        # Database configuration
+        "SQLALCHEMY_DATABASE_URI": os.getenv(
+            "DATABASE_URL", "sqlite:///" + os.path.join(basedir, "database.db")
+        ),
+        "DATABASE_POOL_SIZE": int(os.getenv("DATABASE_POOL_SIZE", 5)),
+        "DATABASE_MAX_OVERFLOW": int(os.getenv("DATABASE_MAX_OVERFLOW", 10)),
+        "DATABASE_POOL_RECYCLE": int(os.getenv("DATABASE_POOL_RECYCLE", 1800)),
+        "DATABASE_STATEMENT_TIMEOUT": float(
+            os.getenv("DATABASE_STATEMENT_TIMEOUT", 0)
+        ),
+        "SQLITE_BUSY_TIMEOUT": int(os.getenv("SQLITE_BUSY_TIMEOUT", 5000)),
+        "SQLITE_CACHE_SIZE_KB": int(os.getenv("SQLITE_CACHE_SIZE_KB", 20000)),
 
-# Migrations initialization
-Migrate(app, db)
+        # Query instrumentation configuration
+        "SLOW_QUERY_THRESHOLD_MS": float(
+            os.getenv("SLOW_QUERY_THRESHOLD_MS", 200)
+        ),
+        "SLOW_QUERY_LOG": os.getenv("SLOW_QUERY_LOG", ""),
+        "N_PLUS_ONE_THRESHOLD": int(os.getenv("N_PLUS_ONE_THRESHOLD", 10)),
+        "SERVER_TIMING": os.getenv("SERVER_TIMING", "false").lower() == "true",
 
+        # Meme generator configuration
+        "MEMEGEN_API_URL": os.getenv(
+            "MEMEGEN_API_URL", "https://api.memegen.link"
+        ).rstrip("/"),
+        "MEME_TEMPLATES_TTL": int(os.getenv("MEME_TEMPLATES_TTL", 3600)),
+        "MEME_TEMPLATES_TIMEOUT": float(
+            os.getenv("MEME_TEMPLATES_TIMEOUT", 3)
+        ),
+        "MEME_TEMPLATES_SNAPSHOT": os.getenv(
+            "MEME_TEMPLATES_SNAPSHOT",
+            os.path.join(basedir, "meme_templates.json"),
+        ),
+        "MEME_CACHE_DIR": os.getenv(
+            "MEME_CACHE_DIR", os.path.join(basedir, "meme_cache")
+        ),
+        "MEME_THUMBNAIL_WIDTH": int(os.getenv("MEME_THUMBNAIL_WIDTH", 400)),
+        "MEME_IMAGE_TIMEOUT": float(os.getenv("MEME_IMAGE_TIMEOUT", 10)),
+        "MEME_IMAGE_MAX_BYTES": int(
+            os.getenv("MEME_IMAGE_MAX_BYTES", 5 * 1024 * 1024)
+        ),
 
-# Login manager initialization
-login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = "users.login"
+        # Password hashing configuration
+        "PASSWORD_HASH_METHOD": os.getenv(
+            "PASSWORD_HASH_METHOD", "pbkdf2:sha256:600000"
+        ),
+        "PASSWORD_SALT_LENGTH": int(os.getenv("PASSWORD_SALT_LENGTH", 16)),
+        "PASSWORD_HASH_WORKERS": int(os.getenv("PASSWORD_HASH_WORKERS", 2)),
+        "PASSWORD_HASH_QUEUE_SIZE": int(
+            os.getenv("PASSWORD_HASH_QUEUE_SIZE", 32)
+        ),
+        "PASSWORD_HASH_TIMEOUT": float(
+            os.getenv("PASSWORD_HASH_TIMEOUT", 10)
+        ),
 
+        # Login throttle configuration
+        "LOGIN_THROTTLE_IP_BURST": int(
+            os.getenv("LOGIN_THROTTLE_IP_BURST", 20)
+        ),
+        "LOGIN_THROTTLE_IP_PER_MINUTE": float(
+            os.getenv("LOGIN_THROTTLE_IP_PER_MINUTE", 20)
+        ),
+        "LOGIN_THROTTLE_EMAIL_BURST": int(
+            os.getenv("LOGIN_THROTTLE_EMAIL_BURST", 5)
+        ),
+        "LOGIN_THROTTLE_EMAIL_PER_MINUTE": float(
+            os.getenv("LOGIN_THROTTLE_EMAIL_PER_MINUTE", 2)
+        ),
+        "LOGIN_THROTTLE_MAX_KEYS": int(
+            os.getenv("LOGIN_THROTTLE_MAX_KEYS", 10000)
+        ),
+        "LOGIN_THROTTLE_STORE": os.getenv("LOGIN_THROTTLE_STORE", ""),
 
-# Mail configuration and initialization
-mail = Mail()
-app.config['MAIL_SERVER'] = 'smtp.gmail.com'
-app.config['MAIL_PORT'] = 465
-app.config['MAIL_USE_TLS'] = False
-app.config['MAIL_USE_SSL'] = True
-app.config['MAIL_USERNAME'] = 'rodneygauna@gmail.com'
-app.config['MAIL_PASSWORD'] = EMAIL_PASSWORD
-mail.init_app(app)
-
-
-# Flask Blueprint Imports
-from src.core.views import core_bp
-from src.cli_commands.cli_commands import commands_bp
-from src.users.views import users_bp
-from src.settings.views import settings_bp
-from src.kudos.views import kudos_bp
-
-
-# Flask Blueprint Registrations
-app.register_blueprint(core_bp)
-app.register_blueprint(commands_bp)
-app.register_blueprint(users_bp)
-app.register_blueprint(settings_bp)
-app.register_blueprint(kudos_bp)
+        # Bulk user import configuration
+        "BULK_IMPORT_HASH_WORKERS": int(
+            os.getenv("BULK_IMPORT_HASH_WORKERS", os.cpu_count() or 1)
+        ),
+        "IMPORT_POLL_INTERVAL": float(os.getenv("IMPORT_POLL_INTERVAL", 5)),
+        "IMPORT_LEASE_SECONDS": int(os.getenv("IMPORT_LEASE_SECONDS", 300)),
+        "IMPORT_MAX_ATTEMPTS": int(os.getenv("IMPORT_MAX_ATTEMPTS", 3)),
+
+        # Identity cache configuration
+        "IDENTITY_CACHE_SIZE": int(os.getenv("IDENTITY_CACHE_SIZE", 1024)),
+        "IDENTITY_CACHE_TTL": int(os.getenv("IDENTITY_CACHE_TTL", 60)),
+        "IDENTITY_CACHE_STAMP": os.getenv(
+            "IDENTITY_CACHE_STAMP",
+            os.path.join(basedir, "identity_cache.stamp"),
+        ),
+
+        # Department user count cache configuration
+        "DEPARTMENT_USER_COUNT_TTL": int(
+            os.getenv("DEPARTMENT_USER_COUNT_TTL", 300)
+        ),
+        "DEPARTMENT_USER_COUNT_STAMP": os.getenv(
+            "DEPARTMENT_USER_COUNT_STAMP",
+            os.path.join(basedir, "department_user_count.stamp"),
+        ),
+
+        # Mail configuration
+        "MAIL_SERVER": "smtp.gmail.com",
+        "MAIL_PORT": 465,
+        "MAIL_USE_TLS": False,
+        "MAIL_USE_SSL": True,
+        "MAIL_USERNAME": "rodneygauna@gmail.com",
+        "MAIL_PASSWORD": os.getenv("EMAIL_PASSWORD"),
+
+        # Reverse proxy configuration, proxies trusted in front of the app
+        "PROXY_FIX_X_FOR": int(os.getenv("PROXY_FIX_X_FOR", 0)),
+        "PROXY_FIX_X_PROTO": int(os.getenv("PROXY_FIX_X_PROTO", 0)),
+        "PROXY_FIX_X_HOST": int(os.getenv("PROXY_FIX_X_HOST", 0)),
+
+        # Server configuration, for `flask serve`
+        "SERVE_BIND": os.getenv("SERVE_BIND", "0.0.0.0:8000"),
+        "SERVE_WORKERS": int(
+            os.getenv("SERVE_WORKERS", (os.cpu_count() or 1) * 2 + 1)
+        ),
+        "SERVE_THREADS": int(os.getenv("SERVE_THREADS", 4)),
+        "SERVE_MAX_REQUESTS": int(os.getenv("SERVE_MAX_REQUESTS", 1000)),
+        "SERVE_MAX_REQUESTS_JITTER": int(
+            os.getenv("SERVE_MAX_REQUESTS_JITTER", 100)
+        ),
+        "SERVE_TIMEOUT": int(os.getenv("SERVE_TIMEOUT", 60)),
+        "SERVE_GRACEFUL_TIMEOUT": int(
+            os.getenv("SERVE_GRACEFUL_TIMEOUT", 30)
+        ),
+
+        # Outbox worker configuration
+        "OUTBOX_BATCH_SIZE": int(os.getenv("OUTBOX_BATCH_SIZE", 50)),
+        "OUTBOX_POLL_INTERVAL": float(os.getenv("OUTBOX_POLL_INTERVAL", 5)),
+        "OUTBOX_MAX_ATTEMPTS": int(os.getenv("OUTBOX_MAX_ATTEMPTS", 8)),
+        "OUTBOX_BACKOFF_SECONDS": int(os.getenv("OUTBOX_BACKOFF_SECONDS", 30)),
+        "OUTBOX_BACKOFF_MAX_SECONDS": int(
+            os.getenv("OUTBOX_BACKOFF_MAX_SECONDS", 3600)
+        ),
+        "OUTBOX_LEASE_SECONDS": int(os.getenv("OUTBOX_LEASE_SECONDS", 300)),
+        "OUTBOX_DEAD_RETENTION_HOURS": int(
+            os.getenv("OUTBOX_DEAD_RETENTION_HOURS", 72)
+        ),
+    }
+
+
+# Function - Create App
+def create_app(config=None):
+    """
+    Builds the Flask app. The config overrides the settings read from the
+    environment, so tests and scripts can build apps with their own
+    database and files.
+    """
+
+    config = dict(config or {})
+
+    # Flask initialization
+    app = Flask(__name__)
+    app.config.update(default_config(config.get("SQLITE_LOCATION")))
+    app.config.update(config)
+    app.config["SQLALCHEMY_DATABASE_URI"] = database_url(
+        app.config["SQLALCHEMY_DATABASE_URI"]
+    )
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", engine_options(
+        app.config["SQLALCHEMY_DATABASE_URI"],
+        pool_size=app.config["DATABASE_POOL_SIZE"],
+        max_overflow=app.config["DATABASE_MAX_OVERFLOW"],
+        pool_recycle=app.config["DATABASE_POOL_RECYCLE"],
+    ))
+
+    # Database initialization
+    db.init_app(app)
+    with app.app_context():
+        configure_engine(
+            db.engine,
+            statement_timeout=app.config["DATABASE_STATEMENT_TIMEOUT"],
+            busy_timeout=app.config["SQLITE_BUSY_TIMEOUT"],
+            cache_size_kb=app.config["SQLITE_CACHE_SIZE_KB"],
+        )
+        instrument_engine(app, db.engine)
+    init_query_stats(app)
+
+    # Migrations initialization, only for the flask command, as Alembic is
+    # slow to import and the web workers never run migrations
+    if os.getenv("FLASK_RUN_FROM_CLI") == "true":
+        from flask_migrate import Migrate
+        Migrate(app, db, include_name=include_in_migrations)
+
+    # Login manager and mail initialization
+    login_manager.init_app(app)
+    mail.init_app(app)
+
+    # Flask Blueprint Imports
+    from src.core.views import core_bp
+    from src.cli_commands.cli_commands import commands_bp, serve_bp
+    from src.users.views import users_bp
+    from src.settings.views import settings_bp
+    from src.kudos.views import kudos_bp
+    from src.memes.views import memes_bp
+
+    # Flask Blueprint Registrations
+    app.register_blueprint(core_bp)
+    app.register_blueprint(commands_bp)
+    app.register_blueprint(serve_bp)
+    app.register_blueprint(users_bp)
+    app.register_blueprint(settings_bp)
+    app.register_blueprint(kudos_bp)
+    app.register_blueprint(memes_bp)
+
+    # Static assets built with `flask commands build_assets`
+    init_assets(app)
+
+    # Client address, scheme and host from the trusted reverse proxies, so
+    # the login throttle counts clients instead of the proxy
+    proxies = {
+        "x_for": app.config["PROXY_FIX_X_FOR"],
+        "x_proto": app.config["PROXY_FIX_X_PROTO"],
+        "x_host": app.config["PROXY_FIX_X_HOST"],
+    }
+    if any(proxies.values()):
+        app.wsgi_app = ProxyFix(app.wsgi_app, **proxies)
+
+    return app
@@ -0,0 +1,236 @@
+"""
+Assets - Static Asset Pipeline
+These are helper functions to build and serve fingerprinted static assets.
+
+build_assets copies every static file into static/dist under a name that
+contains the hash of its content, writes gzip and brotli variants of the
+text files and lists the files in static/dist/manifest.json. Relative
+url() and sourceMappingURL references in CSS and JavaScript are rewritten
+to the fingerprinted names, so a file only changes name when it or a file
+it references changes.
+
+When the manifest exists, url_for('static', ...) returns the fingerprinted
+name and the static view serves it with immutable far-future caching and
+the precompressed variant the browser accepts.
+"""
+
+# Imports
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+import brotli
+from flask import request, send_from_directory
+
+
+# Folder the built assets are written to, inside the static folder
+DIST_FOLDER = "dist"
+MANIFEST_NAME = "manifest.json"
+
+# Files worth compressing, the others are already compressed
+COMPRESSIBLE_EXTENSIONS = {
+    ".css", ".js", ".map", ".json", ".svg", ".txt", ".html", ".xml",
+    ".ico", ".ttf", ".otf", ".eot", ".webmanifest",
+}
+
+# Files whose relative references are rewritten
+REWRITTEN_EXTENSIONS = {".css", ".js"}
+
+# Precompressed variants, in order of preference
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+
+# Fingerprinted files never change, so browsers can keep them for a year
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+CSS_URL_PATTERN = re.compile(r"url\(\s*(['\"]?)([^'\")]+)\1\s*\)")
+SOURCE_MAP_PATTERN = re.compile(r"(sourceMappingURL=)(\S+?)(\s*\*/|\s*$)",
+                                re.MULTILINE)
+
+
+# Function - Fingerprinted Name
+def _fingerprinted_name(path, content):
+    """
+    Returns the path with the content hash before its extension.
+    """
+
+    root, extension = posixpath.splitext(path)
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    return f"{root}.{digest}{extension}"
+
+
+# Function - Rewrite References
+def _rewrite_references(path, content, manifest):
+    """
+    Returns the CSS or JavaScript content with its relative references
+    pointing to the fingerprinted files.
+    """
+
+    directory = posixpath.dirname(path)
+
+    def fingerprinted(reference):
+        if reference.startswith(("data:", "http:", "https:", "//", "/", "#")):
+            return reference
+        # Keep query strings and fragments, as in "font.woff2?v=6.4.0"
+        target, suffix = re.match(r"([^?#]*)(.*)", reference).groups()
+        source = posixpath.normpath(posixpath.join(directory, target))
+        if source not in manifest:
+            return reference
+        built = posixpath.relpath(manifest[source], posixpath.join(
+            DIST_FOLDER, directory))
+        return built + suffix
+
+    text = content.decode("utf-8")
+    text = CSS_URL_PATTERN.sub(
+        lambda match: "url({0}{1}{0})".format(
+            match.group(1), fingerprinted(match.group(2))),
+        text,
+    )
+    text = SOURCE_MAP_PATTERN.sub(
+        lambda match: match.group(1) + fingerprinted(match.group(2))
+        + match.group(3),
+        text,
+    )
+    return text.encode("utf-8")
+
+
+# Function - Write Compressed Variants
+def _write_compressed_variants(path, content):
+    """
+    Writes the gzip and brotli variants of a file, when they are smaller.
+    """
+
+    variants = {
+        ".gz": gzip.compress(content, compresslevel=9, mtime=0),
+        ".br": brotli.compress(content, quality=11),
+    }
+    for extension, compressed in variants.items():
+        if len(compressed) < len(content):
+            with open(path + extension, "wb") as variant_file:
+                variant_file.write(compressed)
+
+
+# Function - Build Assets
+def build_assets(static_folder):
+    """
+    Builds the fingerprinted and precompressed assets and their manifest.
+    Returns the manifest, which maps every static file to its built file.
+    """
+
+    dist_folder = os.path.join(static_folder, DIST_FOLDER)
+    shutil.rmtree(dist_folder, ignore_errors=True)
+
+    sources = []
+    for root, directories, files in os.walk(static_folder):
+        directories[:] = [
+            directory for directory in directories
+            if os.path.join(root, directory) != dist_folder
+        ]
+        for name in files:
+            full_path = os.path.join(root, name)
+            sources.append(
+                os.path.relpath(full_path, static_folder).replace(os.sep, "/")
+            )
+
+    # Referenced files first, so their fingerprinted names are known
+    sources.sort(key=lambda path: (
+        posixpath.splitext(path)[1] in REWRITTEN_EXTENSIONS,
+        path,
+    ))
+
+    manifest = {}
+    for path in sources:
+        with open(os.path.join(static_folder, path), "rb") as source_file:
+            content = source_file.read()
+        extension = posixpath.splitext(path)[1]
+        if extension in REWRITTEN_EXTENSIONS:
+            content = _rewrite_references(path, content, manifest)
+
+        built = posixpath.join(DIST_FOLDER,
+                               _fingerprinted_name(path, content))
+        built_path = os.path.join(static_folder, built)
+        os.makedirs(os.path.dirname(built_path), exist_ok=True)
+        with open(built_path, "wb") as built_file:
+            built_file.write(content)
+        if extension in COMPRESSIBLE_EXTENSIONS:
+            _write_compressed_variants(built_path, content)
+
+        manifest[path] = built
+
+    with open(os.path.join(dist_folder, MANIFEST_NAME), "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+
+    return manifest
+
+
+# Function - Load Manifest
+def load_manifest(app):
+    """
+    Returns the manifest of the built assets, or an empty one if the
+    assets were not built.
+    """
+
+    manifest_path = os.path.join(app.static_folder, DIST_FOLDER,
+                                 MANIFEST_NAME)
+    try:
+        with open(manifest_path) as manifest_file:
+            return json.load(manifest_file)
+    except (OSError, ValueError):
+        return {}
+
+
+# Function - Init Assets
+def init_assets(app):
+    """
+    Makes url_for('static', ...) and the static view use the built assets.
+    """
+
+    app.extensions["assets_manifest"] = load_manifest(app)
+
+    @app.url_defaults
+    def fingerprint_static_url(endpoint, values):
+        if endpoint == "static" and "filename" in values:
+            manifest = app.extensions["assets_manifest"]
+            values["filename"] = manifest.get(values["filename"],
+                                              values["filename"])
+
+    send_static_file = app.view_functions["static"]
+
+    def static(filename):
+        """
+        Serves a built asset with immutable caching and the precompressed
+        variant the browser accepts, and any other file as usual.
+        """
+
+        built_files = app.extensions.get("assets_built_files")
+        if built_files is None:
+            built_files = set(app.extensions["assets_manifest"].values())
+            app.extensions["assets_built_files"] = built_files
+        if filename not in built_files:
+            return send_static_file(filename=filename)
+
+        response = None
+        for encoding, extension in ENCODINGS:
+            if (encoding in request.accept_encodings
+                    and os.path.exists(os.path.join(app.static_folder,
+                                                    filename + extension))):
+                response = send_from_directory(
+                    app.static_folder, filename + extension,
+                    mimetype=mimetypes.guess_type(filename)[0]
+                    or "application/octet-stream",
+                    max_age=IMMUTABLE_MAX_AGE,
+                )
+                response.content_encoding = encoding
+                break
+        if response is None:
+            response = send_from_directory(app.static_folder, filename,
+                                           max_age=IMMUTABLE_MAX_AGE)
+        response.vary.add("Accept-Encoding")
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    app.view_functions["static"] = static
@@ -3,27 +3,21 @@ CLI Commands for the app.
 """
 
 # Imports
-import random
-from faker import Faker
-from flask import Blueprint
-from werkzeug.security import generate_password_hash
+import click
+from flask import Blueprint, current_app
 from src import db
-from src.models import (
-    User,
-    Departments,
-    Kudo,
-)
-from src.dictionaries.dictionaries import (
-    USER_ROLE_CHOICES,
-    STATUS_CHOICES,
-)
+from src.kudos.rollups import rebuild_kudo_rollups
+from src.outbox.outbox import run_outbox_worker, requeue_dead_emails
+from src.users.bulk_import import run_import_worker
+from src.users.user_search import rebuild_user_search
+from src.kudos.kudo_search import rebuild_kudo_search
+from src.assets.assets import build_assets as build_static_assets
 
 
-# Faker Generator
-faker = Faker()
-
 # Blueprint Configuration
 commands_bp = Blueprint('commands', __name__)
+# Commands of this blueprint are top level, such as `flask serve`
+serve_bp = Blueprint('serve', __name__, cli_group=None)
 
 
 # Create DB
@@ -50,68 +44,144 @@ def drop_db():
 
 # Seed DB
 @commands_bp.cli.command('seed_db')
-def seed_db():
+@click.option('--users', default=10, show_default=True,
+              help='Number of users to create.')
+@click.option('--departments', default=5, show_default=True,
+              help='Number of departments to create.')
+@click.option('--kudos', default=100, show_default=True,
+              help='Number of kudos to create.')
+@click.option('--days', default=120, show_default=True,
+              help='Days the kudos are spread over, ending today.')
+@click.option('--seed', type=int, default=None,
+              help='Random seed, the same seed builds the same data.')
+@click.option('--batch-size', default=20000, show_default=True,
+              help='Rows inserted per transaction.')
+def seed_db(users, departments, kudos, days, seed, batch_size):
     """
     Seeds the database with fake data.
     """
 
-    # Data to seed the database with
-    entry = []
-
-    # Create Admin User
-    admin_user = User(
-            email="admin@healthtrio.com",
-            password_hash=generate_password_hash(
-                "admin@healthtrio.com"),
-            firstname="Admin",
-            lastname="AdminUser",
-            role="admin",
-            status="active",
+    # Imported here, so the web app never loads Faker
+    from src.cli_commands.seed import seed_database
+
+    with click.progressbar(length=kudos, label='Seeding kudos') as bar:
+        counts = seed_database(
+            users=users,
+            departments=departments,
+            kudos=kudos,
+            seed=seed,
+            days=days,
+            batch_size=batch_size,
+            progress=lambda done: bar.update(done - bar.pos),
         )
+    rebuild_kudo_rollups()
+    print(f'Database seeded with {counts["departments"]} departments, '
+          f'{counts["users"]} users and {counts["kudos"]} kudos!')
 
-    # Create 10 users
-    for i in range(1, 10+1):
-        entry.append(
-            User(
-                department_id=random.randint(1, 6),
-                email=f"test{i}@healthtrio.com",
-                password_hash=generate_password_hash(
-                    f"test{i}@healthtrio.com"),
-                firstname=faker.first_name(),
-                lastname=faker.last_name(),
-                role=random.choice([item[0] for item in USER_ROLE_CHOICES]),
-                status=random.choice([item[0] for item in STATUS_CHOICES]),
-            )
-        )
 
-    # Create 10 departments
-    for i in range(1, 5+1):
-        entry.append(
-            Departments(
-                name=random.choice(
-                    ["IT", "HR", "Finance", "Sales", "Marketing",
-                     "Operations", "Legal", "Customer Service", "Product",
-                     "Engineering"]
-                    ),
-            )
-        )
+# Rebuild Rollups
+@commands_bp.cli.command('rebuild_rollups')
+def rebuild_rollups():
+    """
+    Rebuilds the kudo dashboard rollups and user kudo counts from the kudos
+    table.
+    """
 
-    # Create 10 kudos
-    for i in range(1, 100+1):
-        entry.append(
-            Kudo(
-                submitting_user_id=random.randint(1, 10),
-                receiving_user_id=random.randint(1, 10),
-                kudo_message=faker.text(),
-                created_date=faker.date_between(
-                    start_date='-120d', end_date='today'),
-            )
-        )
+    rebuild_kudo_rollups()
+    print('Rollups rebuilt!')
+
+
+# Rebuild Search
+@commands_bp.cli.command('rebuild_search')
+def rebuild_search():
+    """
+    Rebuilds the search indexes from the users and kudos tables.
+    """
+
+    rebuild_user_search()
+    rebuild_kudo_search()
+    print('Search indexes rebuilt!')
+
+
+# Build Assets
+@commands_bp.cli.command('build_assets')
+def build_assets():
+    """
+    Builds the fingerprinted and precompressed static assets.
+    """
+
+    manifest = build_static_assets(current_app.static_folder)
+    print(f'{len(manifest)} static assets built!')
 
-    # Add the data to the database
-    db.session.add(admin_user)
 
-    for data in entry:
-        db.session.add(data)
-    db.session.commit()
-    print('Database seeded!')
+# Outbox Worker
+@commands_bp.cli.command('outbox_worker')
+@click.option('--once', is_flag=True,
+              help='Send every due email and exit instead of polling.')
+def outbox_worker(once):
+    """
+    Sends the queued outbox emails.
+    """
+
+    print('Outbox worker started!')
+    run_outbox_worker(once=once)
+
+
+# Import Worker
+@commands_bp.cli.command('import_worker')
+@click.option('--once', is_flag=True,
+              help='Run every queued import and exit instead of polling.')
+def import_worker(once):
+    """
+    Runs the confirmed bulk user imports.
+    """
+
+    print('Import worker started!')
+    run_import_worker(once=once)
+
+
+# Requeue Dead Outbox Emails
+@commands_bp.cli.command('outbox_requeue_dead')
+def outbox_requeue_dead():
+    """
+    Moves dead outbox emails back to pending.
+    """
+
+    print(f'{requeue_dead_emails()} emails requeued!')
+
+
+# Serve
+@serve_bp.cli.command('serve')
+@click.option('--bind', default=None,
+              help='Address to listen on.  [default: SERVE_BIND]')
+@click.option('--workers', type=int, default=None,
+              help='Worker processes.  [default: SERVE_WORKERS]')
+@click.option('--threads', type=int, default=None,
+              help='Request threads per worker.  [default: SERVE_THREADS]')
+@click.option('--max-requests', type=int, default=None,
+              help='Requests before a worker is replaced, 0 to never '
+                   'replace it.  [default: SERVE_MAX_REQUESTS]')
+@click.option('--graceful-timeout', type=int, default=None,
+              help='Seconds workers get to finish their requests when '
+                   'stopped.  [default: SERVE_GRACEFUL_TIMEOUT]')
+def serve(bind, workers, threads, max_requests, graceful_timeout):
+    """
+    Serves the app with Gunicorn. SIGHUP reloads the app and replaces the
+    workers, SIGTERM stops after the running requests.
+    """
+
+    # Imported here, so the web app never loads Gunicorn itself
+    from src.cli_commands.server import KudoTrioServer, server_options
+
+    config = current_app.config
+    KudoTrioServer(server_options(
+        bind=bind or config['SERVE_BIND'],
+        workers=workers or config['SERVE_WORKERS'],
+        threads=threads or config['SERVE_THREADS'],
+        max_requests=(config['SERVE_MAX_REQUESTS'] if max_requests is None
+                      else max_requests),
+        max_requests_jitter=config['SERVE_MAX_REQUESTS_JITTER'],
+        timeout=config['SERVE_TIMEOUT'],
+        graceful_timeout=(config['SERVE_GRACEFUL_TIMEOUT']
+                          if graceful_timeout is None else graceful_timeout),
+    )).run()
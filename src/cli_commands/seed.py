@@ -0,0 +1,244 @@
+"""
+CLI Commands - Seed
+These are helper functions to seed the database with fake data.
+
+The rows are inserted in bulk, in batches, with ids chosen up front so the
+kudos can reference them without reading them back. Every user shares one
+password hash, and the kudos are spread over the users with a Zipf-like
+skew, so a few users send and receive most of them as in a real company.
+The same seed always builds the same dataset.
+"""
+
+# Imports
+import itertools
+import random
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from faker import Faker
+from sqlalchemy import insert
+from src import db
+from src.models import (
+    User,
+    Departments,
+    Kudo,
+)
+from src.kudos.kudo_search import KUDO_SEARCH_TRIGGERS, rebuild_kudo_search
+from src.users.user_search import USER_SEARCH_TRIGGERS, rebuild_user_search
+from src.users.passwords import password_hasher
+
+
+# Every seeded user logs in with their email and this password, the admin
+# user with admin@healthtrio.com as both
+SEED_PASSWORD = "kudotrio"
+
+DEPARTMENT_NAMES = [
+    "IT", "HR", "Finance", "Sales", "Marketing", "Operations", "Legal",
+    "Customer Service", "Product", "Engineering",
+]
+
+# Skew of the kudos over the users, 1.0 is Zipf's law
+KUDO_SKEW = 1.0
+
+# Fake text is slow to generate, so the names and messages are picked from
+# pools
+NAME_POOL_SIZE = 500
+MESSAGE_POOL_SIZE = 2000
+
+# Triggers of the search indexes, dropped while seeding
+SEARCH_TRIGGERS = {**USER_SEARCH_TRIGGERS, **KUDO_SEARCH_TRIGGERS}
+
+
+# Function - Next ID
+def _next_id(model):
+    """
+    Returns the first free id of the table.
+    """
+
+    return (db.session.query(db.func.max(model.id)).scalar() or 0) + 1
+
+
+# Function - Insert Rows
+def _insert_rows(model, rows, batch_size):
+    """
+    Inserts the rows in batches, committing after every batch.
+    """
+
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            return
+        db.session.execute(insert(model), batch)
+        db.session.commit()
+
+
+# Function - Skewed Weights
+def _skewed_cum_weights(user_indexes, rng):
+    """
+    Returns the given users in a random order and the cumulative weights
+    that give the first users the most kudos.
+    """
+
+    user_order = list(user_indexes)
+    rng.shuffle(user_order)
+    cum_weights = list(itertools.accumulate(
+        1 / (rank + 1) ** KUDO_SKEW for rank in range(len(user_order))
+    ))
+    return user_order, cum_weights
+
+
+# Function - Search Triggers Suspended
+@contextmanager
+def _search_triggers_suspended():
+    """
+    Drops the search index triggers while the rows are inserted and
+    rebuilds the indexes afterwards, which is much faster than indexing
+    every row as it is inserted. Changes made by the app while seeding are
+    picked up by the rebuild.
+    """
+
+    if db.engine.dialect.name != "sqlite":
+        yield
+        return
+
+    for trigger in SEARCH_TRIGGERS:
+        db.session.execute(db.text(f"DROP TRIGGER IF EXISTS {trigger}"))
+    db.session.commit()
+
+    try:
+        yield
+    finally:
+        db.session.rollback()
+        for statement in SEARCH_TRIGGERS.values():
+            db.session.execute(db.text(statement))
+        db.session.commit()
+        rebuild_user_search()
+        rebuild_kudo_search()
+
+
+# Function - Seed Database
+def seed_database(users=10, departments=5, kudos=100, seed=None, days=120,
+                  batch_size=20000, progress=None):
+    """
+    Adds an admin user and the given number of departments, users and
+    kudos, created over the last days. Pass a seed to build the same
+    dataset every time, and a progress function to be called with the
+    number of kudos inserted so far.
+    Returns the number of rows inserted per table.
+    """
+
+    rng = random.Random(seed)
+    faker = Faker()
+    faker.seed_instance(seed)
+    now = datetime.utcnow()
+
+    # One hash for every seeded user, hashing is slow on purpose
+    hasher = password_hasher()
+    password_hash = hasher(SEED_PASSWORD)
+
+    first_names = [faker.first_name() for _ in range(NAME_POOL_SIZE)]
+    last_names = [faker.last_name() for _ in range(NAME_POOL_SIZE)]
+    messages = [faker.text() for _ in range(MESSAGE_POOL_SIZE)]
+
+    first_department_id = _next_id(Departments)
+    first_user_id = _next_id(User)
+    first_kudo_id = _next_id(Kudo)
+    has_admin = User.query.filter_by(
+        email="admin@healthtrio.com").first() is not None
+
+    with _search_triggers_suspended():
+        # Departments
+        _insert_rows(Departments, (
+            {
+                "id": first_department_id + i,
+                "name": (
+                    DEPARTMENT_NAMES[i % len(DEPARTMENT_NAMES)]
+                    if i < len(DEPARTMENT_NAMES)
+                    else f"{DEPARTMENT_NAMES[i % len(DEPARTMENT_NAMES)]} "
+                         f"{i // len(DEPARTMENT_NAMES) + 1}"
+                ),
+                "created_date": now,
+            }
+            for i in range(departments)
+        ), batch_size)
+
+        # Users, and the admin user if there is none yet
+        active = [rng.random() < 0.9 for _ in range(users)]
+        user_rows = (
+            {
+                "id": first_user_id + i,
+                "department_id": (
+                    first_department_id + rng.randrange(departments)
+                    if departments else None
+                ),
+                "email": f"test{first_user_id + i}@healthtrio.com",
+                "password_hash": password_hash,
+                "firstname": rng.choice(first_names),
+                "lastname": rng.choice(last_names),
+                "role": "admin" if rng.random() < 0.05 else "user",
+                "status": "active" if active[i] else "inactive",
+                "created_date": now,
+            }
+            for i in range(users)
+        )
+        if not has_admin:
+            user_rows = itertools.chain([{
+                "id": first_user_id + users,
+                "email": "admin@healthtrio.com",
+                "password_hash": hasher("admin@healthtrio.com"),
+                "firstname": "Admin",
+                "lastname": "AdminUser",
+                "role": "admin",
+                "status": "active",
+                "created_date": now,
+            }], user_rows)
+        _insert_rows(User, user_rows, batch_size)
+
+        # Kudos, between two different active users
+        active_users = [i for i in range(users) if active[i]]
+        if len(active_users) < 2:
+            kudos = 0
+        receivers, receiver_weights = _skewed_cum_weights(active_users, rng)
+        submitters, submitter_weights = _skewed_cum_weights(active_users,
+                                                            rng)
+        start = now - timedelta(days=days)
+        step = timedelta(days=days).total_seconds() / max(kudos, 1)
+
+        def kudo_rows():
+            for offset in range(0, kudos, batch_size):
+                count = min(batch_size, kudos - offset)
+                receiver_ranks = rng.choices(
+                    range(len(receivers)), cum_weights=receiver_weights,
+                    k=count)
+                submitter_ranks = rng.choices(
+                    range(len(submitters)), cum_weights=submitter_weights,
+                    k=count)
+                batch_messages = rng.choices(messages, k=count)
+                for i in range(count):
+                    receiver = receivers[receiver_ranks[i]]
+                    submitter_rank = submitter_ranks[i]
+                    if submitters[submitter_rank] == receiver:
+                        submitter_rank = (
+                            (submitter_rank + 1) % len(submitters))
+                    submitter = submitters[submitter_rank]
+                    # Kudos are created in id order, as they are in the
+                    # app, which also keeps the date indexes append-only
+                    created_date = start + timedelta(
+                        seconds=(offset + i + rng.random()) * step)
+                    yield {
+                        "id": first_kudo_id + offset + i,
+                        "submitting_user_id": first_user_id + submitter,
+                        "receiving_user_id": first_user_id + receiver,
+                        "kudo_message": batch_messages[i],
+                        "created_date": created_date,
+                        "created_by": first_user_id + submitter,
+                    }
+                if progress is not None:
+                    progress(offset + count)
+
+        _insert_rows(Kudo, kudo_rows(), batch_size)
+
+    return {
+        "departments": departments,
+        "users": users + (0 if has_admin else 1),
+        "kudos": kudos,
+    }
@@ -0,0 +1,91 @@
+"""
+CLI Commands - Server
+These are helper functions to serve the app with Gunicorn, for
+`flask serve`.
+
+The app is built once in the master process and the workers are forked
+from it, so they start serving at once and share its memory. Workers are
+replaced after a number of requests, finish their requests on SIGTERM,
+and on SIGHUP the app is built again from the current settings and new
+workers replace the old ones without dropping a request.
+"""
+
+# Imports
+import os
+from dotenv import load_dotenv
+from gunicorn.app.base import BaseApplication
+from sqlalchemy.exc import SQLAlchemyError
+from src import create_app, db
+from src.kudos.leaderboards import rebuild_leaderboards
+
+
+# Function - Post Fork
+def _post_fork(server, worker):
+    """
+    Drops the database connections the worker got from the master, so no
+    connection is shared by two processes.
+    """
+
+    app = server.app.wsgi()
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
+class KudoTrioServer(BaseApplication):
+    """
+    Gunicorn application of the app built by create_app
+    """
+
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        """Sets the Gunicorn settings"""
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+        self.cfg.set("preload_app", True)
+        self.cfg.set("post_fork", _post_fork)
+
+    def load(self):
+        """Builds the app, the web workers skip the CLI only setup"""
+        os.environ.pop("FLASK_RUN_FROM_CLI", None)
+        app = create_app()
+
+        # Built once here, so every worker starts with the leaderboards
+        with app.app_context():
+            try:
+                rebuild_leaderboards()
+            except SQLAlchemyError:
+                app.logger.warning("Could not build the leaderboards, "
+                                   "they are built on first use")
+            db.session.remove()
+        return app
+
+    def reload(self):
+        """Builds the app again on SIGHUP, with the current .env file"""
+        load_dotenv(override=True)
+        self.callable = None
+        super().reload()
+
+
+# Function - Server Options
+def server_options(bind, workers, threads, max_requests,
+                   max_requests_jitter, timeout, graceful_timeout):
+    """
+    Returns the Gunicorn settings of the server.
+    """
+
+    return {
+        "bind": [bind],
+        "workers": workers,
+        "threads": threads,
+        # Threads need the threaded worker, which also keeps idle
+        # keep-alive connections from holding a thread
+        "worker_class": "gthread" if threads > 1 else "sync",
+        "max_requests": max_requests,
+        "max_requests_jitter": max_requests_jitter,
+        "timeout": timeout,
+        "graceful_timeout": graceful_timeout,
+        "accesslog": "-",
+    }
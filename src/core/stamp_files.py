@@ -0,0 +1,36 @@
+"""
+Core - Stamp Files
+These are helper functions to tell the other worker processes that a
+process cache is out of date.
+
+A process cache that can be changed by any worker is given a stamp file.
+The worker making a change touches it, and every worker drops its cache
+once the modification time of the file is not the one it loaded the cache
+with.
+"""
+
+# Imports
+import os
+
+
+# Function - Stamp Modification Time
+def stamp_mtime(path):
+    """
+    Returns the modification time of the stamp file, or None if it does not
+    exist yet.
+    """
+
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+# Function - Touch Stamp
+def touch_stamp(path):
+    """
+    Touches the stamp file, creating it if needed.
+    """
+
+    with open(path, "a"):
+        os.utime(path)
@@ -0,0 +1,156 @@
+"""
+Database - Engine Configuration
+These are helper functions to configure the SQLAlchemy engine from the
+database settings.
+
+SQLite connections are set up for concurrent web workers: WAL lets readers
+run alongside the writer, busy_timeout makes writers wait for the lock
+instead of failing with "database is locked", and synchronous=NORMAL is
+safe in WAL mode. Server databases only get a statement timeout, the
+models and queries are the same for every backend.
+"""
+
+# Imports
+import time
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+
+# SQLite VM instructions between two statement timeout checks
+SQLITE_PROGRESS_INTERVAL = 10000
+
+# Statement timeout in milliseconds for server databases
+STATEMENT_TIMEOUT_SQL = {
+    "postgresql": "SET statement_timeout = {}",
+    "mysql": "SET SESSION max_execution_time = {}",
+    "mariadb": "SET SESSION max_statement_time = {}",
+}
+
+
+# Full text search tables, created by hand and left out of autogenerate
+SEARCH_INDEX_TABLES = ("user_search", "kudo_search")
+
+
+# Function - Database URL
+def database_url(url):
+    """
+    Returns the SQLAlchemy URL for a database URL, accepting the legacy
+    postgres:// scheme used by some hosting providers.
+    """
+
+    if url.startswith("postgres://"):
+        return "postgresql://" + url[len("postgres://"):]
+    return url
+
+
+# Function - Engine Options
+def engine_options(url, pool_size, max_overflow, pool_recycle):
+    """
+    Returns the SQLAlchemy engine options for the database URL.
+    In-memory SQLite databases use a single connection per thread, so they
+    take no pool size.
+    """
+
+    options = {"pool_pre_ping": True, "pool_recycle": pool_recycle}
+
+    url = make_url(url)
+    in_memory = (url.get_backend_name() == "sqlite"
+                 and url.database in (None, "", ":memory:"))
+    if not in_memory:
+        options["pool_size"] = pool_size
+        options["max_overflow"] = max_overflow
+
+    return options
+
+
+# Function - Include in Migrations
+def include_in_migrations(name, type_, parent_names):
+    """
+    Keeps the full text search tables and their shadow tables out of
+    alembic autogenerate.
+    """
+
+    if type_ == "table":
+        return not name.startswith(SEARCH_INDEX_TABLES)
+    return True
+
+
+# Function - Configure SQLite Connection
+def _configure_sqlite_connection(dbapi_connection, busy_timeout,
+                                 cache_size_kb):
+    """
+    Sets the pragmas of a new SQLite connection.
+    """
+
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA busy_timeout={int(busy_timeout)}")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA cache_size=-{int(cache_size_kb)}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+# Function - SQLite Statement Timeout
+def _sqlite_statement_timeout(engine, timeout):
+    """
+    Interrupts SQLite statements that run longer than the timeout.
+    SQLite has no statement timeout of its own, so a progress handler
+    checks the deadline set when the statement starts.
+    """
+
+    @event.listens_for(engine, "connect")
+    def set_progress_handler(dbapi_connection, connection_record):
+        info = connection_record.info
+
+        def interrupt():
+            deadline = info.get("statement_deadline")
+            return deadline is not None and time.monotonic() > deadline
+
+        dbapi_connection.set_progress_handler(interrupt,
+                                              SQLITE_PROGRESS_INTERVAL)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_deadline(conn, cursor, statement, parameters, context,
+                       executemany):
+        conn.info["statement_deadline"] = time.monotonic() + timeout
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def clear_deadline(conn, cursor, statement, parameters, context,
+                       executemany):
+        conn.info.pop("statement_deadline", None)
+
+    @event.listens_for(engine, "handle_error")
+    def clear_deadline_on_error(exception_context):
+        if exception_context.connection is not None:
+            exception_context.connection.info.pop("statement_deadline", None)
+
+
+# Function - Configure Engine
+def configure_engine(engine, statement_timeout, busy_timeout, cache_size_kb):
+    """
+    Sets up every new connection of the engine.
+    The statement timeout is in seconds and disabled when 0, the SQLite
+    busy timeout is in milliseconds.
+    """
+
+    if engine.dialect.name == "sqlite":
+        @event.listens_for(engine, "connect")
+        def configure_sqlite(dbapi_connection, connection_record):
+            _configure_sqlite_connection(dbapi_connection, busy_timeout,
+                                         cache_size_kb)
+
+        if statement_timeout:
+            _sqlite_statement_timeout(engine, statement_timeout)
+
+    elif statement_timeout and engine.dialect.name in STATEMENT_TIMEOUT_SQL:
+        timeout_sql = STATEMENT_TIMEOUT_SQL[engine.dialect.name].format(
+            int(statement_timeout * 1000))
+
+        @event.listens_for(engine, "connect")
+        def set_statement_timeout(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute(timeout_sql)
+            cursor.close()
+            # The setting is lost if the connection rolls it back
+            dbapi_connection.commit()
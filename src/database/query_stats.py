@@ -0,0 +1,175 @@
+"""
+Database - Query Stats
+These are helper functions to measure the SQL statements of every request.
+
+Engine events time every statement. During a request the count, the total
+database time and the slowest statements are kept on flask.g and sent back
+in a Server-Timing header when SERVER_TIMING is set, which the browser
+developer tools show next to the request. It is off by default, as it tells
+every client which tables a page reads. Statements slower than
+SLOW_QUERY_THRESHOLD_MS are written to the slow query log, and a request
+that runs the same statement N_PLUS_ONE_THRESHOLD times or more is logged
+as a likely N+1 query.
+"""
+
+# Imports
+import logging
+import os
+import re
+import time
+from collections import Counter
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+
+# Slowest statements kept per request and shown in Server-Timing
+SLOWEST_STATEMENTS = 3
+
+# Statement summaries such as "SELECT kudos", for the Server-Timing header
+STATEMENT_TABLE_PATTERN = re.compile(
+    r"\b(?:FROM|INTO|UPDATE|JOIN)\s+[\"`]?(\w+)", re.IGNORECASE
+)
+
+
+# Function - Statement Summary
+def statement_summary(statement):
+    """
+    Returns the kind of statement and its first table, without any values.
+    """
+
+    words = statement.split(None, 1)
+    kind = words[0].upper() if words else ""
+    table = STATEMENT_TABLE_PATTERN.search(statement)
+    return f"{kind} {table.group(1)}" if table else kind
+
+
+# Function - Request Stats
+def _request_stats():
+    """
+    Returns the query stats of the current request, or None outside of a
+    request.
+    """
+
+    if not has_request_context():
+        return None
+    return g.get("query_stats")
+
+
+# Function - Record Statement
+def _record_statement(app, statement, duration):
+    """
+    Adds a finished statement to the request stats and logs it if slow.
+    The parameters are not logged, as they can hold personal data.
+    """
+
+    stats = _request_stats()
+    if stats is not None:
+        stats["count"] += 1
+        stats["duration"] += duration
+        stats["statements"][statement] += 1
+        stats["slowest"].append((duration, statement))
+        stats["slowest"].sort(key=lambda item: item[0], reverse=True)
+        del stats["slowest"][SLOWEST_STATEMENTS:]
+
+    threshold = app.config["SLOW_QUERY_THRESHOLD_MS"]
+    if threshold and duration * 1000 >= threshold:
+        endpoint = request.endpoint if has_request_context() else None
+        app.logger.getChild("slow_queries").warning(
+            "Slow query (%.1f ms) in %s: %s",
+            duration * 1000, endpoint or "no request", statement,
+        )
+
+
+# Function - Instrument Engine
+def instrument_engine(app, engine):
+    """
+    Times every statement run by the engine.
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_timer(conn, cursor, statement, parameters, context,
+                    executemany):
+        conn.info.setdefault("query_start_time", []).append(
+            time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def stop_timer(conn, cursor, statement, parameters, context,
+                   executemany):
+        duration = time.perf_counter() - conn.info["query_start_time"].pop()
+        _record_statement(app, statement, duration)
+
+    @event.listens_for(engine, "handle_error")
+    def drop_timer(exception_context):
+        connection = exception_context.connection
+        if connection is not None and connection.info.get(
+                "query_start_time"):
+            connection.info["query_start_time"].pop()
+
+
+# Function - Server Timing
+def _server_timing(stats, total):
+    """
+    Returns the Server-Timing header value of the request stats.
+    """
+
+    metrics = [
+        f'db;dur={stats["duration"] * 1000:.2f};'
+        f'desc="{stats["count"]} queries"',
+    ]
+    for rank, (duration, statement) in enumerate(stats["slowest"], 1):
+        metrics.append(f'db-{rank};dur={duration * 1000:.2f};'
+                       f'desc="{statement_summary(statement)}"')
+    metrics.append(f"app;dur={total * 1000:.2f}")
+    return ", ".join(metrics)
+
+
+# Function - Init Query Stats
+def init_query_stats(app):
+    """
+    Collects the query stats of every request, adds the Server-Timing
+    header and warns about likely N+1 queries.
+    """
+
+    # The logger is shared by every app of the process, so an app created
+    # again does not add a second handler for the same file
+    slow_query_log = app.config["SLOW_QUERY_LOG"]
+    logger = app.logger.getChild("slow_queries")
+    if slow_query_log and not any(
+            getattr(handler, "baseFilename", None)
+            == os.path.abspath(slow_query_log)
+            for handler in logger.handlers):
+        handler = logging.FileHandler(slow_query_log)
+        handler.setFormatter(logging.Formatter(
+            "%(asctime)s %(levelname)s %(message)s"))
+        logger.setLevel(logging.WARNING)
+        logger.addHandler(handler)
+
+    @app.before_request
+    def start_query_stats():
+        g.query_stats = {
+            "started": time.perf_counter(),
+            "count": 0,
+            "duration": 0.0,
+            "statements": Counter(),
+            "slowest": [],
+        }
+
+    @app.after_request
+    def send_query_stats(response):
+        stats = g.pop("query_stats", None)
+        if stats is None:
+            return response
+
+        threshold = app.config["N_PLUS_ONE_THRESHOLD"]
+        if threshold and stats["statements"]:
+            statement, count = stats["statements"].most_common(1)[0]
+            if count >= threshold:
+                app.logger.warning(
+                    "Possible N+1 queries in %s: %d of %d statements were "
+                    "%s", request.endpoint, count, stats["count"], statement,
+                )
+
+        if app.config["SERVER_TIMING"]:
+            total = time.perf_counter() - stats["started"]
+            response.headers["Server-Timing"] = _server_timing(stats, total)
+        return response
@@ -0,0 +1,56 @@
+"""
+Database - Upsert
+These are helper functions to insert a row, or update it when a row with
+the same primary key already exists, in a single statement.
+
+Updating first and inserting when no row changed fails when two
+transactions create the same key at once: both insert, and one of them
+gets an IntegrityError. The upsert of each dialect lets the database
+settle the race instead.
+"""
+
+# Imports
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from src import db
+
+
+# Insert statement with an upsert clause, per dialect
+UPSERT_INSERTS = {
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert,
+    "mysql": mysql.insert,
+    "mariadb": mysql.insert,
+}
+
+
+# Function - Upsert Statement
+def upsert_statement(dialect, model, values, update):
+    """
+    Returns the statement inserting the values as a row of the model, or
+    applying the update, a dictionary of column or model attribute to value
+    or SQL expression, to the row with the same primary key.
+    """
+
+    table = model.__table__
+    # The upsert clauses only take column names or Column objects as keys
+    update = {getattr(column, "key", column): value
+              for column, value in update.items()}
+    statement = UPSERT_INSERTS[dialect](table).values(**values)
+    if dialect in ("mysql", "mariadb"):
+        return statement.on_duplicate_key_update(update)
+    return statement.on_conflict_do_update(
+        index_elements=list(table.primary_key.columns),
+        set_=update,
+    )
+
+
+# Function - Upsert
+def upsert(model, values, update):
+    """
+    Inserts the values as a row of the model, or applies the update to the
+    row with the same primary key.
+    This does not commit.
+    """
+
+    dialect = db.session.get_bind().dialect.name
+    db.session.execute(upsert_statement(dialect, model, values, update))
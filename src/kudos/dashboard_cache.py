@@ -0,0 +1,177 @@
+"""
+Kudos - Dashboard Cache
+These are helper functions to cache the kudos dashboard between requests.
+
+The dashboard only changes when kudos or memes change, so those write paths
+bump the "kudos" DataVersion in the same transaction. The chart data and
+the rendered feed are cached per process against that version, and the
+page and every chart are sent with an ETag and Last-Modified so browsers
+that already have them get a 304. The navbar is rendered for every request
+and the page ETag includes the logged in user, so nothing per-user is
+shared.
+"""
+
+# Imports
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from flask import current_app, request, session
+from werkzeug.http import is_resource_modified
+from src import db
+from src.models import DataVersion
+from src.database.upsert import upsert
+
+
+# Data version bumped by the kudo and meme write paths
+KUDOS_DATA = "kudos"
+
+# Templates the dashboard page is rendered from
+DASHBOARD_TEMPLATES = (
+    "base.html", "navbar.html", "kudos/kudos.html", "kudos/kudo_feed.html",
+)
+
+# Process cache of dashboard parts, {key: (stamp, value)}, least recently
+# used first
+FRAGMENT_CACHE_SIZE = 256
+_fragments = OrderedDict()
+_fragments_lock = threading.Lock()
+_release = {}
+
+
+# Function - Bump Data Version
+def bump_data_version(name=KUDOS_DATA):
+    """
+    Marks the data as changed, creating its version row if needed.
+    This does not commit, so the version changes in the same transaction
+    as the data itself.
+    """
+
+    now = datetime.utcnow()
+    upsert(
+        DataVersion,
+        {"name": name, "version": 1, "updated_date": now},
+        {DataVersion.version: DataVersion.version + 1,
+         DataVersion.updated_date: now},
+    )
+
+
+# Function - Get Data Version
+def get_data_version(name=KUDOS_DATA):
+    """
+    Returns the version of the data and when it last changed.
+    Data that never changed is version 0, with no change date.
+    """
+
+    row = (
+        db.session.query(DataVersion.version, DataVersion.updated_date)
+        .filter_by(name=name)
+        .first()
+    )
+    if row is None:
+        return 0, None
+    return row.version, row.updated_date
+
+
+# Function - Cached Fragment
+def cached_fragment(key, stamp, build):
+    """
+    Returns the cached value of a dashboard part, calling build to create
+    it when it is missing or was built for another stamp.
+    """
+
+    with _fragments_lock:
+        cached = _fragments.get(key)
+        if cached is not None and cached[0] == stamp:
+            _fragments.move_to_end(key)
+            return cached[1]
+
+    value = build()
+    with _fragments_lock:
+        _fragments[key] = (stamp, value)
+        _fragments.move_to_end(key)
+        while len(_fragments) > FRAGMENT_CACHE_SIZE:
+            _fragments.popitem(last=False)
+    return value
+
+
+# Function - Clear Fragments
+def clear_fragments():
+    """
+    Drops every cached dashboard part of this process.
+    """
+
+    with _fragments_lock:
+        _fragments.clear()
+
+
+# Function - Release
+def _release_tag():
+    """
+    Returns a hash of the dashboard templates and static assets, so a
+    deploy that changes them also changes the ETag.
+    """
+
+    if "tag" not in _release:
+        app = current_app._get_current_object()
+        digest = hashlib.sha256()
+        for template in DASHBOARD_TEMPLATES:
+            source, _, _ = app.jinja_loader.get_source(app.jinja_env,
+                                                       template)
+            digest.update(source.encode("utf-8"))
+        digest.update(json.dumps(app.extensions.get("assets_manifest", {}),
+                                 sort_keys=True).encode("utf-8"))
+        _release["tag"] = digest.hexdigest()
+    return _release["tag"]
+
+
+# Function - Data ETag
+def data_etag(*parts):
+    """
+    Returns an ETag for a response built from the given parts, such as the
+    data stamp and the request parameters.
+    """
+
+    key = repr(parts + (_release_tag(),))
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+
+# Function - Dashboard ETag
+def dashboard_etag(stamp, user):
+    """
+    Returns the ETag of the dashboard page for the data stamp and the
+    logged in user shown in the navbar.
+    """
+
+    return data_etag(stamp, user.id, user.firstname, user.lastname,
+                     user.role)
+
+
+# Function - Not Modified
+def is_not_modified(etag, last_modified):
+    """
+    Returns True if the browser already has this version of the page.
+    Pages with flashed messages are always sent, so the messages are shown.
+    """
+
+    if session.get("_flashes"):
+        return False
+    return not is_resource_modified(request.environ, etag=etag,
+                                    last_modified=last_modified)
+
+
+# Function - Conditional Response
+def conditional_response(response, etag, last_modified):
+    """
+    Adds the validators to a dashboard response. Browsers must check the
+    response on every view, and only keep it for the logged in user.
+    """
+
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add("Cookie")
+    return response
@@ -0,0 +1,179 @@
+"""
+Kudos - Dashboard Charts
+These are helper functions to build the kudos dashboard chart data.
+
+Every chart covers a window of days ending today, or a custom range from a
+start to an end date. The kudo count chart is split by day, week, month or
+quarter.
+
+The top receivers, top submitters and department charts of a window that
+ends today are read from the in-memory leaderboards. Custom ranges are
+counted from the rollup tables.
+"""
+
+# Imports
+from datetime import date, datetime, timedelta
+from src.kudos.rollups import (
+    kudos_count_by_period,
+    top_receivers,
+    top_submitters,
+    kudos_count_by_department,
+)
+from src.kudos.leaderboards import (
+    LEADERBOARD_WINDOWS,
+    top_entries,
+    entry_names,
+)
+
+
+# Windows that can be picked by name, in days
+CHART_WINDOWS = {"week": 7, "month": 30, "quarter": 90, "year": 365}
+DEFAULT_WINDOW_DAYS = 120
+MAX_WINDOW_DAYS = 3 * 366
+
+GRANULARITIES = ("day", "week", "month", "quarter")
+DEFAULT_GRANULARITY = "month"
+
+# Users in the top receivers and submitters charts
+TOP_USERS = 5
+
+
+# Function - Chart Range
+def chart_range(window=None, start=None, end=None, today=None):
+    """
+    Returns the start and end dates of the charts. The window is a name
+    from CHART_WINDOWS or a number of days ending today, and start and end
+    are ISO dates for a custom range.
+    Raises a ValueError for an unknown window or an invalid range.
+    """
+
+    # Kudo dates are stored in UTC
+    today = today or datetime.utcnow().date()
+
+    if start:
+        start_date = date.fromisoformat(start)
+        end_date = date.fromisoformat(end) if end else today
+    else:
+        if not window:
+            days = DEFAULT_WINDOW_DAYS
+        elif window in CHART_WINDOWS:
+            days = CHART_WINDOWS[window]
+        else:
+            days = int(window)
+        if days < 1:
+            raise ValueError("The window must be at least one day.")
+        end_date = today
+        start_date = today - timedelta(days=days - 1)
+
+    if start_date > end_date:
+        raise ValueError("The start date must be before the end date.")
+    if (end_date - start_date).days >= MAX_WINDOW_DAYS:
+        raise ValueError("The range is too long.")
+
+    return start_date, end_date
+
+
+# Function - Count Chart
+def _count_chart(start_date, end_date, granularity):
+    """
+    Returns the kudo count per period.
+    """
+
+    counts = kudos_count_by_period(start_date, end_date, granularity)
+    return {
+        "labels": [period for period, _ in counts],
+        "data": [count for _, count in counts],
+    }
+
+
+# Function - Leaderboard Window
+def _leaderboard_window(start_date, end_date):
+    """
+    Returns the days of the range if the leaderboards keep it in memory,
+    otherwise None.
+    """
+
+    days = (end_date - start_date).days + 1
+    if end_date == datetime.utcnow().date() and days in LEADERBOARD_WINDOWS:
+        return days
+    return None
+
+
+# Function - Leaderboard Chart
+def _leaderboard_chart(leaderboard, days, limit):
+    """
+    Returns the top entries of a leaderboard, labelled with their names.
+    """
+
+    entries = top_entries(leaderboard, days, limit)
+    names = entry_names(leaderboard, [key for key, _ in entries])
+    return {
+        "labels": [names.get(key, "") for key, _ in entries],
+        "data": [count for _, count in entries],
+    }
+
+
+# Function - Top Users Chart
+def _top_users_chart(leaderboard, top_users):
+    """
+    Returns a chart function of the users with the most kudos.
+    """
+
+    def chart(start_date, end_date, granularity):
+        days = _leaderboard_window(start_date, end_date)
+        if days:
+            return _leaderboard_chart(leaderboard, days, TOP_USERS)
+        users = top_users(start_date, end_date, TOP_USERS)
+        return {
+            "labels": [f"{user.firstname} {user.lastname}" for user in users],
+            "data": [user.count for user in users],
+        }
+    return chart
+
+
+# Function - Department Chart
+def _department_chart(start_date, end_date, granularity):
+    """
+    Returns the kudo count per receiving department.
+    """
+
+    days = _leaderboard_window(start_date, end_date)
+    if days:
+        return _leaderboard_chart("departments", days, None)
+    departments = kudos_count_by_department(start_date, end_date)
+    return {
+        "labels": [
+            f"{department.department_name}" for department in departments
+        ],
+        "data": [department.count for department in departments],
+    }
+
+
+# Charts by name, called with the start date, end date and granularity
+DASHBOARD_CHARTS = {
+    "counts": _count_chart,
+    "receivers": _top_users_chart("receivers", top_receivers),
+    "submitters": _top_users_chart("submitters", top_submitters),
+    "departments": _department_chart,
+}
+
+# Charts that are split by granularity
+GRANULAR_CHARTS = {"counts"}
+
+
+# Function - Chart Data
+def chart_data(chart, start_date, end_date, granularity=DEFAULT_GRANULARITY):
+    """
+    Returns the labels and data of a dashboard chart, with the range it
+    covers.
+    """
+
+    data = DASHBOARD_CHARTS[chart](start_date, end_date, granularity)
+    data.update(
+        chart=chart,
+        start_date=start_date.isoformat(),
+        end_date=end_date.isoformat(),
+    )
+    if chart in GRANULAR_CHARTS:
+        data["granularity"] = granularity
+    return data
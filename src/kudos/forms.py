@@ -20,6 +20,7 @@ class KudoForm(FlaskForm):
     receiving_user_id = SelectField(
         "To",
         coerce=int,
+        validate_choice=False,
         validators=[DataRequired()],
         render_kw={"class": "form-control select2"}
         )
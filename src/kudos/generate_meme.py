@@ -1,36 +1,166 @@
 """
 Kudos - Meme Generator
-This is a helper function to get a meme for a kudo.
+These are helper functions to get memes for a kudo.
+
+The memegen.link template catalog is cached for the whole process and
+snapshotted to disk. A stale catalog keeps being served while a background
+thread refreshes it, so a slow or failing API never blocks a request.
 """
 
 # Imports
+import json
+import os
+import threading
+import time
 import requests
+from flask import current_app
 
 
-# Function - Meme Templates
-def meme_templates():
+# Template catalog cache (shared by every request in the process)
+_catalog = {
+    "templates": None,
+    "fetched_at": 0.0,
+    "retry_at": 0.0,
+    "refreshing": False,
+}
+_catalog_lock = threading.Lock()
+
+
+# Function - Fetch Meme Templates
+def _fetch_meme_templates(api_url, timeout):
     """
-    Using the memegen.link API, get a list of meme templates and
-    return them as choices for the user to select from.
+    Gets the list of meme templates from the memegen.link API.
+    Returns None if the API fails.
     """
 
-    # Get list of meme templates
-    response = requests.get("https://api.memegen.link/templates/")
-    if response.status_code == 200:
-        # Convert response to JSON
-        response_json = response.json()
-        # Create list of tuples for choices
+    try:
+        response = requests.get(f"{api_url}/templates/", timeout=timeout)
+        response.raise_for_status()
+
+        # Create list of choices
         meme_choices = []
-        for meme in response_json:
-            meme_id = meme["id"]
-            meme_name = meme["name"]
-            meme_url = meme["_self"]
+        for meme in response.json():
             meme_choices.append({
-                "id": meme_id,
-                "name": meme_name,
-                "url": meme_url,
+                "id": meme["id"],
+                "name": meme["name"],
+                "url": meme["_self"],
             })
         return meme_choices
-    else:
+    except (requests.RequestException, ValueError, KeyError, TypeError):
         # Handle error if meme template list fails
-        return []
+        return None
+
+
+# Function - Read Snapshot
+def _read_snapshot(snapshot_path):
+    """
+    Returns the templates and fetch time saved on disk, if any.
+    """
+
+    try:
+        with open(snapshot_path, "r") as file:
+            snapshot = json.load(file)
+        return snapshot["templates"], snapshot["fetched_at"]
+    except (OSError, ValueError, KeyError):
+        return None, 0.0
+
+
+# Function - Write Snapshot
+def _write_snapshot(snapshot_path, templates, fetched_at):
+    """
+    Saves the templates to disk, replacing the old snapshot atomically.
+    """
+
+    temp_path = f"{snapshot_path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, "w") as file:
+            json.dump({"fetched_at": fetched_at, "templates": templates},
+                      file)
+        os.replace(temp_path, snapshot_path)
+    except OSError:
+        pass
+
+
+# Function - Refresh Catalog
+def _refresh_catalog(api_url, timeout, snapshot_path, retry_after):
+    """
+    Fetches the templates and stores them in the cache and the snapshot.
+    If the API fails, the current catalog is kept and the next refresh is
+    postponed.
+    """
+
+    templates = _fetch_meme_templates(api_url, timeout)
+    now = time.time()
+
+    with _catalog_lock:
+        _catalog["refreshing"] = False
+        if templates is None:
+            _catalog["retry_at"] = now + retry_after
+            return
+        _catalog["templates"] = templates
+        _catalog["fetched_at"] = now
+
+    _write_snapshot(snapshot_path, templates, now)
+
+
+# Function - Meme Templates
+def meme_templates():
+    """
+    Returns the memegen.link meme templates as choices for the user to
+    select from.
+    """
+
+    config = current_app.config
+    api_url = config["MEMEGEN_API_URL"]
+    ttl = config["MEME_TEMPLATES_TTL"]
+    timeout = config["MEME_TEMPLATES_TIMEOUT"]
+    snapshot_path = config["MEME_TEMPLATES_SNAPSHOT"]
+    retry_after = min(ttl, 60)
+
+    with _catalog_lock:
+        # Cold start - use the snapshot from a previous run
+        if _catalog["templates"] is None:
+            templates, fetched_at = _read_snapshot(snapshot_path)
+            if templates is not None:
+                _catalog["templates"] = templates
+                _catalog["fetched_at"] = fetched_at
+
+        templates = _catalog["templates"]
+        now = time.time()
+        stale = now - _catalog["fetched_at"] > ttl
+        start_refresh = (
+            stale
+            and not _catalog["refreshing"]
+            and now >= _catalog["retry_at"]
+        )
+        if start_refresh:
+            _catalog["refreshing"] = True
+
+    # Nothing cached at all - the first request has to wait for the API
+    if templates is None:
+        if not start_refresh:
+            return []
+        _refresh_catalog(api_url, timeout, snapshot_path, retry_after)
+        return _catalog["templates"] or []
+
+    # Serve the stale catalog while it is refreshed in the background
+    if start_refresh:
+        threading.Thread(
+            target=_refresh_catalog,
+            args=(api_url, timeout, snapshot_path, retry_after),
+            daemon=True,
+        ).start()
+
+    return templates
+
+
+# Function - Meme Image URL
+def meme_image_url(template, top_text, bottom_text):
+    """
+    Returns the memegen.link image URL for a template and its texts.
+    """
+
+    return (
+        f"{current_app.config['MEMEGEN_API_URL']}/images/"
+        f"{template}/{top_text}/{bottom_text}.png"
+    )
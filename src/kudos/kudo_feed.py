@@ -0,0 +1,215 @@
+"""
+Kudos - Kudo Feed
+These are helper functions to build the kudo feed used by the kudos landing
+page, the user profile page, the feed API and the kudo search.
+
+The feed is paged by (created_date, id) cursors instead of OFFSET, so every
+page is an index range read that costs the same however deep it is.
+"""
+
+# Imports
+import base64
+import binascii
+from datetime import datetime
+from sqlalchemy import literal, or_, union_all
+from src import db
+from src.models import (
+    User,
+    Departments,
+    Kudo,
+    Meme,
+)
+from src.memes.meme_cache import meme_thumbnail_url
+
+
+# Function - Kudo Feed Query
+def kudo_feed_query(submitting_user_id=None, receiving_user_id=None,
+                    department_id=None):
+    """
+    Returns an unordered query for the kudos with the names and departments
+    of both users and the meme URL, optionally filtered by submitter,
+    receiver or receiving department.
+    """
+
+    CreatingUser = db.aliased(User, name="CreatingUser")
+    CreatingUserDepartment = db.aliased(
+        Departments, name="CreatingUserDepartment")
+    ReceivingUser = db.aliased(User, name="ReceivingUser")
+    ReceivingUserDepartment = db.aliased(
+        Departments, name="ReceivingUserDepartment")
+
+    kudos = (
+        db.session.query(
+            Kudo.id,
+            Kudo.submitting_user_id,
+            Kudo.receiving_user_id,
+            Kudo.kudo_message,
+            Kudo.created_date,
+            CreatingUser.firstname.label("creating_user_firstname"),
+            CreatingUser.lastname.label("creating_user_lastname"),
+            CreatingUser.department_id,
+            CreatingUserDepartment.name.label("creating_user_department_name"),
+            ReceivingUser.firstname.label("receiving_user_firstname"),
+            ReceivingUser.lastname.label("receiving_user_lastname"),
+            ReceivingUser.department_id,
+            ReceivingUserDepartment.name.label(
+                "receiving_user_department_name"),
+            Meme.meme_url,
+            Meme.id.label("meme_id"),
+            Meme.image_hash.label("meme_image_hash"),
+        )
+        .outerjoin(CreatingUser,
+                   CreatingUser.id == Kudo.submitting_user_id)
+        .outerjoin(CreatingUserDepartment,
+                   CreatingUserDepartment.id == CreatingUser.department_id)
+        .outerjoin(ReceivingUser,
+                   ReceivingUser.id == Kudo.receiving_user_id)
+        .outerjoin(ReceivingUserDepartment,
+                   ReceivingUserDepartment.id == ReceivingUser.department_id)
+        .outerjoin(Meme, Meme.kudo_id == Kudo.id)
+    )
+
+    if submitting_user_id is not None:
+        kudos = kudos.filter(Kudo.submitting_user_id == submitting_user_id)
+    if receiving_user_id is not None:
+        kudos = kudos.filter(Kudo.receiving_user_id == receiving_user_id)
+    if department_id is not None:
+        kudos = kudos.filter(ReceivingUser.department_id == department_id)
+
+    return kudos
+
+
+# Function - Kudo Feed
+def kudo_feed(submitting_user_id=None, receiving_user_id=None,
+              department_id=None, before=None, limit=10):
+    """
+    Returns a query for the newest kudos, optionally filtered like
+    kudo_feed_query and starting after the (created_date, id) of the last
+    kudo of the previous page.
+    """
+
+    kudos = kudo_feed_query(submitting_user_id, receiving_user_id,
+                            department_id)
+
+    # Keyset pagination - the first condition gives the index range
+    if before is not None:
+        before_date, before_id = before
+        kudos = (
+            kudos.filter(Kudo.created_date <= before_date)
+            .filter(or_(Kudo.created_date < before_date,
+                        Kudo.id < before_id))
+        )
+
+    return (
+        kudos.order_by(Kudo.created_date.desc(), Kudo.id.desc())
+        .limit(limit)
+    )
+
+
+# Function - Encode Feed Cursor
+def encode_feed_cursor(kudo):
+    """
+    Returns the opaque cursor pointing after the given kudo.
+    """
+
+    cursor = f"{kudo.created_date.isoformat()}|{kudo.id}"
+    return base64.urlsafe_b64encode(cursor.encode()).decode().rstrip("=")
+
+
+# Function - Decode Feed Cursor
+def decode_feed_cursor(cursor):
+    """
+    Returns the (created_date, id) of a cursor.
+    Raises ValueError if the cursor is invalid.
+    """
+
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_date, kudo_id = (
+            base64.urlsafe_b64decode(padded).decode().split("|")
+        )
+        return datetime.fromisoformat(created_date), int(kudo_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError(f"Invalid feed cursor: {cursor}")
+
+
+# Function - Kudo Feed Page
+def kudo_feed_page(cursor=None, limit=10, **filters):
+    """
+    Returns a page of the kudo feed and the cursor of the next page, which
+    is None on the last page.
+    """
+
+    before = decode_feed_cursor(cursor) if cursor else None
+    kudos = kudo_feed(before=before, limit=limit + 1, **filters).all()
+
+    next_cursor = None
+    if len(kudos) > limit:
+        kudos = kudos[:limit]
+        next_cursor = encode_feed_cursor(kudos[-1])
+
+    return kudos, next_cursor
+
+
+# Function - Profile Kudo Feeds
+def profile_kudo_feeds(user_id, limit=10):
+    """
+    Returns the first pages of the kudos sent and received by a user, each
+    as a (kudos, next_cursor) pair, fetched with a single query.
+    """
+
+    feeds = [
+        kudo_feed(**{filter_name: user_id}, limit=limit + 1)
+        .add_columns(literal(feed).label("feed"))
+        .subquery()
+        for feed, filter_name in [
+            ("sent", "submitting_user_id"),
+            ("received", "receiving_user_id"),
+        ]
+    ]
+    rows = db.session.execute(
+        union_all(*(db.select(feed) for feed in feeds))
+    ).all()
+
+    # UNION ALL does not promise to keep the order of its parts
+    rows.sort(key=lambda row: (row.created_date, row.id), reverse=True)
+
+    pages = {}
+    for feed in ["sent", "received"]:
+        kudos = [row for row in rows if row.feed == feed]
+        next_cursor = None
+        if len(kudos) > limit:
+            kudos = kudos[:limit]
+            next_cursor = encode_feed_cursor(kudos[-1])
+        pages[feed] = (kudos, next_cursor)
+
+    return pages["sent"], pages["received"]
+
+
+# Function - Kudo Feed JSON
+def kudo_feed_json(kudo):
+    """
+    Returns a kudo of the feed as a JSON-serializable dictionary.
+    """
+
+    return {
+        "id": kudo.id,
+        "kudo_message": kudo.kudo_message,
+        "created_date": kudo.created_date.isoformat(),
+        "meme_url": (
+            meme_thumbnail_url(kudo.meme_id, kudo.meme_image_hash)
+            if kudo.meme_url else None
+        ),
+        "creating_user": {
+            "id": kudo.submitting_user_id,
+            "firstname": kudo.creating_user_firstname,
+            "lastname": kudo.creating_user_lastname,
+            "department_name": kudo.creating_user_department_name,
+        },
+        "receiving_user": {
+            "id": kudo.receiving_user_id,
+            "firstname": kudo.receiving_user_firstname,
+            "lastname": kudo.receiving_user_lastname,
+            "department_name": kudo.receiving_user_department_name,
+        },
+    }
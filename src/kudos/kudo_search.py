@@ -0,0 +1,187 @@
+"""
+Kudos - Kudo Search
+These are helper functions to search the kudo messages.
+
+On SQLite the messages are indexed in the kudo_search FTS5 table, an
+external content index over the kudos table kept in sync by triggers.
+Words are stemmed, so "migrations" also finds "migration", and "quoted
+words" are searched as a phrase. Results are ranked with bm25 and the
+matched terms are highlighted. Other databases fall back to LIKE filters
+and list the newest kudos first.
+"""
+
+# Imports
+import re
+from datetime import timedelta
+from markupsafe import Markup, escape
+from sqlalchemy import DDL, event
+from src import db
+from src.models import Kudo
+from src.kudos.kudo_feed import kudo_feed_query
+
+
+# Search index, created with the other tables and by the migrations
+KUDO_SEARCH_TABLE_DDL = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS kudo_search USING fts5(
+        kudo_message,
+        content = 'kudos',
+        content_rowid = 'id',
+        tokenize = 'porter unicode61 remove_diacritics 2'
+    )
+"""
+
+# Triggers keeping the search index up to date, by name
+KUDO_SEARCH_TRIGGERS = {
+    "kudo_search_insert": """
+    CREATE TRIGGER IF NOT EXISTS kudo_search_insert
+    AFTER INSERT ON kudos BEGIN
+        INSERT INTO kudo_search (rowid, kudo_message)
+        VALUES (NEW.id, NEW.kudo_message);
+    END
+    """,
+    "kudo_search_update": """
+    CREATE TRIGGER IF NOT EXISTS kudo_search_update
+    AFTER UPDATE OF kudo_message ON kudos BEGIN
+        INSERT INTO kudo_search (kudo_search, rowid, kudo_message)
+        VALUES ('delete', OLD.id, OLD.kudo_message);
+        INSERT INTO kudo_search (rowid, kudo_message)
+        VALUES (NEW.id, NEW.kudo_message);
+    END
+    """,
+    "kudo_search_delete": """
+    CREATE TRIGGER IF NOT EXISTS kudo_search_delete
+    AFTER DELETE ON kudos BEGIN
+        INSERT INTO kudo_search (kudo_search, rowid, kudo_message)
+        VALUES ('delete', OLD.id, OLD.kudo_message);
+    END
+    """,
+}
+
+for statement in [KUDO_SEARCH_TABLE_DDL, *KUDO_SEARCH_TRIGGERS.values()]:
+    event.listen(db.metadata, "after_create",
+                 DDL(statement).execute_if(dialect="sqlite"))
+event.listen(db.metadata, "before_drop",
+             DDL("DROP TABLE IF EXISTS kudo_search")
+             .execute_if(dialect="sqlite"))
+
+# The search index as seen by queries
+kudo_search_table = db.table("kudo_search", db.column("rowid"),
+                             db.column("rank"))
+
+# Highlight markers, replaced by <mark> tags once the message is escaped
+HIGHLIGHT_START = "\x02"
+HIGHLIGHT_END = "\x03"
+
+
+# Function - Search Terms
+def _search_terms(query):
+    """
+    Splits a search into its "quoted phrases" and words, dropping any other
+    FTS5 syntax.
+    """
+
+    terms = []
+    for phrase, word in re.findall(r'"([^"]*)"|(\w+)', query.lower()):
+        words = re.findall(r"\w+", phrase) if phrase else [word]
+        if words:
+            terms.append(" ".join(words))
+    return terms
+
+
+# Function - Highlighted Message
+def _highlighted_message(message):
+    """
+    Returns the message escaped for HTML with the matched terms in <mark>
+    tags.
+    """
+
+    return Markup(
+        str(escape(message or ""))
+        .replace(HIGHLIGHT_START, "<mark>")
+        .replace(HIGHLIGHT_END, "</mark>")
+    )
+
+
+# Function - Highlight Terms
+def _highlight_terms(message, terms):
+    """
+    Marks the terms in the message, for databases without the kudo_search
+    index.
+    """
+
+    if not message:
+        return message
+    pattern = "|".join(re.escape(term) for term in terms)
+    return re.sub(f"({pattern})",
+                  HIGHLIGHT_START + r"\1" + HIGHLIGHT_END,
+                  message, flags=re.IGNORECASE)
+
+
+# Function - Search Kudos
+def search_kudos(query, start_date=None, end_date=None, department_id=None,
+                 page=1, per_page=25):
+    """
+    Returns a page of the kudos matching the search, best matches first,
+    and whether there is a next page. The dates are inclusive and the
+    department is the one of the receiving user. Every kudo has a
+    highlighted_message with the matched terms in <mark> tags.
+    """
+
+    terms = _search_terms(query)
+    if not terms:
+        return [], False
+
+    kudos = kudo_feed_query(department_id=department_id)
+    if start_date is not None:
+        kudos = kudos.filter(Kudo.created_date >= start_date)
+    if end_date is not None:
+        kudos = kudos.filter(Kudo.created_date < end_date + timedelta(days=1))
+
+    if db.engine.dialect.name == "sqlite":
+        match = " ".join(f'"{term}"' for term in terms)
+        kudos = (
+            kudos.join(kudo_search_table,
+                       kudo_search_table.c.rowid == Kudo.id)
+            .add_columns(
+                db.func.highlight(db.literal_column("kudo_search"), 0,
+                                  HIGHLIGHT_START, HIGHLIGHT_END)
+                .label("marked_message")
+            )
+            .filter(db.literal_column("kudo_search").op("MATCH")(match))
+            .order_by(kudo_search_table.c.rank, Kudo.created_date.desc())
+        )
+    else:
+        for term in terms:
+            pattern = term.replace("%", r"\%").replace("_", r"\_")
+            kudos = kudos.filter(
+                Kudo.kudo_message.ilike(f"%{pattern}%", escape="\\"))
+        kudos = kudos.order_by(Kudo.created_date.desc(), Kudo.id.desc())
+
+    rows = kudos.limit(per_page + 1).offset((page - 1) * per_page).all()
+    has_next = len(rows) > per_page
+
+    results = []
+    for row in rows[:per_page]:
+        kudo = row._asdict()
+        marked_message = kudo.pop("marked_message", None)
+        if marked_message is None:
+            marked_message = _highlight_terms(row.kudo_message, terms)
+        kudo["highlighted_message"] = _highlighted_message(marked_message)
+        results.append(kudo)
+
+    return results, has_next
+
+
+# Function - Rebuild Kudo Search
+def rebuild_kudo_search():
+    """
+    Rebuilds the kudo_search index from the kudos table.
+    """
+
+    if db.engine.dialect.name != "sqlite":
+        return
+
+    db.session.execute(db.text(
+        "INSERT INTO kudo_search (kudo_search) VALUES ('rebuild')"
+    ))
+    db.session.commit()
@@ -0,0 +1,444 @@
+"""
+Kudos - Leaderboards
+These are helper functions to keep the kudo leaderboards in memory.
+
+The users who received and submitted the most kudos, and the departments
+that received the most, are counted over the dashboard chart windows that
+end today and over all time. The week, month and quarter are the rolling
+7, 30 and 90 days of the dashboard charts rather than calendar periods, so
+the charts read from the leaderboards count the same kudos as the charts
+of custom ranges read from the rollup tables. Every leaderboard is a count per user or
+department kept sorted by a SortedList, so adding a kudo takes O(log n)
+and reading the top entries takes microseconds. The daily counts of the
+windows are kept too, so a day that leaves a window is subtracted from it.
+
+The leaderboards are built from one snapshot of the rollup tables the
+first time they are read in a process, or when `flask serve` starts, and
+are swapped in once built. Kudos created by this process are added as
+they are created, and kudos created by other processes are read by id the
+next time the leaderboards are read after the kudos data version changed.
+Kudo ids can be committed out of
+order, so the ids skipped below the highest one seen are read again until
+they show up or MISSING_KUDO_TIMEOUT runs out.
+"""
+
+# Imports
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from sortedcontainers import SortedList
+from sqlalchemy import select
+from src import db
+from src.models import (
+    User,
+    Departments,
+    Kudo,
+    DataVersion,
+    KudoReceiverRollup,
+    KudoSubmitterRollup,
+    KudoDepartmentRollup,
+    KudoUserCount,
+)
+from src.kudos.dashboard_cache import KUDOS_DATA, get_data_version
+
+
+LEADERBOARDS = ("receivers", "submitters", "departments")
+
+# Windows kept in memory, in days ending today: the named dashboard chart
+# windows and the default one
+LEADERBOARD_WINDOWS = (7, 30, 90, 120, 365)
+DEFAULT_LEADERBOARD_SIZE = 5
+
+# New kudos read one by one before the leaderboards are rebuilt instead
+CATCH_UP_LIMIT = 10000
+
+# Skipped kudo ids read again, at most this many, well below SQLite's
+# limit of 999 values per IN clause, for at most this many seconds
+MAX_MISSING_KUDO_IDS = 500
+MISSING_KUDO_TIMEOUT = 300
+
+# Leaderboards of this process, the highest kudo id they hold, the skipped
+# ids, {id: time.monotonic() when skipped}, and the kudos data version they
+# were last caught up with
+_state = {"leaderboards": None, "last_kudo_id": None, "missing_ids": {},
+          "data_version": None}
+_leaderboards_lock = threading.RLock()
+# Only one rebuild at a time, without blocking the readers
+_rebuild_lock = threading.Lock()
+
+
+class Leaderboard:
+    """
+    Kudo counts per user or department, sorted by count
+    """
+
+    def __init__(self, counts=None):
+        self._counts = {key: count for key, count in (counts or {}).items()
+                        if count > 0}
+        # Highest count first, ties by the lowest id
+        self._ranking = SortedList(
+            (-count, key) for key, count in self._counts.items()
+        )
+
+    def add(self, key, amount=1):
+        """Adds kudos to the count of the key, or removes them"""
+        count = self._counts.pop(key, 0)
+        if count:
+            self._ranking.remove((-count, key))
+        if count + amount > 0:
+            self._counts[key] = count + amount
+            self._ranking.add((-(count + amount), key))
+
+    def top(self, limit=None):
+        """Returns the (key, count) pairs with the highest counts"""
+        return [(key, -count)
+                for count, key in self._ranking.islice(0, limit)]
+
+    def __len__(self):
+        return len(self._counts)
+
+
+class WindowedLeaderboards:
+    """
+    Leaderboards of one kind over every window ending today and over all
+    time, with the daily counts of the longest window
+    """
+
+    def __init__(self, today, daily_counts, all_time_counts):
+        self.today = today
+        oldest = today - timedelta(days=max(LEADERBOARD_WINDOWS) - 1)
+        self._days = {day: Counter(counts)
+                      for day, counts in daily_counts.items()
+                      if day >= oldest}
+        self.windows = {}
+        for days in LEADERBOARD_WINDOWS:
+            start = today - timedelta(days=days - 1)
+            counts = Counter()
+            for day, day_counts in self._days.items():
+                if start <= day <= today:
+                    counts.update(day_counts)
+            self.windows[days] = Leaderboard(counts)
+        self.all_time = Leaderboard(all_time_counts)
+
+    def advance(self, today):
+        """Moves the windows to end on today, removing the days they left"""
+        if today <= self.today:
+            return
+        for days, leaderboard in self.windows.items():
+            old_start = self.today - timedelta(days=days - 1)
+            new_start = today - timedelta(days=days - 1)
+            for day, counts in self._days.items():
+                if old_start <= day < new_start:
+                    for key, count in counts.items():
+                        leaderboard.add(key, -count)
+        oldest = today - timedelta(days=max(LEADERBOARD_WINDOWS) - 1)
+        for day in [day for day in self._days if day < oldest]:
+            del self._days[day]
+        self.today = today
+
+    def add(self, key, day):
+        """Adds a kudo given on the day to every window holding it"""
+        self.advance(day)
+        self.all_time.add(key)
+        if day <= self.today - timedelta(days=max(LEADERBOARD_WINDOWS)):
+            return
+        self._days.setdefault(day, Counter())[key] += 1
+        for days, leaderboard in self.windows.items():
+            if day > self.today - timedelta(days=days):
+                leaderboard.add(key)
+
+    def top(self, days, limit, today):
+        """Returns the top entries of the window, None for all time"""
+        self.advance(today)
+        if days is None:
+            return self.all_time.top(limit)
+        return self.windows[days].top(limit)
+
+
+# Function - Today
+def _today():
+    """
+    Returns today's date. Kudo dates are stored in UTC.
+    """
+
+    return datetime.utcnow().date()
+
+
+# Function - Snapshot Connection
+def _snapshot_connection():
+    """
+    Returns a connection whose reads all see the same committed data.
+    """
+
+    connection = db.engine.connect()
+    if connection.dialect.name == "sqlite":
+        # The SQLite driver only starts transactions on writes
+        connection.exec_driver_sql("BEGIN")
+    else:
+        connection.execution_options(isolation_level="REPEATABLE READ")
+    return connection
+
+
+# Function - Daily Counts
+def _daily_counts(connection, model, key_column, since):
+    """
+    Returns the kudo count per key and day in a rollup table since a day.
+    """
+
+    daily_counts = {}
+    rows = connection.execute(
+        select(model.day, key_column, model.count).where(model.day >= since)
+    )
+    for day, key, count in rows:
+        daily_counts.setdefault(day, {})[key] = count
+    return daily_counts
+
+
+# Function - Read Leaderboards
+def _read_leaderboards(today):
+    """
+    Returns the leaderboards, the highest kudo id they hold, the ids
+    skipped below it and the kudos data version, read from one snapshot.
+    """
+
+    since = today - timedelta(days=max(LEADERBOARD_WINDOWS) - 1)
+    connection = _snapshot_connection()
+    try:
+        data_version = tuple(connection.execute(
+            select(DataVersion.version, DataVersion.updated_date)
+            .where(DataVersion.name == KUDOS_DATA)
+        ).first() or (0, None))
+        last_kudo_id = connection.execute(
+            select(db.func.max(Kudo.id))).scalar() or 0
+        recent_ids = set(connection.execute(
+            select(Kudo.id).where(
+                Kudo.id > last_kudo_id - MAX_MISSING_KUDO_IDS)
+        ).scalars())
+
+        all_time = {
+            "receivers": dict(connection.execute(
+                select(KudoUserCount.user_id, KudoUserCount.received_count)
+            ).all()),
+            "submitters": dict(connection.execute(
+                select(KudoUserCount.user_id, KudoUserCount.sent_count)
+            ).all()),
+            "departments": dict(connection.execute(
+                select(KudoDepartmentRollup.department_id,
+                       db.func.sum(KudoDepartmentRollup.count))
+                .group_by(KudoDepartmentRollup.department_id)
+            ).all()),
+        }
+        daily = {
+            "receivers": _daily_counts(connection, KudoReceiverRollup,
+                                       KudoReceiverRollup.user_id, since),
+            "submitters": _daily_counts(connection, KudoSubmitterRollup,
+                                        KudoSubmitterRollup.user_id, since),
+            "departments": _daily_counts(
+                connection, KudoDepartmentRollup,
+                KudoDepartmentRollup.department_id, since),
+        }
+    finally:
+        connection.rollback()
+        connection.close()
+
+    leaderboards = {
+        leaderboard: WindowedLeaderboards(today, daily[leaderboard],
+                                          all_time[leaderboard])
+        for leaderboard in LEADERBOARDS
+    }
+    now = time.monotonic()
+    missing_ids = {
+        kudo_id: now for kudo_id in range(
+            max(1, last_kudo_id - MAX_MISSING_KUDO_IDS + 1), last_kudo_id)
+        if kudo_id not in recent_ids
+    }
+    return leaderboards, last_kudo_id, missing_ids, data_version
+
+
+# Function - Rebuild Leaderboards
+def rebuild_leaderboards(today=None):
+    """
+    Builds every leaderboard of this process from the rollup tables and
+    swaps them in.
+    """
+
+    with _rebuild_lock:
+        _swap_in(*_read_leaderboards(today or _today()))
+
+
+# Function - Replace Leaderboards
+def _replace_leaderboards(leaderboards):
+    """
+    Rebuilds the leaderboards, unless another thread replaced them while
+    this one waited for its rebuild.
+    """
+
+    with _rebuild_lock:
+        if _state["leaderboards"] is leaderboards:
+            _swap_in(*_read_leaderboards(_today()))
+
+
+# Function - Swap In
+def _swap_in(leaderboards, last_kudo_id, missing_ids, data_version):
+    """
+    Replaces the leaderboards of this process.
+    """
+
+    with _leaderboards_lock:
+        _state.update(leaderboards=leaderboards, last_kudo_id=last_kudo_id,
+                      missing_ids=missing_ids, data_version=data_version)
+
+
+# Function - Reset Leaderboards
+def reset_leaderboards():
+    """
+    Drops the leaderboards of this process, they are built again when next
+    read.
+    """
+
+    with _leaderboards_lock:
+        _state.update(leaderboards=None, last_kudo_id=None, missing_ids={},
+                      data_version=None)
+
+
+# Function - Add Kudo
+def _add_kudo(kudo_id, receiving_user_id, submitting_user_id, department_id,
+              day):
+    """
+    Adds a kudo to the leaderboards, unless they already hold it.
+    Call with the leaderboards lock held.
+    """
+
+    last_kudo_id = _state["last_kudo_id"]
+    missing_ids = _state["missing_ids"]
+    if kudo_id > last_kudo_id:
+        now = time.monotonic()
+        for missing_id in range(
+                max(last_kudo_id + 1, kudo_id - MAX_MISSING_KUDO_IDS),
+                kudo_id):
+            missing_ids[missing_id] = now
+        # The oldest skipped ids are given up first
+        for missing_id in list(missing_ids)[:-MAX_MISSING_KUDO_IDS]:
+            del missing_ids[missing_id]
+        _state["last_kudo_id"] = kudo_id
+    elif missing_ids.pop(kudo_id, None) is None:
+        return
+
+    leaderboards = _state["leaderboards"]
+    for leaderboard, key in (
+        ("receivers", receiving_user_id),
+        ("submitters", submitting_user_id),
+        ("departments", department_id),
+    ):
+        if key is not None:
+            leaderboards[leaderboard].add(key, day)
+
+
+# Function - Record Kudo
+def record_kudo_leaderboards(kudo, department_id):
+    """
+    Adds a new kudo to the leaderboards of this process, once it is
+    committed.
+    """
+
+    with _leaderboards_lock:
+        if _state["leaderboards"] is None:
+            return
+        _add_kudo(kudo.id, kudo.receiving_user_id, kudo.submitting_user_id,
+                  department_id, kudo.created_date.date())
+
+
+# Function - Catch Up
+def _catch_up():
+    """
+    Adds the kudos committed since the leaderboards were last updated,
+    rebuilding them when there are none, many new kudos, or the kudos
+    table was emptied. Nothing is read when the kudos data version did not
+    change since the last catch up.
+    """
+
+    # Read first, so the kudos read below are at least as new
+    data_version = get_data_version(KUDOS_DATA)
+    with _leaderboards_lock:
+        leaderboards = _state["leaderboards"]
+        if (leaderboards is not None
+                and _state["data_version"] == data_version):
+            return
+        last_kudo_id = _state["last_kudo_id"]
+        expired = time.monotonic() - MISSING_KUDO_TIMEOUT
+        missing_ids = _state["missing_ids"]
+        for kudo_id in [kudo_id for kudo_id, skipped in missing_ids.items()
+                        if skipped < expired]:
+            del missing_ids[kudo_id]
+        missing_ids = list(missing_ids)
+    if leaderboards is None:
+        _replace_leaderboards(leaderboards)
+        return
+
+    max_kudo_id = db.session.query(db.func.max(Kudo.id)).scalar() or 0
+    if (max_kudo_id < last_kudo_id
+            or max_kudo_id - last_kudo_id > CATCH_UP_LIMIT):
+        _replace_leaderboards(leaderboards)
+        return
+    new_kudos = []
+    if max_kudo_id > last_kudo_id or missing_ids:
+        new_kudos = (
+            db.session.query(
+                Kudo.id,
+                Kudo.receiving_user_id,
+                Kudo.submitting_user_id,
+                Kudo.created_date,
+                User.department_id,
+            )
+            .outerjoin(User, User.id == Kudo.receiving_user_id)
+            .filter((Kudo.id > last_kudo_id) | Kudo.id.in_(missing_ids))
+            .order_by(Kudo.id)
+            .all()
+        )
+    with _leaderboards_lock:
+        # Rebuilt in between, from newer data
+        if _state["leaderboards"] is not leaderboards:
+            return
+        for kudo in new_kudos:
+            _add_kudo(kudo.id, kudo.receiving_user_id,
+                      kudo.submitting_user_id, kudo.department_id,
+                      kudo.created_date.date())
+        _state["data_version"] = data_version
+
+
+# Function - Top Entries
+def top_entries(leaderboard, days=None, limit=DEFAULT_LEADERBOARD_SIZE,
+                today=None):
+    """
+    Returns the (id, count) pairs at the top of a leaderboard over the
+    window of days ending today, or over all time when days is None, after
+    adding the kudos created by other processes. A limit of None returns
+    every entry.
+    """
+
+    _catch_up()
+    with _leaderboards_lock:
+        return _state["leaderboards"][leaderboard].top(days, limit,
+                                                       today or _today())
+
+
+# Function - Entry Names
+def entry_names(leaderboard, keys):
+    """
+    Returns the name of every user or department id of a leaderboard.
+    """
+
+    if not keys:
+        return {}
+    if leaderboard == "departments":
+        return dict(
+            db.session.query(Departments.id, Departments.name)
+            .filter(Departments.id.in_(keys))
+            .all()
+        )
+    return {
+        user.id: f"{user.firstname} {user.lastname}"
+        for user in db.session.query(User.id, User.firstname, User.lastname)
+        .filter(User.id.in_(keys))
+    }
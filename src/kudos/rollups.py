@@ -0,0 +1,280 @@
+"""
+Kudos - Rollups
+These are helper functions to maintain and read the daily kudo rollup tables
+that back the kudos dashboard, and the per-user kudo totals shown on the
+profile page.
+"""
+
+# Imports
+from datetime import timedelta
+from sqlalchemy import Date, cast, insert
+from src import db
+from src.models import (
+    User,
+    Departments,
+    Kudo,
+    KudoReceiverRollup,
+    KudoSubmitterRollup,
+    KudoDepartmentRollup,
+    KudoUserCount,
+)
+from src.database.upsert import upsert
+from src.kudos.dashboard_cache import KUDOS_DATA, bump_data_version
+
+
+# Function - Kudo Day
+def _kudo_day(column):
+    """
+    Returns a SQL expression truncating a datetime column to its day.
+    SQLite stores datetimes as text, so CAST would not truncate them.
+    """
+
+    if db.engine.dialect.name == "sqlite":
+        return db.func.date(column)
+    return cast(column, Date)
+
+
+# Function - Increment Rollup
+def _increment_rollup(model, **keys):
+    """
+    Adds one to the rollup row for the given keys, creating it if needed.
+    """
+
+    upsert(model, dict(keys, count=1), {model.count: model.count + 1})
+
+
+# Function - Increment User Count
+def _increment_user_count(user_id, counter):
+    """
+    Adds one to a kudo counter of the user, creating the row if needed.
+    """
+
+    upsert(KudoUserCount, {"user_id": user_id, counter.key: 1},
+           {counter: counter + 1})
+
+
+# Function - Record Kudo
+def record_kudo_rollups(kudo):
+    """
+    Adds a new kudo to the rollup tables and the user kudo counts.
+    This does not commit, so the rollups are saved in the same transaction
+    as the kudo itself.
+    """
+
+    day = kudo.created_date.date()
+
+    _increment_rollup(KudoReceiverRollup, day=day,
+                      user_id=kudo.receiving_user_id)
+    _increment_rollup(KudoSubmitterRollup, day=day,
+                      user_id=kudo.submitting_user_id)
+    _increment_user_count(kudo.receiving_user_id,
+                          KudoUserCount.received_count)
+    _increment_user_count(kudo.submitting_user_id, KudoUserCount.sent_count)
+
+    department_id = (
+        db.session.query(User.department_id)
+        .filter(User.id == kudo.receiving_user_id)
+        .scalar()
+    )
+    if department_id is not None:
+        _increment_rollup(KudoDepartmentRollup, day=day,
+                          department_id=department_id)
+
+
+# Function - Rebuild Rollups
+def rebuild_kudo_rollups():
+    """
+    Rebuilds every rollup table and the user kudo counts from the kudos
+    table.
+    """
+
+    day = _kudo_day(Kudo.created_date)
+
+    db.session.query(KudoReceiverRollup).delete()
+    db.session.query(KudoSubmitterRollup).delete()
+    db.session.query(KudoDepartmentRollup).delete()
+    db.session.query(KudoUserCount).delete()
+
+    db.session.execute(
+        insert(KudoReceiverRollup).from_select(
+            ["day", "user_id", "count"],
+            db.select(day, Kudo.receiving_user_id, db.func.count(Kudo.id))
+            .where(Kudo.receiving_user_id.is_not(None))
+            .group_by(day, Kudo.receiving_user_id),
+        )
+    )
+    db.session.execute(
+        insert(KudoSubmitterRollup).from_select(
+            ["day", "user_id", "count"],
+            db.select(day, Kudo.submitting_user_id, db.func.count(Kudo.id))
+            .where(Kudo.submitting_user_id.is_not(None))
+            .group_by(day, Kudo.submitting_user_id),
+        )
+    )
+    db.session.execute(
+        insert(KudoDepartmentRollup).from_select(
+            ["day", "department_id", "count"],
+            db.select(day, User.department_id, db.func.count(Kudo.id))
+            .join(User, User.id == Kudo.receiving_user_id)
+            .where(User.department_id.is_not(None))
+            .group_by(day, User.department_id),
+        )
+    )
+    db.session.execute(
+        insert(KudoUserCount).from_select(
+            ["user_id", "sent_count", "received_count"],
+            db.select(
+                User.id,
+                db.select(db.func.count(Kudo.id))
+                .where(Kudo.submitting_user_id == User.id)
+                .scalar_subquery(),
+                db.select(db.func.count(Kudo.id))
+                .where(Kudo.receiving_user_id == User.id)
+                .scalar_subquery(),
+            ),
+        )
+    )
+
+    bump_data_version(KUDOS_DATA)
+    db.session.commit()
+
+
+# Function - Period Start
+def period_start(day, granularity):
+    """
+    Returns the first day of the day, week, month or quarter holding the
+    day.
+    """
+
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    if granularity == "quarter":
+        return day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1)
+    return day
+
+
+# Function - Next Period Start
+def _next_period_start(start, granularity):
+    """
+    Returns the first day of the period after the one starting on start.
+    """
+
+    if granularity == "week":
+        return start + timedelta(days=7)
+    if granularity in ("month", "quarter"):
+        month = start.month + (1 if granularity == "month" else 3)
+        return start.replace(year=start.year + (month - 1) // 12,
+                             month=(month - 1) % 12 + 1)
+    return start + timedelta(days=1)
+
+
+# Function - Period Label
+def period_label(start, granularity):
+    """
+    Returns the chart label of the period starting on start.
+    """
+
+    if granularity == "week":
+        return start.strftime("%G-W%V")
+    if granularity == "month":
+        return start.strftime("%Y-%m")
+    if granularity == "quarter":
+        return f"{start.year}-Q{(start.month - 1) // 3 + 1}"
+    return start.isoformat()
+
+
+# Function - Kudos Count by Period
+def kudos_count_by_period(start_date, end_date, granularity="month"):
+    """
+    Returns (period, count) pairs for kudos created between the start and
+    end dates, for every day, week, month or quarter in between.
+    Every kudo has exactly one receiver, so the receiver rollup holds the
+    total number of kudos per day.
+    """
+
+    daily_counts = (
+        db.session.query(
+            KudoReceiverRollup.day,
+            db.func.sum(KudoReceiverRollup.count).label("count"),
+        )
+        .filter(KudoReceiverRollup.day.between(start_date, end_date))
+        .group_by(KudoReceiverRollup.day)
+        .all()
+    )
+
+    period_counts = {}
+    for row in daily_counts:
+        start = period_start(row.day, granularity)
+        period_counts[start] = period_counts.get(start, 0) + row.count
+
+    counts = []
+    start = period_start(start_date, granularity)
+    while start <= end_date:
+        counts.append((period_label(start, granularity),
+                       period_counts.get(start, 0)))
+        start = _next_period_start(start, granularity)
+    return counts
+
+
+# Function - Top Users
+def _top_users(model, start_date, end_date, limit):
+    """
+    Returns the users with the most kudos in the given user rollup.
+    """
+
+    return (
+        db.session.query(
+            User.firstname,
+            User.lastname,
+            db.func.sum(model.count).label("count"),
+        )
+        .join(User, User.id == model.user_id)
+        .filter(model.day.between(start_date, end_date))
+        .group_by(model.user_id, User.firstname, User.lastname)
+        .order_by(db.desc("count"))
+        .limit(limit)
+        .all()
+    )
+
+
+# Function - Top Receivers
+def top_receivers(start_date, end_date, limit=5):
+    """
+    Returns the users who received the most kudos between the start and
+    end dates.
+    """
+
+    return _top_users(KudoReceiverRollup, start_date, end_date, limit)
+
+
+# Function - Top Submitters
+def top_submitters(start_date, end_date, limit=5):
+    """
+    Returns the users who submitted the most kudos between the start and
+    end dates.
+    """
+
+    return _top_users(KudoSubmitterRollup, start_date, end_date, limit)
+
+
+# Function - Kudos Count by Department
+def kudos_count_by_department(start_date, end_date):
+    """
+    Returns the kudo count per receiving department between the start and
+    end dates.
+    """
+
+    return (
+        db.session.query(
+            Departments.name.label("department_name"),
+            db.func.sum(KudoDepartmentRollup.count).label("count"),
+        )
+        .join(Departments,
+              Departments.id == KudoDepartmentRollup.department_id)
+        .filter(KudoDepartmentRollup.day.between(start_date, end_date))
+        .group_by(Departments.id, Departments.name)
+        .order_by(db.desc("count"))
+        .all()
+    )
@@ -4,14 +4,17 @@ This file contains the views for the kudos blueprint.
 """
 
 # Imports
-from datetime import datetime, timedelta
-from flask import render_template, url_for, flash, redirect, Blueprint
+from datetime import date, datetime
+from flask import (
+    render_template, url_for, flash, redirect, request, jsonify, abort,
+    make_response, Blueprint
+)
+from markupsafe import Markup
 from flask_login import login_required, current_user
 from src.kudos.forms import (
     KudoForm,
 )
-from flask_mail import Message
-from src import db, mail
+from src import db
 from src.models import (
     User,
     Departments,
@@ -20,6 +23,35 @@ from src.models import (
 )
 from src.kudos.generate_meme import (
     meme_templates,
+    meme_image_url,
+)
+from src.kudos.kudo_feed import (
+    kudo_feed_page,
+    kudo_feed_json,
+)
+from src.kudos.kudo_search import search_kudos
+from src.kudos.dashboard_cache import (
+    KUDOS_DATA,
+    bump_data_version,
+    get_data_version,
+    cached_fragment,
+    data_etag,
+    dashboard_etag,
+    is_not_modified,
+    conditional_response,
+)
+from src.outbox.outbox import queue_email
+from src.kudos.rollups import record_kudo_rollups
+from src.kudos.leaderboards import record_kudo_leaderboards
+from src.kudos.dashboard_charts import (
+    CHART_WINDOWS,
+    DEFAULT_WINDOW_DAYS,
+    GRANULARITIES,
+    DEFAULT_GRANULARITY,
+    DASHBOARD_CHARTS,
+    GRANULAR_CHARTS,
+    chart_range,
+    chart_data,
 )
 
 
@@ -27,142 +59,158 @@ from src.kudos.generate_meme import (
 kudos_bp = Blueprint("kudos", __name__)
 
 
+# Function - Dashboard Feed
+def _dashboard_feed():
+    """
+    Returns the rendered first page of the kudo feed.
+    """
+
+    # Get the last 10 created kudos
+    kudos, next_cursor = kudo_feed_page()
+
+    return Markup(render_template("kudos/kudo_feed.html",
+                                  kudos=kudos,
+                                  next_cursor=next_cursor))
+
+
 # Kudos - Landing Page
 @kudos_bp.route("/kudos")
 @login_required
 def kudos_landing_page():
     """
     Landing page for kudos
+    The feed is cached until a kudo or meme changes, and the page answers
+    304 when the browser already has it. The charts load their data from
+    kudos_chart once the page is shown.
     """
 
-    # Start Date for Dashboards (120 Days)
-    start_date = datetime.now() - timedelta(days=120)
+    version, updated_date = get_data_version(KUDOS_DATA)
+    stamp = (version, updated_date)
+    etag = dashboard_etag(stamp, current_user)
+    if is_not_modified(etag, updated_date):
+        return conditional_response(make_response("", 304), etag,
+                                    updated_date)
 
-    # Dashboard - Count
-    kudos_count = (
-        db.session.query(
-            db.func.count(Kudo.id).label("count"),
-            db.func.strftime("%Y-%m", Kudo.created_date).label("month")
-        )
-        .filter(Kudo.created_date >= start_date)
-        .group_by("month")
-        .all()
-    )
-    kudos_graph_labels = [kudo.month for kudo in kudos_count]
-    kudos_graph_data = [kudo.count for kudo in kudos_count]
-
-    # Dashboard - Top 5 Receiving Users
-    kudos_receiver = (
-        db.session.query(
-            User.firstname,
-            User.lastname,
-            db.func.count(Kudo.receiving_user_id).label("count")
-        )
-        .join(User, User.id == Kudo.receiving_user_id)
-        .filter(Kudo.created_date >= start_date)
-        .group_by(Kudo.receiving_user_id, User.firstname, User.lastname)
-        .order_by(db.desc("count"))
-        .limit(5)
-        .all()
-    )
-    kudos_receiver_labels = [
-        f"{kudo.firstname} {kudo.lastname}" for kudo in kudos_receiver
-        ]
-    kudos_receiver_data = [kudo.count for kudo in kudos_receiver]
-
-    # Dashboard - Top 5 Creating Users
-    kudos_creator = (
-        db.session.query(
-            User.firstname,
-            User.lastname,
-            db.func.count(Kudo.submitting_user_id).label("count")
+    kudo_feed_html = cached_fragment("feed", stamp, _dashboard_feed)
+
+    response = make_response(render_template(
+        "kudos/kudos.html",
+        title="Kudos",
+        kudo_feed_html=kudo_feed_html,
+        chart_windows=CHART_WINDOWS,
+        default_window_days=DEFAULT_WINDOW_DAYS,
+        granularities=GRANULARITIES,
+        default_granularity=DEFAULT_GRANULARITY,
+    ))
+    return conditional_response(response, etag, updated_date)
+
+
+# Kudos - Chart
+@kudos_bp.route("/kudos/charts/<chart>")
+@login_required
+def kudos_chart(chart):
+    """
+    Returns the data of a dashboard chart as JSON.
+    Pass window (week, month, quarter, year or a number of days) or start
+    and end dates, and granularity (day, week, month or quarter).
+    """
+
+    if chart not in DASHBOARD_CHARTS:
+        abort(404)
+
+    granularity = request.args.get("granularity", DEFAULT_GRANULARITY)
+    if granularity not in GRANULARITIES:
+        abort(400)
+    if chart not in GRANULAR_CHARTS:
+        granularity = DEFAULT_GRANULARITY
+
+    try:
+        start_date, end_date = chart_range(
+            window=request.args.get("window"),
+            start=request.args.get("start"),
+            end=request.args.get("end"),
         )
-        .join(User, User.id == Kudo.submitting_user_id)
-        .filter(Kudo.created_date >= start_date)
-        .group_by(Kudo.submitting_user_id, User.firstname, User.lastname)
-        .order_by(db.desc("count"))
-        .limit(5)
-        .all()
-    )
-    kudos_creator_labels = [
-        f"{kudo.firstname} {kudo.lastname}" for kudo in kudos_creator
-        ]
-    kudos_creator_data = [kudo.count for kudo in kudos_creator]
-
-    # Dashboard - Kudo Count by Department
-    kudos_department = (
-        db.session.query(
-            User.id.label("user_id"),
-            User.department_id.label("user_department_id"),
-            Departments.id.label("departments_id"),
-            Departments.name.label("department_name"),
-            Kudo.id.label("kudo_id"),
-            Kudo.receiving_user_id.label("kudo_receiving_user_id"),
-            db.func.count(Kudo.receiving_user_id).label("count")
+    except ValueError:
+        abort(400)
+
+    version, updated_date = get_data_version(KUDOS_DATA)
+    stamp = (version, updated_date)
+    key = ("chart", chart, start_date, end_date, granularity)
+    etag = data_etag(key, stamp)
+    if is_not_modified(etag, updated_date):
+        return conditional_response(make_response("", 304), etag,
+                                    updated_date)
+
+    data = cached_fragment(key, stamp, lambda: chart_data(
+        chart, start_date, end_date, granularity))
+
+    return conditional_response(jsonify(data), etag, updated_date)
+
+
+# Kudos - Feed
+@kudos_bp.route("/kudos/feed")
+@login_required
+def kudos_feed():
+    """
+    Returns a page of the kudo feed as JSON.
+    Pass the next_cursor of a page as the cursor to get the page after it.
+    """
+
+    limit = request.args.get("limit", 10, type=int)
+
+    try:
+        kudos, next_cursor = kudo_feed_page(
+            cursor=request.args.get("cursor"),
+            limit=max(1, min(limit, 50)),
+            submitting_user_id=request.args.get("submitter", type=int),
+            receiving_user_id=request.args.get("receiver", type=int),
+            department_id=request.args.get("department", type=int),
         )
-        .join(User, User.id == Kudo.receiving_user_id)
-        .join(Departments, Departments.id == User.department_id)
-        .filter(Kudo.created_date >= start_date)
-        .group_by(Departments.id, Departments.name)
-        .order_by(db.desc("count"))
-        .all()
+    except ValueError:
+        abort(400)
+
+    return jsonify(
+        kudos=[kudo_feed_json(kudo) for kudo in kudos],
+        next_cursor=next_cursor,
     )
-    kudos_department_labels = [
-        f"{kudo.department_name}" for kudo in kudos_department
-    ]
-    kudos_department_data = [kudo.count for kudo in kudos_department]
 
-    # Get the last 10 created kudos
-    CreatingUser = db.aliased(User, name="CreatingUser")
-    CreatingUserDepartment = db.aliased(
-        Departments, name="CreatingUserDepartment")
-    ReceivingUser = db.aliased(User, name="ReceivingUser")
-    ReceivingUserDepartment = db.aliased(
-        Departments, name="ReceivingUserDepartment")
-
-    kudos = (
-        db.session.query(
-            Kudo.id,
-            Kudo.submitting_user_id,
-            Kudo.receiving_user_id,
-            Kudo.kudo_message,
-            Kudo.created_date,
-            CreatingUser.firstname.label("creating_user_firstname"),
-            CreatingUser.lastname.label("creating_user_lastname"),
-            CreatingUser.department_id,
-            CreatingUserDepartment.name.label("creating_user_department_name"),
-            ReceivingUser.firstname.label("receiving_user_firstname"),
-            ReceivingUser.lastname.label("receiving_user_lastname"),
-            ReceivingUser.department_id,
-            ReceivingUserDepartment.name.label(
-                "receiving_user_department_name"),
-            Meme.meme_url,
-        )
-        .outerjoin(CreatingUser,
-                   CreatingUser.id == Kudo.submitting_user_id)
-        .outerjoin(CreatingUserDepartment,
-                   CreatingUserDepartment.id == CreatingUser.department_id)
-        .outerjoin(ReceivingUser,
-                   ReceivingUser.id == Kudo.receiving_user_id)
-        .outerjoin(ReceivingUserDepartment,
-                   ReceivingUserDepartment.id == ReceivingUser.department_id)
-        .outerjoin(Meme, Meme.kudo_id == Kudo.id)
-        .order_by(Kudo.created_date.desc())
-        .limit(10)
+
+# Kudos - Search
+@kudos_bp.route("/kudos/search")
+@login_required
+def kudos_search():
+    """
+    Search the kudo messages, optionally between two dates and for the
+    department of the receiving user.
+    """
+
+    query = request.args.get("q", "")
+    start_date = request.args.get("start_date", type=date.fromisoformat)
+    end_date = request.args.get("end_date", type=date.fromisoformat)
+    department_id = request.args.get("department", type=int)
+    page = max(1, request.args.get("page", 1, type=int))
+
+    kudos, has_next = search_kudos(
+        query,
+        start_date=start_date,
+        end_date=end_date,
+        department_id=department_id,
+        page=page,
     )
 
+    departments = Departments.query.order_by(Departments.name.asc()).all()
+
     return render_template(
-        "kudos/kudos.html",
-        title="Kudos",
+        "kudos/search.html",
+        title="Search Kudos",
+        query=query,
+        start_date=start_date,
+        end_date=end_date,
+        department_id=department_id,
+        departments=departments,
         kudos=kudos,
-        kudos_graph_labels=kudos_graph_labels,
-        kudos_graph_data=kudos_graph_data,
-        kudos_receiver_labels=kudos_receiver_labels,
-        kudos_receiver_data=kudos_receiver_data,
-        kudos_creator_labels=kudos_creator_labels,
-        kudos_creator_data=kudos_creator_data,
-        kudos_department_labels=kudos_department_labels,
-        kudos_department_data=kudos_department_data,
+        page=page,
+        has_next=has_next,
     )
 
 
@@ -176,25 +224,23 @@ def create_kudo():
 
     form = KudoForm()
 
-    # User choices
-    active_users = (
-        db.session.query(
-            User.id,
-            User.firstname,
-            User.lastname,
-            User.status,
+    # Recipient choice - users are searched as the user types, so only the
+    # submitted recipient is rendered, after checking it can receive kudos
+    receiving_user = None
+    if form.receiving_user_id.data:
+        receiving_user = (
+            User.query.filter_by(id=form.receiving_user_id.data,
+                                 status="active")
+            .filter(User.id != current_user.id)
+            .first()
         )
-        .filter(User.status == "active")
-        .filter(User.id != current_user.id)
-        .order_by(User.lastname.asc())
-        .all()
-    )
 
-    form.receiving_user_id.choices = [
-        (0, "Select a user")
-    ] + [
-        (user.id, user.firstname + " " + user.lastname)
-        for user in active_users]
+    form.receiving_user_id.choices = [(0, "Select a user")]
+    if receiving_user is not None:
+        form.receiving_user_id.choices.append(
+            (receiving_user.id,
+             receiving_user.firstname + " " + receiving_user.lastname)
+        )
 
     # Meme choices
     form.meme_template.choices = [
@@ -208,8 +254,8 @@ def create_kudo():
     # If form is submitted and valid, create kudo
     if form.validate_on_submit():
 
-        # If user selects "0, Select a user", flash error message
-        if form.receiving_user_id.data == 0:
+        # If the user did not select a valid recipient, flash error message
+        if receiving_user is None:
             flash("Please select a user", "danger")
             return render_template("kudos/create_kudo.html",
                                    title="Create Kudo",
@@ -225,11 +271,15 @@ def create_kudo():
         )
 
         db.session.add(new_kudo)
-        db.session.commit()
+        db.session.flush()
+        record_kudo_rollups(new_kudo)
+        bump_data_version(KUDOS_DATA)
 
         # If user selects a meme, create new meme
-        meme_url_concat = (
-            f"https://api.memegen.link/images/{form.meme_template.data}/{form.meme_top_text.data}/{form.meme_bottom_text.data}.png"
+        meme_url_concat = meme_image_url(
+            form.meme_template.data,
+            form.meme_top_text.data,
+            form.meme_bottom_text.data,
         )
 
         if form.meme_template.data:
@@ -244,29 +294,25 @@ def create_kudo():
             )
 
             db.session.add(new_meme)
-            db.session.commit()
-
-        flash("Kudo created successfully!", "success")
 
-        # Send email to receiving user
-        receiving_user = (
-            User.query.filter_by(id=form.receiving_user_id.data).first()
-        )
-
-        msg = Message(
+        # Queue email to receiving user
+        queue_email(
             "KudoTrio - You have a new kudo!",
             recipients=[receiving_user.email],
-            sender="noreply@healthtrio.com",
-        )
-        msg.body = f"""
+            body=f"""
 Hello {receiving_user.firstname},
 
 You have a new kudo from
 {current_user.firstname} {current_user.lastname}.
 
 Log in to view your kudos.
-        """
-        mail.send(msg)
+        """,
+        )
+
+        department_id = receiving_user.department_id
+        db.session.commit()
+        record_kudo_leaderboards(new_kudo, department_id)
+        flash("Kudo created successfully!", "success")
 
         return redirect(url_for("kudos.kudos_landing_page"))
 
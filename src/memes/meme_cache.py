@@ -0,0 +1,206 @@
+"""
+Memes - Meme Cache
+These are helper functions to cache the meme images on disk.
+
+Every meme image is fetched from memegen.link once, stored under the
+SHA-256 of its content and recorded on the Meme. The feed then shows a
+thumbnail served from the cache, so viewers never wait on memegen.link and
+a cached image never changes once it has been written.
+"""
+
+# Imports
+import hashlib
+import io
+import os
+import re
+import tempfile
+import threading
+import requests
+from flask import current_app, url_for
+from PIL import Image, UnidentifiedImageError
+from src import db
+from src.kudos.generate_meme import meme_image_url
+
+
+# Content hashes, as used in the cache file names
+IMAGE_HASH_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+# One fetch per meme at a time in this process, with the lock of each meme
+# and the number of requests holding or waiting for it
+_fetch_locks = {}
+_fetch_locks_lock = threading.Lock()
+
+
+# Function - Image Path
+def image_path(image_hash):
+    """
+    Returns the cache path of an original meme image.
+    """
+
+    return os.path.join(current_app.config["MEME_CACHE_DIR"], "images",
+                        image_hash[:2], f"{image_hash}.png")
+
+
+# Function - Thumbnail Path
+def thumbnail_path(image_hash, width):
+    """
+    Returns the cache path of a meme thumbnail.
+    """
+
+    return os.path.join(current_app.config["MEME_CACHE_DIR"], "thumbnails",
+                        str(width), image_hash[:2], f"{image_hash}.png")
+
+
+# Function - Write Atomically
+def _write_atomically(path, data):
+    """
+    Writes the file under a temporary name and moves it in place, so a
+    half written file is never served.
+    """
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "wb") as temp_file:
+            temp_file.write(data)
+        os.replace(temp_path, path)
+    except OSError:
+        os.unlink(temp_path)
+        raise
+
+
+# Function - Download Image
+def _download_image(url):
+    """
+    Returns the image at the URL as PNG bytes, or None if it cannot be
+    fetched or is not an image.
+    """
+
+    config = current_app.config
+    max_bytes = config["MEME_IMAGE_MAX_BYTES"]
+
+    try:
+        with requests.get(url, timeout=config["MEME_IMAGE_TIMEOUT"],
+                          stream=True) as response:
+            response.raise_for_status()
+            chunks = []
+            size = 0
+            for chunk in response.iter_content(64 * 1024):
+                chunks.append(chunk)
+                size += len(chunk)
+                if size > max_bytes:
+                    return None
+            data = b"".join(chunks)
+
+        with Image.open(io.BytesIO(data)) as image:
+            if image.format == "PNG":
+                return data
+            png = io.BytesIO()
+            image.save(png, "PNG")
+            return png.getvalue()
+    except (requests.RequestException, UnidentifiedImageError,
+            Image.DecompressionBombError, OSError):
+        current_app.logger.warning("Could not fetch meme image %s", url)
+        return None
+
+
+# Function - Acquire Fetch Lock
+def _acquire_fetch_lock(meme_id):
+    """
+    Returns the fetch lock of the meme, counting this request as a waiter.
+    """
+
+    with _fetch_locks_lock:
+        entry = _fetch_locks.setdefault(meme_id, [threading.Lock(), 0])
+        entry[1] += 1
+        return entry[0]
+
+
+# Function - Release Fetch Lock
+def _release_fetch_lock(meme_id):
+    """
+    Stops counting this request as a waiter, and removes the fetch lock of
+    the meme once no request holds or waits for it.
+    """
+
+    with _fetch_locks_lock:
+        entry = _fetch_locks[meme_id]
+        entry[1] -= 1
+        if entry[1] == 0:
+            del _fetch_locks[meme_id]
+
+
+# Function - Cache Meme Image
+def cache_meme_image(meme):
+    """
+    Returns the content hash of the meme image, fetching and storing it the
+    first time. Returns None if the image cannot be fetched.
+    """
+
+    if meme.image_hash and os.path.exists(image_path(meme.image_hash)):
+        return meme.image_hash
+
+    lock = _acquire_fetch_lock(meme.id)
+    try:
+        with lock:
+            # Another request may have fetched it while this one waited
+            db.session.refresh(meme)
+            if (meme.image_hash
+                    and os.path.exists(image_path(meme.image_hash))):
+                return meme.image_hash
+
+            data = _download_image(meme_image_url(
+                meme.meme_template, meme.meme_top_text,
+                meme.meme_bottom_text))
+            if data is None:
+                return None
+
+            image_hash = hashlib.sha256(data).hexdigest()
+            if not os.path.exists(image_path(image_hash)):
+                _write_atomically(image_path(image_hash), data)
+
+            # Feeds rendered before keep the meme thumbnail URL, which
+            # redirects here, so the dashboard caches stay valid
+            meme.image_hash = image_hash
+            db.session.commit()
+            return image_hash
+    finally:
+        _release_fetch_lock(meme.id)
+
+
+# Function - Cached Thumbnail
+def cached_thumbnail(image_hash, width):
+    """
+    Returns the path of the thumbnail of a cached image, creating it the
+    first time. Returns None if the image is not cached.
+    """
+
+    path = thumbnail_path(image_hash, width)
+    if os.path.exists(path):
+        return path
+
+    source = image_path(image_hash)
+    if not os.path.exists(source):
+        return None
+
+    with Image.open(source) as image:
+        image.thumbnail((width, width * 4))
+        thumbnail = io.BytesIO()
+        image.save(thumbnail, "PNG", optimize=True)
+
+    _write_atomically(path, thumbnail.getvalue())
+    return path
+
+
+# Function - Meme Thumbnail URL
+def meme_thumbnail_url(meme_id, image_hash=None):
+    """
+    Returns the URL of the feed thumbnail of a meme. Memes that are not
+    cached yet go through a redirect that caches them.
+    """
+
+    if image_hash:
+        return url_for("memes.meme_thumbnail",
+                       width=current_app.config["MEME_THUMBNAIL_WIDTH"],
+                       image_hash=image_hash)
+    return url_for("memes.meme_thumbnail_by_id", meme_id=meme_id)
@@ -0,0 +1,98 @@
+"""
+Memes - Views
+This file contains the views for the memes blueprint, which serves the
+cached meme images.
+"""
+
+# Imports
+import os
+from flask import current_app, redirect, send_file, abort, Blueprint
+from flask_login import login_required
+from src.models import Meme
+from src.memes.meme_cache import (
+    IMAGE_HASH_PATTERN,
+    image_path,
+    cache_meme_image,
+    cached_thumbnail,
+    meme_thumbnail_url,
+)
+
+
+# Blueprint Configuration
+memes_bp = Blueprint("memes", __name__)
+
+# Templates build the feed thumbnail URLs
+memes_bp.add_app_template_global(meme_thumbnail_url)
+
+# Cached images never change, so browsers can keep them for a year
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+# Function - Send Cached Image
+def _send_cached_image(path, etag):
+    """
+    Sends a cached image with its ETag and immutable caching headers.
+    The images are only shown to logged in users, so shared caches must
+    not keep them.
+    """
+
+    response = send_file(path, mimetype="image/png", etag=etag,
+                         max_age=IMMUTABLE_MAX_AGE, conditional=True)
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.immutable = True
+    return response
+
+
+# Memes - Thumbnail by Meme
+@memes_bp.route("/memes/<int:meme_id>/thumbnail")
+@login_required
+def meme_thumbnail_by_id(meme_id):
+    """
+    Caches the meme image and redirects to its thumbnail.
+    """
+
+    meme = Meme.query.get_or_404(meme_id)
+
+    image_hash = cache_meme_image(meme)
+    if image_hash is None:
+        abort(502)
+
+    return redirect(meme_thumbnail_url(meme.id, image_hash))
+
+
+# Memes - Thumbnail
+@memes_bp.route("/memes/thumbnails/<int:width>/<image_hash>.png")
+@login_required
+def meme_thumbnail(width, image_hash):
+    """
+    Serves the thumbnail of a cached meme image.
+    """
+
+    if (width != current_app.config["MEME_THUMBNAIL_WIDTH"]
+            or not IMAGE_HASH_PATTERN.match(image_hash)):
+        abort(404)
+
+    path = cached_thumbnail(image_hash, width)
+    if path is None:
+        abort(404)
+
+    return _send_cached_image(path, f"{image_hash}-{width}")
+
+
+# Memes - Image
+@memes_bp.route("/memes/images/<image_hash>.png")
+@login_required
+def meme_image(image_hash):
+    """
+    Serves a cached meme image at full size.
+    """
+
+    if not IMAGE_HASH_PATTERN.match(image_hash):
+        abort(404)
+
+    path = image_path(image_hash)
+    if not os.path.exists(path):
+        abort(404)
+
+    return _send_cached_image(path, image_hash)
@@ -6,19 +6,26 @@ This file contains the models for the database.
 # Imports
 from datetime import datetime
 from flask import flash, redirect, url_for
-from werkzeug.security import check_password_hash
 from flask_login import UserMixin
 from src import db, login_manager
+from src.users.identity_cache import get_identity
+from src.users.passwords import check_password
 
 
 # Model - Users
 @login_manager.user_loader
 def load_user(user_id):
     """
-    Returns the user object based on the user id
+    Returns the cached identity of the user based on the user id
+    Inactive users are not loaded, which logs them out.
     """
 
-    return User.query.get(user_id)
+    try:
+        user_id = int(user_id)
+    except ValueError:
+        return None
+
+    return get_identity(user_id, lambda user_id: db.session.get(User, user_id))
 
 
 @login_manager.unauthorized_handler
@@ -56,9 +63,14 @@ class User(db.Model, UserMixin):
     updated_date = db.Column(db.DateTime)
     updated_by = db.Column(db.Integer, db.ForeignKey("users.id"))
 
+    @property
+    def is_active(self):
+        """Only active users can log in"""
+        return self.status == "active"
+
     def check_password(self, password):
-        """Checks if the password is correct"""
-        return check_password_hash(self.password_hash, password)
+        """Checks if the password is correct, in the password hashing pool"""
+        return check_password(self.password_hash, password)
 
     def __repr__(self):
         return f"Username: {self.username}"
@@ -92,6 +104,15 @@ class Kudo(db.Model):
     """
 
     __tablename__ = "kudos"
+    __table_args__ = (
+        # Kudo feed, newest first
+        db.Index("ix_kudos_created_date", "created_date"),
+        # Profile feeds and per-user dashboards, newest first
+        db.Index("ix_kudos_receiving_user_id_created_date",
+                 "receiving_user_id", "created_date"),
+        db.Index("ix_kudos_submitting_user_id_created_date",
+                 "submitting_user_id", "created_date"),
+    )
 
     # IDs and Foreign Keys
     id = db.Column(db.Integer, primary_key=True)
@@ -119,12 +140,14 @@ class Meme(db.Model):
 
     # IDs and Foreign Keys
     id = db.Column(db.Integer, primary_key=True)
-    kudo_id = db.Column(db.Integer, db.ForeignKey("kudos.id"))
+    kudo_id = db.Column(db.Integer, db.ForeignKey("kudos.id"), index=True)
     # Meme information
     meme_template = db.Column(db.Text)
     meme_top_text = db.Column(db.Text)
     meme_bottom_text = db.Column(db.Text)
     meme_url = db.Column(db.Text)
+    # SHA-256 of the image in the meme cache, once it has been fetched
+    image_hash = db.Column(db.String(64))
     # Change tracking
     created_date = db.Column(db.DateTime, nullable=False,
                              default=datetime.utcnow)
@@ -136,3 +159,204 @@ class Meme(db.Model):
         return f"""
     Meme: {self.meme_template} - {self.meme_top_text} - {self.meme_bottom_text}
     """
+
+
+class KudoReceiverRollup(db.Model):
+    """
+    Daily kudo counts per receiving user
+    """
+
+    __tablename__ = "kudo_rollup_receivers"
+
+    # Rollup keys
+    day = db.Column(db.Date, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"),
+                        primary_key=True)
+    # Rollup values
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"Receiver Rollup: {self.day} - {self.user_id} - {self.count}"
+
+
+class KudoSubmitterRollup(db.Model):
+    """
+    Daily kudo counts per submitting user
+    """
+
+    __tablename__ = "kudo_rollup_submitters"
+
+    # Rollup keys
+    day = db.Column(db.Date, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"),
+                        primary_key=True)
+    # Rollup values
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"Submitter Rollup: {self.day} - {self.user_id} - {self.count}"
+
+
+class KudoDepartmentRollup(db.Model):
+    """
+    Daily kudo counts per department of the receiving user
+    """
+
+    __tablename__ = "kudo_rollup_departments"
+
+    # Rollup keys
+    day = db.Column(db.Date, primary_key=True)
+    department_id = db.Column(db.Integer, db.ForeignKey("departments.id"),
+                              primary_key=True)
+    # Rollup values
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return (
+            f"Department Rollup: {self.day} - {self.department_id} - "
+            f"{self.count}"
+        )
+
+
+class KudoUserCount(db.Model):
+    """
+    Total kudos sent and received per user
+    """
+
+    __tablename__ = "kudo_user_counts"
+
+    # IDs and Foreign Keys
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"),
+                        primary_key=True)
+    # Counters
+    sent_count = db.Column(db.Integer, nullable=False, default=0,
+                           server_default="0")
+    received_count = db.Column(db.Integer, nullable=False, default=0,
+                               server_default="0")
+
+    def __repr__(self):
+        return (
+            f"User Kudo Count: {self.user_id} - {self.sent_count} - "
+            f"{self.received_count}"
+        )
+
+
+class DataVersion(db.Model):
+    """
+    Version stamp of a set of data, bumped in the same transaction as every
+    change to it, so cached pages built from it can be checked cheaply
+    """
+
+    __tablename__ = "data_versions"
+
+    # IDs
+    name = db.Column(db.String(255), primary_key=True)
+    # Version information
+    version = db.Column(db.Integer, nullable=False, default=0,
+                        server_default="0")
+    updated_date = db.Column(db.DateTime, nullable=False,
+                             default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"Data Version: {self.name} - {self.version}"
+
+
+class OutboxEmail(db.Model):
+    """
+    Outgoing email model
+    Emails are written here in the same transaction as the change that
+    sends them and are delivered by the outbox worker.
+    """
+
+    __tablename__ = "outbox_emails"
+    __table_args__ = (
+        # Outbox worker - next emails due
+        db.Index("ix_outbox_emails_status_next_attempt_date",
+                 "status", "next_attempt_date"),
+    )
+
+    # IDs
+    id = db.Column(db.Integer, primary_key=True)
+    # Email information
+    subject = db.Column(db.Text)
+    sender = db.Column(db.String(255))
+    recipients = db.Column(db.Text)
+    body = db.Column(db.Text)
+    # Delivery information
+    status = db.Column(db.String(255), nullable=False, default="pending")
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_date = db.Column(db.DateTime, nullable=False,
+                                  default=datetime.utcnow)
+    claim_token = db.Column(db.String(255))
+    last_error = db.Column(db.Text)
+    sent_date = db.Column(db.DateTime)
+    # Change tracking
+    created_date = db.Column(db.DateTime, nullable=False,
+                             default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"Outbox Email: {self.subject} - {self.status}"
+
+
+class UserImport(db.Model):
+    """
+    Bulk user import model
+    Tracks an uploaded CSV file from staging to the end of the import.
+    """
+
+    __tablename__ = "user_imports"
+
+    # IDs
+    id = db.Column(db.Integer, primary_key=True)
+    # Import progress
+    status = db.Column(db.String(255), nullable=False, default="pending")
+    total_rows = db.Column(db.Integer, nullable=False, default=0)
+    processed_rows = db.Column(db.Integer, nullable=False, default=0)
+    invalid_count = db.Column(db.Integer, nullable=False, default=0)
+    created_count = db.Column(db.Integer, nullable=False, default=0)
+    skipped_count = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text)
+    # Import worker - runs of the import, and what it needs from the request
+    attempts = db.Column(db.Integer, nullable=False, default=0,
+                         server_default="0")
+    imported_by = db.Column(db.Integer, db.ForeignKey("users.id"))
+    login_url = db.Column(db.String(255))
+    # Change tracking
+    created_date = db.Column(db.DateTime, nullable=False,
+                             default=datetime.utcnow)
+    created_by = db.Column(db.Integer, db.ForeignKey("users.id"))
+    updated_date = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f"User Import: {self.id} - {self.status}"
+
+
+class UserImportRow(db.Model):
+    """
+    Staged bulk user import row model
+    Holds one parsed and validated row of an uploaded CSV file.
+    """
+
+    __tablename__ = "user_import_rows"
+    __table_args__ = (
+        # Preview pages and import, in file order
+        db.Index("ix_user_import_rows_import_id_row_number",
+                 "import_id", "row_number"),
+    )
+
+    # IDs and Foreign Keys
+    id = db.Column(db.Integer, primary_key=True)
+    import_id = db.Column(db.Integer, db.ForeignKey("user_imports.id"),
+                          nullable=False)
+    row_number = db.Column(db.Integer, nullable=False)
+    # User information
+    first_name = db.Column(db.String(255))
+    last_name = db.Column(db.String(255))
+    email = db.Column(db.String(255))
+    department = db.Column(db.String(255))
+    role = db.Column(db.String(255))
+    # Validation
+    error = db.Column(db.Text)
+
+    def __repr__(self):
+        return f"User Import Row: {self.import_id} - {self.row_number}"
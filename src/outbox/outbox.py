@@ -0,0 +1,282 @@
+"""
+Outbox - Email Outbox
+These are helper functions to queue outgoing emails and to deliver them
+from a separate worker process.
+
+Views only write to the outbox table, so request latency no longer depends
+on the SMTP server. The worker claims due emails in batches, sends them
+over one SMTP connection and retries failures with exponential backoff
+until they are moved to the dead state.
+
+Every email is committed as soon as it is sent or failed, and its attempt
+is counted before it is sent, so a crashed worker neither sends delivered
+emails again nor retries an email that crashes it forever. Emails can
+hold temporary passwords, so the body is cleared once an email is sent,
+and dead emails keep theirs for OUTBOX_DEAD_RETENTION_HOURS to be
+requeued.
+"""
+
+# Imports
+import time
+import uuid
+from datetime import datetime, timedelta
+from flask import current_app
+from flask_mail import Message
+from sqlalchemy import insert
+from src import db, mail
+from src.models import OutboxEmail
+
+
+# Function - Outbox Values
+def _outbox_values(subject, recipients, body, sender):
+    """
+    Returns the column values of a new outbox email.
+    """
+
+    now = datetime.utcnow()
+    return {
+        "subject": subject,
+        "sender": sender,
+        "recipients": ",".join(recipients),
+        "body": body,
+        "status": "pending",
+        "attempts": 0,
+        "next_attempt_date": now,
+        "created_date": now,
+    }
+
+
+# Function - Queue Email
+def queue_email(subject, recipients, body, sender="noreply@healthtrio.com"):
+    """
+    Adds an email to the outbox.
+    This does not commit, so the email is only sent if the change that
+    triggered it is committed.
+    """
+
+    email = OutboxEmail(**_outbox_values(subject, recipients, body, sender))
+    db.session.add(email)
+    return email
+
+
+# Function - Queue Emails
+def queue_emails(emails, sender="noreply@healthtrio.com"):
+    """
+    Adds many emails to the outbox with a single executemany.
+    Each email is a dictionary with a subject, recipients and body.
+    This does not commit either.
+    """
+
+    if not emails:
+        return
+    db.session.execute(
+        insert(OutboxEmail),
+        [
+            _outbox_values(email["subject"], email["recipients"],
+                           email["body"], sender)
+            for email in emails
+        ],
+    )
+
+
+# Function - Claim Outbox Batch
+def _claim_outbox_batch(batch_size, lease_seconds, max_attempts):
+    """
+    Claims the next due emails for this worker.
+    A claim is a lease: if the worker dies while sending, the emails become
+    due again once the lease runs out.
+    """
+
+    now = datetime.utcnow()
+    claim_token = uuid.uuid4().hex
+
+    # Emails whose worker died while sending them on their last attempt
+    (
+        db.session.query(OutboxEmail)
+        .filter(OutboxEmail.status == "sending")
+        .filter(OutboxEmail.next_attempt_date <= now)
+        .filter(OutboxEmail.attempts >= max_attempts)
+        .update({
+            OutboxEmail.status: "dead",
+            OutboxEmail.claim_token: None,
+            OutboxEmail.last_error: "The worker stopped while sending",
+        }, synchronize_session=False)
+    )
+
+    due_ids = [
+        email.id for email in (
+            db.session.query(OutboxEmail.id)
+            .filter(OutboxEmail.status.in_(["pending", "sending"]))
+            .filter(OutboxEmail.next_attempt_date <= now)
+            .order_by(OutboxEmail.next_attempt_date)
+            .limit(batch_size)
+        )
+    ]
+    if not due_ids:
+        return []
+
+    # Only emails still due are claimed, so two workers never share one
+    (
+        db.session.query(OutboxEmail)
+        .filter(OutboxEmail.id.in_(due_ids))
+        .filter(OutboxEmail.status.in_(["pending", "sending"]))
+        .filter(OutboxEmail.next_attempt_date <= now)
+        .update({
+            OutboxEmail.status: "sending",
+            OutboxEmail.claim_token: claim_token,
+            OutboxEmail.next_attempt_date:
+                now + timedelta(seconds=lease_seconds),
+        }, synchronize_session=False)
+    )
+    db.session.commit()
+
+    return (
+        OutboxEmail.query.filter(OutboxEmail.id.in_(due_ids))
+        .filter_by(claim_token=claim_token, status="sending")
+        .order_by(OutboxEmail.id)
+        .all()
+    )
+
+
+# Function - Email Failed
+def _email_failed(email, error, config):
+    """
+    Schedules the next attempt for a failed email, or moves it to the dead
+    state once it has used all of its attempts.
+    """
+
+    email.last_error = str(error)
+    email.claim_token = None
+
+    if email.attempts >= config["OUTBOX_MAX_ATTEMPTS"]:
+        email.status = "dead"
+        return
+
+    backoff = min(
+        config["OUTBOX_BACKOFF_SECONDS"] * 2 ** (email.attempts - 1),
+        config["OUTBOX_BACKOFF_MAX_SECONDS"],
+    )
+    email.status = "pending"
+    email.next_attempt_date = datetime.utcnow() + timedelta(seconds=backoff)
+
+
+# Function - Send Outbox Batch
+def send_outbox_batch():
+    """
+    Sends one batch of due emails.
+    Returns the number of emails that were attempted.
+    """
+
+    config = current_app.config
+    emails = _claim_outbox_batch(config["OUTBOX_BATCH_SIZE"],
+                                 config["OUTBOX_LEASE_SECONDS"],
+                                 config["OUTBOX_MAX_ATTEMPTS"])
+    if not emails:
+        return 0
+
+    attempted = set()
+    try:
+        with mail.connect() as connection:
+            for email in emails:
+                msg = Message(
+                    email.subject,
+                    recipients=email.recipients.split(","),
+                    sender=email.sender,
+                )
+                msg.body = email.body
+
+                # Counted first, in case sending this email kills the worker
+                email.attempts += 1
+                db.session.commit()
+                attempted.add(email.id)
+
+                try:
+                    connection.send(msg)
+                except Exception as e:
+                    _email_failed(email, e, config)
+                    db.session.commit()
+                    continue
+                email.status = "sent"
+                email.claim_token = None
+                email.body = None
+                email.sent_date = datetime.utcnow()
+                db.session.commit()
+    except Exception as e:
+        # The SMTP connection or the database failed, so every unsent email
+        # is retried. The emails are reloaded as they were last committed.
+        db.session.rollback()
+        for email in emails:
+            if email.status == "sending":
+                if email.id not in attempted:
+                    email.attempts += 1
+                _email_failed(email, e, config)
+        db.session.commit()
+
+    return len(emails)
+
+
+# Function - Redact Outbox Emails
+def redact_outbox_emails():
+    """
+    Clears the body of sent emails, and of dead emails older than
+    OUTBOX_DEAD_RETENTION_HOURS, which can no longer be requeued.
+    Returns the number of emails redacted.
+    """
+
+    dead_before = datetime.utcnow() - timedelta(
+        hours=current_app.config["OUTBOX_DEAD_RETENTION_HOURS"]
+    )
+    redacted = (
+        db.session.query(OutboxEmail)
+        .filter(OutboxEmail.body.isnot(None))
+        .filter(
+            (OutboxEmail.status == "sent")
+            | ((OutboxEmail.status == "dead")
+               & (OutboxEmail.created_date < dead_before))
+        )
+        .update({OutboxEmail.body: None}, synchronize_session=False)
+    )
+    db.session.commit()
+    return redacted
+
+
+# Function - Run Outbox Worker
+def run_outbox_worker(once=False):
+    """
+    Sends outbox emails until stopped.
+    Full batches are sent back to back; the worker only sleeps once the
+    outbox is drained.
+    """
+
+    config = current_app.config
+
+    while True:
+        sent = send_outbox_batch()
+        if sent < config["OUTBOX_BATCH_SIZE"]:
+            redact_outbox_emails()
+        if once and sent < config["OUTBOX_BATCH_SIZE"]:
+            return
+        if sent < config["OUTBOX_BATCH_SIZE"]:
+            time.sleep(config["OUTBOX_POLL_INTERVAL"])
+
+
+# Function - Requeue Dead Emails
+def requeue_dead_emails():
+    """
+    Moves every dead email that still has its body back to pending with a
+    fresh set of attempts.
+    Returns the number of emails requeued.
+    """
+
+    requeued = (
+        db.session.query(OutboxEmail)
+        .filter(OutboxEmail.status == "dead")
+        .filter(OutboxEmail.body.isnot(None))
+        .update({
+            OutboxEmail.status: "pending",
+            OutboxEmail.attempts: 0,
+            OutboxEmail.next_attempt_date: datetime.utcnow(),
+        }, synchronize_session=False)
+    )
+    db.session.commit()
+    return requeued
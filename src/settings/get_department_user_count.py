@@ -1,26 +1,68 @@
 """
 Settings - Department User Counts
 This is a helper function to get the total count of users for each department.
+
+The counts come from a single GROUP BY query and are cached for the process.
+Every change to a user's department calls invalidate_department_user_count,
+which touches the DEPARTMENT_USER_COUNT_STAMP file so the other processes
+reload their counts as well. DEPARTMENT_USER_COUNT_TTL bounds how stale the counts
+can be after users are changed outside the app.
 """
 
 # Imports
-from src.models import (
-    User,
-    Departments,
-)
+import threading
+import time
+from flask import current_app
+from src import db
+from src.models import User
+from src.core.stamp_files import stamp_mtime, touch_stamp
+
+
+# Process cache of the department user counts
+_cache = {"counts": None, "loaded_at": 0.0, "stamp": None, "generation": 0}
+_cache_lock = threading.Lock()
 
 
 # Function - Get Department User Count
 def get_department_user_count():
     """
-    Get total count of users for each department
+    Get total count of users for each department, keyed by department ID
     """
-    department_user_count = {}
-    departments = Departments.query.all()
 
-    for department in departments:
-        department_user_count[department.name] = User.query.filter_by(
-            department_id=department.id
-        ).count()
+    config = current_app.config
+    ttl = config["DEPARTMENT_USER_COUNT_TTL"]
+    stamp = stamp_mtime(config["DEPARTMENT_USER_COUNT_STAMP"])
+    with _cache_lock:
+        if (_cache["counts"] is not None and _cache["stamp"] == stamp
+                and time.monotonic() - _cache["loaded_at"] < ttl):
+            return _cache["counts"]
+        generation = _cache["generation"]
+
+    department_user_count = dict(
+        db.session.query(User.department_id, db.func.count(User.id))
+        .filter(User.department_id.is_not(None))
+        .group_by(User.department_id)
+        .all()
+    )
+
+    # Do not cache counts read while the cache was being invalidated
+    with _cache_lock:
+        if _cache["generation"] == generation:
+            _cache["counts"] = department_user_count
+            _cache["loaded_at"] = time.monotonic()
+            _cache["stamp"] = stamp
 
     return department_user_count
+
+
+# Function - Invalidate Department User Count
+def invalidate_department_user_count():
+    """
+    Clears the cached counts after users are created or changed, in this
+    process and the others
+    """
+
+    touch_stamp(current_app.config["DEPARTMENT_USER_COUNT_STAMP"])
+    with _cache_lock:
+        _cache["counts"] = None
+        _cache["generation"] += 1
@@ -5,7 +5,9 @@ This file contains the views for the settings blueprint.
 
 # Imports
 from datetime import datetime
-from flask import render_template, url_for, flash, request, redirect, Blueprint
+from flask import (
+    render_template, url_for, flash, request, redirect, jsonify, Blueprint
+)
 from flask_login import login_required, current_user
 from sqlalchemy import func
 from src.settings.forms import (
@@ -18,6 +20,8 @@ from src.models import (
 from src import db
 from src.decorators.decorators import admin_required
 from src.settings.get_department_user_count import get_department_user_count
+from src.kudos.dashboard_cache import KUDOS_DATA, bump_data_version
+from src.users.login_throttle import login_throttle_counters
 
 
 # Blueprint Configuration
@@ -36,6 +40,18 @@ def settings_landing_page():
     return render_template("settings/settings.html", title="Settings")
 
 
+# Settings - Login Throttle Counters
+@settings_bp.route("/settings/login_throttle")
+@login_required
+@admin_required
+def login_throttle():
+    """
+    Login attempts and attempts rejected by the login throttle, as JSON
+    """
+
+    return jsonify(login_throttle_counters())
+
+
 # Settings - Departments - View List of Departments
 @settings_bp.route("/settings/departments")
 @login_required
@@ -140,6 +156,8 @@ def edit_department(department_id):
             department.name = form.name.data
             department.updated_date = datetime.now()
             department.updated_by = current_user.id
+            # Department names are shown on the kudos dashboard
+            bump_data_version(KUDOS_DATA)
             db.session.commit()
             flash("Department updated successfully.", "success")
         except Exception as e:
@@ -1,6 +1,24 @@
 // Select2
+// Fields with a data-search-url fetch their options as the user types
 $(document).ready(function () {
-  $(".select2").select2()
+  $(".select2").each(function () {
+    var searchUrl = $(this).data("search-url");
+    var options = {};
+    if (searchUrl) {
+      options = {
+        minimumInputLength: 1,
+        ajax: {
+          url: searchUrl,
+          dataType: "json",
+          delay: 200,
+          data: function (params) {
+            return { q: params.term };
+          },
+        },
+      };
+    }
+    $(this).select2(options);
+  });
 })
 
 // Bootstrap tooltip
@@ -0,0 +1,105 @@
+// Kudo Dashboard - Charts
+// Every canvas with the "kudo-chart" class is a chart whose data is fetched
+// from its data-chart-url. The charts are fetched at the same time, with the
+// period picked in the "kudo-chart-options" form, and fetched again when the
+// period changes.
+(function () {
+  var options = document.getElementById("kudo-chart-options");
+  var charts = {};
+  // Responses for an older period are dropped
+  var generation = 0;
+
+  function chartOptions(type) {
+    if (type === "pie") {
+      return {};
+    }
+    return {
+      responsive: true,
+      maintainAspectRatio: false,
+      plugins: {
+        legend: {
+          display: false,
+        },
+      },
+    };
+  }
+
+  function queryString() {
+    var params = new URLSearchParams();
+    var period = options.elements.window.value;
+    if (period === "custom") {
+      if (!options.elements.start.value) {
+        return null;
+      }
+      params.set("start", options.elements.start.value);
+      if (options.elements.end.value) {
+        params.set("end", options.elements.end.value);
+      }
+    } else {
+      params.set("window", period);
+    }
+    params.set("granularity", options.elements.granularity.value);
+    return params.toString();
+  }
+
+  function drawChart(canvas, data) {
+    var chart = charts[canvas.dataset.chartUrl];
+    if (chart) {
+      chart.data.labels = data.labels;
+      chart.data.datasets[0].data = data.data;
+      chart.update();
+      return;
+    }
+
+    var dataset = { label: canvas.dataset.chartLabel, data: data.data };
+    if (canvas.dataset.chartType === "line") {
+      dataset.borderWidth = 2;
+    }
+    charts[canvas.dataset.chartUrl] = new Chart(canvas.getContext("2d"), {
+      type: canvas.dataset.chartType,
+      data: { labels: data.labels, datasets: [dataset] },
+      options: chartOptions(canvas.dataset.chartType),
+    });
+  }
+
+  function loadCharts() {
+    var query = queryString();
+    if (query === null) {
+      return;
+    }
+    var current = ++generation;
+    document.querySelectorAll(".kudo-chart").forEach(function (canvas) {
+      fetch(canvas.dataset.chartUrl + "?" + query, {
+        headers: { Accept: "application/json" },
+      })
+        .then(function (response) {
+          if (!response.ok) {
+            throw new Error("Chart request failed: " + response.status);
+          }
+          return response.json();
+        })
+        .then(function (data) {
+          if (current === generation) {
+            drawChart(canvas, data);
+          }
+        })
+        .catch(function (error) {
+          console.error(error);
+        });
+    });
+  }
+
+  options.addEventListener("change", function () {
+    var custom = options.elements.window.value === "custom";
+    options.querySelectorAll(".chart-custom-range").forEach(function (el) {
+      el.classList.toggle("d-none", !custom);
+    });
+    loadCharts();
+  });
+
+  options.addEventListener("submit", function (event) {
+    event.preventDefault();
+  });
+
+  loadCharts();
+})();
@@ -0,0 +1,152 @@
+// Kudo Feed - Infinite Scroll
+// Every element with the "kudo-feed-more" class is a sentinel placed after
+// a kudo feed. When it scrolls into view, the next page is fetched from its
+// data-feed-url with its data-cursor and appended to its data-feed-target.
+(function () {
+  function element(tag, className, text) {
+    var el = document.createElement(tag);
+    if (className) {
+      el.className = className;
+    }
+    if (text !== undefined) {
+      el.textContent = text;
+    }
+    return el;
+  }
+
+  function fullName(user) {
+    return user.firstname + " " + user.lastname;
+  }
+
+  function longDate(isoDate) {
+    return new Date(isoDate).toLocaleDateString("en-US", {
+      year: "numeric",
+      month: "long",
+      day: "2-digit",
+    });
+  }
+
+  // Kudos landing page card
+  function feedCard(kudo) {
+    var card = element("div", "card mb-3");
+    card.appendChild(
+      element(
+        "div",
+        "card-header",
+        "Kudo to: " +
+          fullName(kudo.receiving_user) +
+          " (" +
+          kudo.receiving_user.department_name +
+          ")"
+      )
+    );
+    var body = element("div", "card-body");
+    body.appendChild(element("p", "card-text", kudo.kudo_message));
+    if (kudo.meme_url) {
+      body.appendChild(element("br"));
+      var img = element("img", "card-img");
+      img.src = kudo.meme_url;
+      img.style.maxWidth = "50%";
+      body.appendChild(img);
+    }
+    card.appendChild(body);
+    var footer = element("div", "card-footer text-body-secondary");
+    footer.appendChild(
+      element(
+        "p",
+        "",
+        "Submitted by " +
+          fullName(kudo.creating_user) +
+          " (" +
+          kudo.creating_user.department_name +
+          ")"
+      )
+    );
+    footer.appendChild(
+      element("p", "text-muted", kudo.created_date.replace("T", " "))
+    );
+    card.appendChild(footer);
+    return card;
+  }
+
+  // Profile page card
+  function profileCard(kudo, title, user, dateLabel) {
+    var card = element("div", "card mt-2");
+    var body = element("div", "card-body");
+    var heading = element("h5", "card-title", title);
+    heading.appendChild(element("br"));
+    heading.appendChild(document.createTextNode(fullName(user)));
+    body.appendChild(heading);
+    body.appendChild(
+      element("h6", "card-subtitle mb-2 text-muted", user.department_name)
+    );
+    body.appendChild(element("p", "card-text", kudo.kudo_message));
+    var date = element("p", "card-text");
+    date.appendChild(
+      element("small", "text-muted", dateLabel + longDate(kudo.created_date))
+    );
+    body.appendChild(date);
+    card.appendChild(body);
+    return card;
+  }
+
+  var renderers = {
+    feed: feedCard,
+    sent: function (kudo) {
+      return profileCard(kudo, "Sent to:", kudo.receiving_user, "Submitted on ");
+    },
+    received: function (kudo) {
+      return profileCard(
+        kudo,
+        "Received from:",
+        kudo.creating_user,
+        "Received on "
+      );
+    },
+  };
+
+  function loadNextPage(sentinel, observer) {
+    if (sentinel.dataset.loading || !sentinel.dataset.cursor) {
+      return;
+    }
+    sentinel.dataset.loading = "true";
+
+    var url = new URL(sentinel.dataset.feedUrl, window.location.origin);
+    url.searchParams.set("cursor", sentinel.dataset.cursor);
+
+    fetch(url)
+      .then((response) => response.json())
+      .then(function (page) {
+        var target = document.getElementById(sentinel.dataset.feedTarget);
+        var render = renderers[sentinel.dataset.feedStyle];
+        page.kudos.forEach(function (kudo) {
+          target.appendChild(render(kudo));
+        });
+        sentinel.dataset.cursor = page.next_cursor || "";
+        if (!page.next_cursor) {
+          observer.unobserve(sentinel);
+        }
+      })
+      .finally(function () {
+        delete sentinel.dataset.loading;
+      });
+  }
+
+  window.addEventListener("DOMContentLoaded", function () {
+    var observer = new IntersectionObserver(
+      function (entries) {
+        entries.forEach(function (entry) {
+          if (entry.isIntersecting) {
+            loadNextPage(entry.target, observer);
+          }
+        });
+      },
+      { rootMargin: "400px" }
+    );
+    document.querySelectorAll(".kudo-feed-more").forEach(function (sentinel) {
+      if (sentinel.dataset.cursor) {
+        observer.observe(sentinel);
+      }
+    });
+  });
+})();
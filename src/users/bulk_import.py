@@ -0,0 +1,418 @@
+"""
+Users - Bulk Import
+These are helper functions to bulk import users from a CSV upload.
+
+An upload is parsed once, in a streaming pass, into staged rows keyed by
+its UserImport ID. The preview and the import read the staged rows.
+
+Existing emails and department names are resolved with a handful of
+set-based queries, the temporary passwords are hashed in a process pool
+and the users and their emails are inserted with executemany.
+
+Confirmed uploads are imported by `flask commands import_worker`, outside
+of the web workers, which are replaced and stopped at any time. The worker
+records its progress on the UserImport, and an import whose worker stopped
+updating it for IMPORT_LEASE_SECONDS is run again by the next worker. The
+users are created in one transaction at the end, so a stopped import left
+nothing behind. An import is failed after IMPORT_MAX_ATTEMPTS runs.
+"""
+
+# Imports
+import csv
+import io
+import random
+import string
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from email_validator import validate_email, EmailNotValidError
+from sqlalchemy import insert
+from src import db
+from src.models import (
+    User,
+    Departments,
+    UserImport,
+    UserImportRow,
+)
+from src.outbox.outbox import queue_emails
+from src.users.passwords import password_hasher, process_pool_context
+from src.settings.get_department_user_count import (
+    invalidate_department_user_count,
+)
+from src.dictionaries.dictionaries import USER_ROLE_CHOICES
+
+
+# Values bound per IN clause, well below SQLite's limit of 999
+IN_CLAUSE_CHUNK_SIZE = 500
+
+# Hashed passwords between two progress updates
+PROGRESS_INTERVAL = 100
+
+# Staged rows inserted per executemany
+STAGING_BATCH_SIZE = 1000
+
+# Statuses of an import that a worker is running
+RUNNING_STATUSES = ["running", "hashing", "saving"]
+
+# CSV columns, in file order
+CSV_COLUMNS = ["first_name", "last_name", "email", "department", "role"]
+
+
+# Function - Chunks
+def _chunks(items, size):
+    """
+    Splits a list into lists of at most the given size.
+    """
+
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+# Function - Existing Emails
+def _existing_emails(emails):
+    """
+    Returns the emails that are already registered.
+    """
+
+    existing = set()
+    for chunk in _chunks(sorted(emails), IN_CLAUSE_CHUNK_SIZE):
+        existing.update(
+            email for (email,) in
+            db.session.query(User.email).filter(User.email.in_(chunk))
+        )
+    return existing
+
+
+# Function - Department IDs
+def _department_ids(names):
+    """
+    Returns a dictionary of department name to department ID.
+    """
+
+    department_ids = {}
+    for chunk in _chunks(sorted(names), IN_CLAUSE_CHUNK_SIZE):
+        departments = (
+            db.session.query(Departments.id, Departments.name)
+            .filter(Departments.name.in_(chunk))
+            .order_by(Departments.id)
+        )
+        for department in departments:
+            department_ids.setdefault(department.name, department.id)
+    return department_ids
+
+
+# Function - Validate Row
+def _validate_row(row, department_names):
+    """
+    Returns the staged values of a CSV row and its validation error, if any.
+    """
+
+    if len(row) != len(CSV_COLUMNS):
+        return {}, "All 5 columns must be provided."
+
+    values = dict(zip(CSV_COLUMNS, (value.strip() for value in row)))
+    if not values["first_name"] or not values["last_name"]:
+        return values, "First and last name are required."
+    try:
+        validate_email(values["email"], check_deliverability=False)
+    except EmailNotValidError:
+        return values, "Invalid email."
+    if values["department"] not in department_names:
+        return values, f"Department '{values['department']}' does not exist."
+    if values["role"] not in [choice[0] for choice in USER_ROLE_CHOICES]:
+        return values, f"Invalid role '{values['role']}'."
+    return values, None
+
+
+# Function - Stage User Upload
+def stage_user_upload(stream, created_by):
+    """
+    Parses an uploaded CSV file into staged rows in a single streaming pass.
+    Returns the UserImport that the rows are staged under.
+    """
+
+    user_import = UserImport(
+        status="staged",
+        created_date=datetime.utcnow(),
+        created_by=created_by,
+    )
+    db.session.add(user_import)
+    db.session.flush()
+
+    department_names = {
+        name for (name,) in db.session.query(Departments.name)
+    }
+
+    csv_reader = csv.reader(
+        io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    )
+    next(csv_reader, None)  # Skip header row
+
+    batch = []
+    total_rows = 0
+    invalid_count = 0
+    for row_number, row in enumerate(csv_reader, start=1):
+        if not any(value.strip() for value in row):
+            continue
+        values, error = _validate_row(row, department_names)
+        total_rows += 1
+        invalid_count += error is not None
+        batch.append({
+            "import_id": user_import.id,
+            "row_number": row_number,
+            "error": error,
+            **values,
+        })
+        if len(batch) == STAGING_BATCH_SIZE:
+            db.session.execute(insert(UserImportRow), batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(UserImportRow), batch)
+
+    user_import.total_rows = total_rows
+    user_import.invalid_count = invalid_count
+    db.session.commit()
+    return user_import
+
+
+# Function - Update Progress
+def _update_progress(user_import, **values):
+    """
+    Saves the import progress so it can be read by other requests.
+    """
+
+    for key, value in values.items():
+        setattr(user_import, key, value)
+    user_import.updated_date = datetime.utcnow()
+    db.session.commit()
+
+
+# Function - Hash Passwords
+def _hash_passwords(user_import, passwords, skipped_count):
+    """
+    Hashes the passwords in a process pool, in order, updating the import
+    progress as the hashes come in.
+    """
+
+    workers = current_app.config["BULK_IMPORT_HASH_WORKERS"]
+    chunksize = max(1, min(PROGRESS_INTERVAL,
+                           len(passwords) // (workers * 4)))
+
+    password_hashes = []
+    with ProcessPoolExecutor(max_workers=workers,
+                             mp_context=process_pool_context()) as pool:
+        for password_hash in pool.map(password_hasher(), passwords,
+                                      chunksize=chunksize):
+            password_hashes.append(password_hash)
+            if len(password_hashes) % PROGRESS_INTERVAL == 0:
+                _update_progress(
+                    user_import,
+                    processed_rows=skipped_count + len(password_hashes),
+                )
+    return password_hashes
+
+
+# Function - Import Users
+def import_users(import_id):
+    """
+    Creates the users staged for a bulk upload.
+    Invalid rows and users whose email is already registered are skipped.
+    If a department no longer exists, nothing is imported.
+    """
+
+    user_import = db.session.get(UserImport, import_id)
+    created_by = user_import.imported_by
+    login_url = user_import.login_url
+
+    try:
+        users = [
+            {column: getattr(row, column) for column in CSV_COLUMNS}
+            for row in (
+                UserImportRow.query
+                .filter_by(import_id=import_id, error=None)
+                .order_by(UserImportRow.row_number)
+            )
+        ]
+
+        # Skip registered emails and emails repeated in the file
+        seen_emails = _existing_emails({user["email"] for user in users})
+        new_users = []
+        for user_data in users:
+            if user_data["email"] in seen_emails:
+                continue
+            seen_emails.add(user_data["email"])
+            new_users.append(user_data)
+        skipped_count = user_import.total_rows - len(new_users)
+
+        # Look up department ids by the department names
+        department_names = {user["department"] for user in new_users}
+        department_ids = _department_ids(department_names)
+        missing_departments = sorted(department_names - department_ids.keys())
+        if missing_departments:
+            _update_progress(
+                user_import,
+                status="failed",
+                error="Department '{}' does not exist.".format(
+                    "', '".join(missing_departments)),
+            )
+            return
+
+        # Generate and hash the random passwords
+        _update_progress(user_import, status="hashing",
+                         processed_rows=skipped_count,
+                         skipped_count=skipped_count)
+        passwords = [
+            "".join(
+                random.choices(string.ascii_lowercase + string.digits, k=12)
+            )
+            for _ in new_users
+        ]
+        password_hashes = _hash_passwords(user_import, passwords,
+                                          skipped_count)
+
+        # Create the users and queue their emails in one transaction
+        _update_progress(user_import, status="saving")
+        now = datetime.utcnow()
+        if new_users:
+            db.session.execute(
+                insert(User),
+                [
+                    {
+                        "email": user_data["email"],
+                        "password_hash": password_hash,
+                        "firstname": user_data["first_name"],
+                        "lastname": user_data["last_name"],
+                        "department_id":
+                            department_ids[user_data["department"]],
+                        "role": user_data["role"],
+                        "status": "active",
+                        "created_date": now,
+                        "created_by": created_by,
+                    }
+                    for user_data, password_hash in zip(new_users,
+                                                        password_hashes)
+                ],
+            )
+        queue_emails([
+            {
+                "subject": "KudoTrio - Forced Password Change",
+                "recipients": [user_data["email"]],
+                "body": f"""
+                Hello {user_data["first_name"]},
+
+                You're password has been changed by an administrator.
+
+                Your temporary password is:
+                {password}
+
+                Please login and change your password.
+                {login_url}
+                """,
+            }
+            for user_data, password in zip(new_users, passwords)
+        ])
+
+        # The staged rows are no longer needed
+        UserImportRow.query.filter_by(import_id=import_id).delete()
+        _update_progress(user_import, status="completed",
+                         processed_rows=user_import.total_rows,
+                         created_count=len(new_users))
+        invalidate_department_user_count()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.exception("Bulk user import %s failed", import_id)
+        _update_progress(user_import, status="failed", error=str(e))
+
+
+# Function - Start User Import
+def start_user_import(import_id, imported_by, login_url):
+    """
+    Queues the staged users for the import worker.
+    Returns False if the upload is not staged, for example because it is
+    already being imported.
+    """
+
+    # Only one request can move the upload out of the staged status
+    started = (
+        db.session.query(UserImport)
+        .filter_by(id=import_id, status="staged")
+        .update({UserImport.status: "pending",
+                 UserImport.imported_by: imported_by,
+                 UserImport.login_url: login_url,
+                 UserImport.updated_date: datetime.utcnow()},
+                synchronize_session=False)
+    )
+    db.session.commit()
+    return bool(started)
+
+
+# Function - Claim User Import
+def claim_user_import():
+    """
+    Claims the next queued import, or an import whose worker stopped.
+    Returns its ID, or None when there is nothing to import.
+    """
+
+    config = current_app.config
+    now = datetime.utcnow()
+    stale = (
+        UserImport.status.in_(RUNNING_STATUSES)
+        & (UserImport.updated_date
+           < now - timedelta(seconds=config["IMPORT_LEASE_SECONDS"]))
+    )
+
+    # Imports that stopped their worker on every run
+    (
+        db.session.query(UserImport)
+        .filter(stale)
+        .filter(UserImport.attempts >= config["IMPORT_MAX_ATTEMPTS"])
+        .update({UserImport.status: "failed",
+                 UserImport.error: "The import stopped before it finished.",
+                 UserImport.updated_date: now},
+                synchronize_session=False)
+    )
+    db.session.commit()
+
+    candidates = (
+        db.session.query(UserImport.id, UserImport.status,
+                         UserImport.updated_date)
+        .filter((UserImport.status == "pending") | stale)
+        .order_by(UserImport.id)
+        .limit(10)
+        .all()
+    )
+    for candidate in candidates:
+        # Only claimed if no other worker claimed it in between
+        claimed = (
+            db.session.query(UserImport)
+            .filter_by(id=candidate.id, status=candidate.status,
+                       updated_date=candidate.updated_date)
+            .update({UserImport.status: "running",
+                     UserImport.attempts: UserImport.attempts + 1,
+                     UserImport.updated_date: now},
+                    synchronize_session=False)
+        )
+        db.session.commit()
+        if claimed:
+            return candidate.id
+    return None
+
+
+# Function - Run Import Worker
+def run_import_worker(once=False):
+    """
+    Imports the queued uploads until stopped.
+    """
+
+    config = current_app.config
+
+    while True:
+        import_id = claim_user_import()
+        if import_id is not None:
+            import_users(import_id)
+            db.session.expire_all()
+            continue
+        if once:
+            return
+        time.sleep(config["IMPORT_POLL_INTERVAL"])
@@ -0,0 +1,105 @@
+"""
+Users - Identity Cache
+These are helper functions to cache the logged in user between requests.
+
+The Flask-Login user loader gets a read-only UserIdentity snapshot from a
+per-process LRU cache instead of loading the full user row on every
+request. Entries expire after IDENTITY_CACHE_TTL seconds and are dropped
+as soon as a user is changed. Changes made by another worker process are
+seen through the modification time of the IDENTITY_CACHE_STAMP file.
+"""
+
+# Imports
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+from flask_login import UserMixin
+from src.core.stamp_files import stamp_mtime, touch_stamp
+
+
+# Process cache of user identities, least recently used first
+_identities = OrderedDict()
+_state = {"stamp": None, "generation": 0}
+_identities_lock = threading.Lock()
+
+
+class UserIdentity(UserMixin):
+    """
+    Read-only snapshot of a logged in user
+    """
+
+    FIELDS = ("id", "firstname", "lastname", "role", "status",
+              "department_id")
+
+    def __init__(self, user):
+        for field in self.FIELDS:
+            object.__setattr__(self, field, getattr(user, field))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("User identities are read-only.")
+
+    @property
+    def is_active(self):
+        """Only active users can log in"""
+        return self.status == "active"
+
+    def __repr__(self):
+        return f"User Identity: {self.id} - {self.firstname} {self.lastname}"
+
+
+# Function - Get Identity
+def get_identity(user_id, load_user_row):
+    """
+    Returns the cached identity of the user, loading the user row with the
+    given function when it is missing or expired. Returns None if the user
+    does not exist or is not active.
+    """
+
+    config = current_app.config
+    stamp = stamp_mtime(config["IDENTITY_CACHE_STAMP"])
+    now = time.monotonic()
+
+    with _identities_lock:
+        # Another process changed a user
+        if stamp != _state["stamp"]:
+            _identities.clear()
+            _state["stamp"] = stamp
+            _state["generation"] += 1
+
+        cached = _identities.get(user_id)
+        ttl = config["IDENTITY_CACHE_TTL"]
+        if cached is not None and now - cached[1] < ttl:
+            _identities.move_to_end(user_id)
+            identity = cached[0]
+            return identity if identity.is_active else None
+        generation = _state["generation"]
+
+    user = load_user_row(user_id)
+    identity = UserIdentity(user) if user is not None else None
+
+    # Do not cache identities read while the cache was being invalidated
+    with _identities_lock:
+        if identity is not None and _state["generation"] == generation:
+            _identities[user_id] = (identity, now)
+            _identities.move_to_end(user_id)
+            while len(_identities) > config["IDENTITY_CACHE_SIZE"]:
+                _identities.popitem(last=False)
+
+    if identity is None or not identity.is_active:
+        return None
+    return identity
+
+
+# Function - Invalidate Identity
+def invalidate_identity(user_id):
+    """
+    Drops a changed user from the cache of this process and touches the
+    stamp file so the other processes drop their cached identities as well.
+    """
+
+    touch_stamp(current_app.config["IDENTITY_CACHE_STAMP"])
+
+    with _identities_lock:
+        _identities.pop(user_id, None)
+        _state["generation"] += 1
@@ -0,0 +1,248 @@
+"""
+Users - Login Throttle
+These are helper functions to limit how often logins can be attempted.
+
+Every login attempt takes a token from a bucket of its client IP and a
+bucket of the email it is for, before the user is looked up or the
+password is hashed. Buckets hold up to a burst of tokens and refill at a
+steady rate per minute, so a client that floods the login page is turned
+away cheaply while people who mistype their password are not.
+
+The buckets are kept per process in an LRU of LOGIN_THROTTLE_MAX_KEYS
+entries. Several worker processes on one server can share them, and the
+rejection counters, through the SQLite file set in LOGIN_THROTTLE_STORE.
+"""
+
+# Imports
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from flask import current_app
+
+
+# Counters of the login attempts
+COUNTERS = ("attempts", "rejected_ip", "rejected_email")
+
+# Takes between two clean ups of full buckets from the shared store
+STORE_CLEANUP_INTERVAL = 1000
+
+# Store of this process, created on first use
+_store = {"store": None, "settings": None}
+_store_lock = threading.Lock()
+
+
+class MemoryBucketStore:
+    """
+    Token buckets of one process, least recently used first
+    """
+
+    def __init__(self, max_keys):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._counters = Counter()
+        self._lock = threading.Lock()
+
+    def take(self, key, burst, per_second, now):
+        """
+        Takes a token from the bucket of the key.
+        Returns 0 when there was one, or the seconds until there is one.
+        """
+
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + max(0, now - updated) * per_second)
+            wait = 0 if tokens >= 1 else (1 - tokens) / per_second
+            self._buckets[key] = (tokens - 1 if not wait else tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def increment(self, counter):
+        """
+        Adds one to the counter.
+        """
+
+        with self._lock:
+            self._counters[counter] += 1
+
+    def counters(self):
+        """
+        Returns the counters.
+        """
+
+        with self._lock:
+            return {counter: self._counters[counter] for counter in COUNTERS}
+
+
+class SQLiteBucketStore:
+    """
+    Token buckets shared by the processes of one server in a SQLite file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._takes = 0
+        connection = self._connection()
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS login_buckets ("
+            "key TEXT PRIMARY KEY, tokens REAL, updated REAL, "
+            "full_at REAL) WITHOUT ROWID"
+        )
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS login_counters ("
+            "name TEXT PRIMARY KEY, value INTEGER) WITHOUT ROWID"
+        )
+
+    def _connection(self):
+        """
+        Returns the connection of this thread.
+        """
+
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=1,
+                                         isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=OFF")
+            self._local.connection = connection
+        return connection
+
+    def take(self, key, burst, per_second, now):
+        """
+        Takes a token from the bucket of the key.
+        Returns 0 when there was one, or the seconds until there is one.
+        """
+
+        connection = self._connection()
+        # The bucket is read and written in one write transaction, so
+        # processes taking from the same bucket wait for each other
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT tokens, updated FROM login_buckets WHERE key = ?",
+                (key,),
+            ).fetchone()
+            tokens, updated = row or (burst, now)
+            tokens = min(burst, tokens + max(0, now - updated) * per_second)
+            wait = 0 if tokens >= 1 else (1 - tokens) / per_second
+            if not wait:
+                tokens -= 1
+            connection.execute(
+                "INSERT OR REPLACE INTO login_buckets VALUES (?, ?, ?, ?)",
+                (key, tokens, now, now + (burst - tokens) / per_second),
+            )
+
+            # Full buckets are the same as missing ones
+            self._takes += 1
+            if self._takes % STORE_CLEANUP_INTERVAL == 0:
+                connection.execute(
+                    "DELETE FROM login_buckets WHERE full_at < ?", (now,))
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return wait
+
+    def increment(self, counter):
+        """
+        Adds one to the counter.
+        """
+
+        self._connection().execute(
+            "INSERT INTO login_counters VALUES (?, 1) "
+            "ON CONFLICT (name) DO UPDATE SET value = value + 1",
+            (counter,),
+        )
+
+    def counters(self):
+        """
+        Returns the counters.
+        """
+
+        rows = dict(self._connection().execute(
+            "SELECT name, value FROM login_counters").fetchall())
+        return {counter: rows.get(counter, 0) for counter in COUNTERS}
+
+
+# Function - Get Store
+def _get_store():
+    """
+    Returns the bucket store of the configured settings.
+    """
+
+    config = current_app.config
+    settings = (config["LOGIN_THROTTLE_STORE"],
+                config["LOGIN_THROTTLE_MAX_KEYS"])
+    with _store_lock:
+        if _store["settings"] != settings:
+            _store["store"] = (
+                SQLiteBucketStore(settings[0]) if settings[0]
+                else MemoryBucketStore(settings[1])
+            )
+            _store["settings"] = settings
+        return _store["store"]
+
+
+# Function - Check Login Attempt
+def check_login_attempt(ip, email):
+    """
+    Takes a token from the buckets of the client IP and the email.
+    Returns 0 when the attempt is allowed, or the seconds the client has to
+    wait.
+    """
+
+    config = current_app.config
+    try:
+        return _take_login_tokens(config, _get_store(), ip, email)
+    except sqlite3.Error:
+        # A broken shared store must not lock everyone out
+        current_app.logger.warning("Login throttle store failed",
+                                   exc_info=True)
+        return 0
+
+
+# Function - Take Login Tokens
+def _take_login_tokens(config, store, ip, email):
+    """
+    Takes the tokens of a login attempt from the store.
+    """
+
+    now = time.time()
+    store.increment("attempts")
+
+    buckets = (
+        ("ip", ip, config["LOGIN_THROTTLE_IP_BURST"],
+         config["LOGIN_THROTTLE_IP_PER_MINUTE"]),
+        ("email", (email or "").strip().lower(),
+         config["LOGIN_THROTTLE_EMAIL_BURST"],
+         config["LOGIN_THROTTLE_EMAIL_PER_MINUTE"]),
+    )
+    for kind, key, burst, per_minute in buckets:
+        if not burst or not per_minute or not key:
+            continue
+        wait = store.take(f"{kind}:{key}", burst, per_minute / 60, now)
+        if wait:
+            store.increment(f"rejected_{kind}")
+            return wait
+    return 0
+
+
+# Function - Login Throttle Counters
+def login_throttle_counters():
+    """
+    Returns the number of login attempts and of rejected attempts.
+    """
+
+    return _get_store().counters()
+
+
+# Function - Reset Login Throttle
+def reset_login_throttle():
+    """
+    Drops the buckets and counters of this process.
+    """
+
+    with _store_lock:
+        _store.update(store=None, settings=None)
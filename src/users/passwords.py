@@ -0,0 +1,167 @@
+"""
+Users - Passwords
+These are helper functions to hash and check passwords outside of the
+request threads.
+
+Password hashing is slow on purpose and holds the GIL, so during a login
+rush it stalls every other request of the worker. The hashes are computed
+in a process pool of PASSWORD_HASH_WORKERS processes shared by the request
+threads. At most PASSWORD_HASH_QUEUE_SIZE hashes wait or run at once, and
+further ones are refused with a 503 instead of queueing without end.
+Hashes made with other parameters than the configured ones are replaced
+after a successful login.
+
+The pool processes are started by a fork server, not forked from the
+worker, as forking a process with running threads can copy locks held by
+other threads into the child and hang it.
+"""
+
+# Imports
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from flask import current_app
+from werkzeug.exceptions import ServiceUnavailable
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+# Seconds a client is asked to wait when the pool is full
+BUSY_RETRY_AFTER = 2
+
+# Process pool of this process, created on first use
+_pool = {"executor": None, "slots": None, "pid": None, "settings": None}
+_pool_lock = threading.Lock()
+
+
+class PasswordHasherBusy(ServiceUnavailable):
+    """
+    Raised when too many passwords are waiting to be hashed
+    """
+
+    description = "The server is busy, please try again in a moment."
+
+    def __init__(self):
+        super().__init__(retry_after=BUSY_RETRY_AFTER)
+
+
+# Function - Password Hasher
+def password_hasher():
+    """
+    Returns a function that hashes a password with the configured method
+    and salt length. It can be sent to another process.
+    """
+
+    config = current_app.config
+    return partial(generate_password_hash,
+                   method=config["PASSWORD_HASH_METHOD"],
+                   salt_length=config["PASSWORD_SALT_LENGTH"])
+
+
+# Function - Process Pool Context
+def process_pool_context():
+    """
+    Returns the multiprocessing context that starts pool processes without
+    forking the calling process, a fork server where there is one.
+    """
+
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+# Function - Executor
+def _executor(workers, queue_size):
+    """
+    Returns the process pool and the semaphore of its free queue slots.
+    A new pool is created in a forked worker or when the settings changed.
+    """
+
+    with _pool_lock:
+        if (_pool["pid"] != os.getpid()
+                or _pool["settings"] != (workers, queue_size)):
+            if _pool["executor"] is not None and _pool["pid"] == os.getpid():
+                _pool["executor"].shutdown(wait=False)
+            _pool.update(
+                executor=ProcessPoolExecutor(
+                    max_workers=workers, mp_context=process_pool_context()
+                ),
+                slots=threading.BoundedSemaphore(queue_size),
+                pid=os.getpid(),
+                settings=(workers, queue_size),
+            )
+        return _pool["executor"], _pool["slots"]
+
+
+# Function - Run In Pool
+def _run_in_pool(function, *args):
+    """
+    Runs the function in the process pool and returns its result, or runs
+    it in this thread when the pool is disabled.
+    Raises PasswordHasherBusy when the pool is full or too slow to answer.
+    """
+
+    config = current_app.config
+    workers = config["PASSWORD_HASH_WORKERS"]
+    if not workers:
+        return function(*args)
+
+    executor, slots = _executor(workers, config["PASSWORD_HASH_QUEUE_SIZE"])
+    if not slots.acquire(blocking=False):
+        raise PasswordHasherBusy()
+    try:
+        future = executor.submit(function, *args)
+    except BrokenProcessPool:
+        slots.release()
+        # A worker process died, the next call starts a new pool
+        with _pool_lock:
+            _pool["pid"] = None
+        raise PasswordHasherBusy()
+    # The slot is freed when the hash is done, even after a timeout
+    future.add_done_callback(lambda _: slots.release())
+
+    try:
+        return future.result(timeout=config["PASSWORD_HASH_TIMEOUT"])
+    except TimeoutError:
+        raise PasswordHasherBusy()
+
+
+# Function - Hash Password
+def hash_password(password):
+    """
+    Returns the hash of the password, computed in the process pool.
+    """
+
+    return _run_in_pool(password_hasher(), password)
+
+
+# Function - Check Password
+def check_password(password_hash, password):
+    """
+    Returns True if the password matches the hash, checked in the process
+    pool.
+    """
+
+    if not password_hash:
+        return False
+    return _run_in_pool(check_password_hash, password_hash, password)
+
+
+# Function - Needs Rehash
+def needs_rehash(password_hash):
+    """
+    Returns True if the hash was made with another method or salt length
+    than the configured ones. A method given without its parameters, such
+    as "scrypt", matches every hash of that method.
+    """
+
+    config = current_app.config
+    method = config["PASSWORD_HASH_METHOD"]
+    if password_hash.count("$") != 2:
+        return True
+    hash_method, salt, _ = password_hash.split("$")
+    if hash_method != method and hash_method.split(":")[0] != method:
+        return True
+    return len(salt) != config["PASSWORD_SALT_LENGTH"]
@@ -0,0 +1,295 @@
+"""
+Users - User Search
+These are helper functions to search users by name, email and department
+as the user types.
+
+On SQLite the users are indexed in the user_search FTS5 table, which keeps
+prefix indexes so every keystroke is an index lookup. Triggers on the users
+and departments tables keep it up to date. Every term of the search is
+matched as a prefix, and when no user matches all of them, users matching
+any of them are returned instead, best matches first. When still no user
+matches, the terms are compared with the words of the index, listed by the
+user_search_vocab table, and users with a word at most one typo away (two
+for long terms) are returned, so "jonh" finds John. Other databases fall
+back to prefix LIKE filters, without typo tolerance.
+"""
+
+# Imports
+import re
+from sqlalchemy import DDL, event, or_
+from src import db
+from src.models import (
+    User,
+    Departments,
+)
+
+
+# Search index and its vocabulary, created with the other tables and by the
+# migrations
+USER_SEARCH_TABLE_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS user_search USING fts5(
+        firstname, lastname, email, department,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '1 2 3'
+    )
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS user_search_vocab
+    USING fts5vocab(user_search, row)
+    """,
+]
+
+# Triggers keeping the search index up to date, by name
+USER_SEARCH_TRIGGERS = {
+    "user_search_user_insert": """
+    CREATE TRIGGER IF NOT EXISTS user_search_user_insert
+    AFTER INSERT ON users BEGIN
+        INSERT INTO user_search (rowid, firstname, lastname, email, department)
+        SELECT NEW.id, NEW.firstname, NEW.lastname, NEW.email,
+               (SELECT name FROM departments WHERE id = NEW.department_id);
+    END
+    """,
+    "user_search_user_update": """
+    CREATE TRIGGER IF NOT EXISTS user_search_user_update
+    AFTER UPDATE OF firstname, lastname, email, department_id ON users BEGIN
+        DELETE FROM user_search WHERE rowid = OLD.id;
+        INSERT INTO user_search (rowid, firstname, lastname, email, department)
+        SELECT NEW.id, NEW.firstname, NEW.lastname, NEW.email,
+               (SELECT name FROM departments WHERE id = NEW.department_id);
+    END
+    """,
+    "user_search_user_delete": """
+    CREATE TRIGGER IF NOT EXISTS user_search_user_delete
+    AFTER DELETE ON users BEGIN
+        DELETE FROM user_search WHERE rowid = OLD.id;
+    END
+    """,
+    "user_search_department_update": """
+    CREATE TRIGGER IF NOT EXISTS user_search_department_update
+    AFTER UPDATE OF name ON departments BEGIN
+        UPDATE user_search SET department = NEW.name
+        WHERE rowid IN (SELECT id FROM users WHERE department_id = NEW.id);
+    END
+    """,
+    "user_search_department_delete": """
+    CREATE TRIGGER IF NOT EXISTS user_search_department_delete
+    AFTER DELETE ON departments BEGIN
+        UPDATE user_search SET department = NULL
+        WHERE rowid IN (SELECT id FROM users WHERE department_id = OLD.id);
+    END
+    """,
+}
+
+for statement in USER_SEARCH_TABLE_DDL + list(USER_SEARCH_TRIGGERS.values()):
+    event.listen(db.metadata, "after_create",
+                 DDL(statement).execute_if(dialect="sqlite"))
+for table in ("user_search_vocab", "user_search"):
+    event.listen(db.metadata, "before_drop",
+                 DDL(f"DROP TABLE IF EXISTS {table}")
+                 .execute_if(dialect="sqlite"))
+
+# Shortest term matched with a typo, and the longest with one typo
+MIN_TYPO_TERM_LENGTH = 3
+MAX_ONE_TYPO_TERM_LENGTH = 5
+
+# Similar words searched per term
+MAX_TYPO_CANDIDATES = 10
+
+# The search index as seen by queries
+user_search_table = db.table("user_search", db.column("rowid"),
+                             db.column("rank"))
+
+
+# Function - Search Terms
+def _search_terms(query):
+    """
+    Splits a search into lowercase words, dropping FTS5 syntax.
+    """
+
+    return re.findall(r"\w+", query.lower())
+
+
+# Function - Edit Distance
+def _edit_distance(a, b):
+    """
+    Returns the number of inserted, deleted, replaced and swapped letters
+    between two words.
+    """
+
+    previous, current = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        before, previous, current = previous, current, [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (a[i - 1] != b[j - 1]),
+            )
+            if (i > 1 and j > 1 and a[i - 1] == b[j - 2]
+                    and a[i - 2] == b[j - 1]):
+                current[j] = min(current[j], before[j - 2] + 1)
+    return current[-1]
+
+
+# Function - Typo Candidates
+def _typo_candidates(term):
+    """
+    Returns the beginnings of indexed words that the term could be a
+    mistyped version of, closest first.
+    """
+
+    if len(term) < MIN_TYPO_TERM_LENGTH:
+        return []
+    max_edits = 1 if len(term) <= MAX_ONE_TYPO_TERM_LENGTH else 2
+    min_length = len(term) - max_edits
+    max_length = len(term) + max_edits
+
+    # Words starting with the first letter, or the second one if the first
+    # two letters were swapped, as ranges of the sorted vocabulary. The term
+    # can be the beginning of a longer word, so the words are cut to the
+    # longest beginning it can be a typo of.
+    beginnings = set()
+    for first in dict.fromkeys(term[:2]):
+        beginnings.update(db.session.execute(
+            db.text(
+                "SELECT DISTINCT substr(term, 1, :max_length) "
+                "FROM user_search_vocab "
+                "WHERE term >= :first AND term < :next "
+                "AND length(term) >= :min_length"
+            ),
+            {"first": first, "next": chr(ord(first) + 1),
+             "min_length": min_length, "max_length": max_length},
+        ).scalars())
+
+    candidates = []
+    for beginning in beginnings:
+        edits = min(
+            _edit_distance(term, beginning[:length])
+            for length in range(min_length, len(beginning) + 1)
+        )
+        if 0 < edits <= max_edits:
+            candidates.append((edits, beginning))
+    return [beginning for _, beginning
+            in sorted(candidates)[:MAX_TYPO_CANDIDATES]]
+
+
+# Function - FTS Match
+def _fts_match(users, match, limit):
+    """
+    Returns the users matching an FTS5 query, best matches first.
+    """
+
+    return (
+        users.join(user_search_table,
+                   user_search_table.c.rowid == User.id)
+        .filter(db.literal_column("user_search").op("MATCH")(match))
+        .order_by(user_search_table.c.rank)
+        .limit(limit)
+        .all()
+    )
+
+
+# Function - FTS Search
+def _fts_search(users, terms, limit):
+    """
+    Returns the users matching the terms in the user_search index.
+    """
+
+    prefixes = [f'"{term}"*' for term in terms]
+    matches = [" ".join(prefixes)]
+    if len(terms) > 1:
+        matches.append(" OR ".join(prefixes))
+    for match in matches:
+        results = _fts_match(users, match, limit)
+        if results:
+            return results
+
+    # Last, each term or the words one or two typos away from it
+    groups = []
+    typos_found = False
+    for prefix, term in zip(prefixes, terms):
+        typos = [f'"{beginning}"*' for beginning in _typo_candidates(term)]
+        typos_found = typos_found or bool(typos)
+        groups.append("(" + " OR ".join([prefix] + typos) + ")")
+    if not typos_found:
+        return []
+    matches = [" AND ".join(groups)]
+    if len(groups) > 1:
+        matches.append(" OR ".join(groups))
+    for match in matches:
+        results = _fts_match(users, match, limit)
+        if results:
+            return results
+    return []
+
+
+# Function - LIKE Search
+def _like_search(users, terms, limit):
+    """
+    Returns the users with a name, email or department starting with every
+    term, for databases without the user_search index.
+    """
+
+    for term in terms:
+        pattern = term.replace("%", r"\%").replace("_", r"\_") + "%"
+        users = users.filter(or_(
+            User.firstname.ilike(pattern, escape="\\"),
+            User.lastname.ilike(pattern, escape="\\"),
+            User.email.ilike(pattern, escape="\\"),
+            Departments.name.ilike(pattern, escape="\\"),
+        ))
+    return (
+        users.order_by(User.lastname.asc(), User.firstname.asc())
+        .limit(limit)
+        .all()
+    )
+
+
+# Function - Search Users
+def search_users(query, exclude_user_id=None, limit=20):
+    """
+    Returns the active users matching the search, with their department
+    name.
+    """
+
+    terms = _search_terms(query)
+    if not terms:
+        return []
+
+    users = (
+        db.session.query(
+            User.id,
+            User.firstname,
+            User.lastname,
+            Departments.name.label("department_name"),
+        )
+        .outerjoin(Departments, Departments.id == User.department_id)
+        .filter(User.status == "active")
+    )
+    if exclude_user_id is not None:
+        users = users.filter(User.id != exclude_user_id)
+
+    if db.engine.dialect.name == "sqlite":
+        return _fts_search(users, terms, limit)
+    return _like_search(users, terms, limit)
+
+
+# Function - Rebuild User Search
+def rebuild_user_search():
+    """
+    Rebuilds the user_search index from the users table.
+    """
+
+    if db.engine.dialect.name != "sqlite":
+        return
+
+    db.session.execute(db.text("DELETE FROM user_search"))
+    db.session.execute(db.text(
+        "INSERT INTO user_search (rowid, firstname, lastname, email, "
+        "department) "
+        "SELECT users.id, users.firstname, users.lastname, users.email, "
+        "departments.name FROM users "
+        "LEFT JOIN departments ON departments.id = users.department_id"
+    ))
+    db.session.commit()
@@ -7,14 +7,13 @@ This file contains the views for the users blueprint.
 import random
 import string
 import csv
-import os
+import math
 from datetime import datetime
-from flask import render_template, url_for, flash, redirect, request, Blueprint
+from flask import (
+    render_template, url_for, flash, redirect, request, jsonify, Blueprint
+)
 from flask_login import login_user, current_user, logout_user, login_required
-from werkzeug.security import generate_password_hash
-from werkzeug.utils import secure_filename
-from flask_mail import Message
-from src import db, mail
+from src import db
 from src.users.forms import (
     LoginForm,
     UserForm,
@@ -25,9 +24,26 @@ from src.users.forms import (
 from src.models import (
     User,
     Departments,
-    Kudo,
+    UserImport,
+    UserImportRow,
+    KudoUserCount,
 )
 from src.decorators.decorators import admin_required
+from src.kudos.kudo_feed import profile_kudo_feeds
+from src.outbox.outbox import queue_email
+from src.users.bulk_import import stage_user_upload, start_user_import
+from src.settings.get_department_user_count import (
+    invalidate_department_user_count,
+)
+from src.users.identity_cache import invalidate_identity
+from src.users.login_throttle import check_login_attempt
+from src.users.passwords import (
+    PasswordHasherBusy,
+    hash_password,
+    needs_rehash,
+)
+from src.kudos.dashboard_cache import KUDOS_DATA, bump_data_version
+from src.users.user_search import search_users
 
 
 # Blueprint Configuration
@@ -43,12 +59,44 @@ def login():
 
     form = LoginForm()
 
+    # Throttle the attempts before any database or password hashing work
+    if request.method == 'POST':
+        wait = check_login_attempt(request.remote_addr,
+                                   request.form.get('email'))
+        if wait:
+            retry_after = math.ceil(wait)
+            flash('Too many login attempts, please try again in '
+                  f'{retry_after} seconds.', 'danger')
+            page = render_template('users/login.html',
+                                   title='Login',
+                                   form=form)
+            return page, 429, {'Retry-After': str(retry_after)}
+
     if form.validate_on_submit():
         user = User.query.filter_by(email=form.email.data).first()
 
+        try:
+            password_correct = (user is not None
+                                and user.check_password(form.password.data))
+        except PasswordHasherBusy:
+            flash('The server is busy, please try again in a moment.',
+                  'danger')
+            return redirect(url_for('users.login'))
+
         # Successful login
-        if user is not None and user.check_password(form.password.data):
-            login_user(user)
+        if password_correct:
+            if not login_user(user):
+                flash('Your account is inactive.', 'danger')
+                return redirect(url_for('users.login'))
+
+            # Replace a hash made with outdated parameters, a busy pool
+            # leaves it for the next login
+            if needs_rehash(user.password_hash):
+                try:
+                    user.password_hash = hash_password(form.password.data)
+                    db.session.commit()
+                except PasswordHasherBusy:
+                    pass
 
             next = request.args.get('next')
 
@@ -100,7 +148,7 @@ def user_registration():
         firstname = form.firstname.data
         lastname = form.lastname.data
         department_id = form.department.data
-        password = generate_password_hash(form.password.data)
+        password = hash_password(form.password.data)
 
         # Checks if email is already registered
         if User.query.filter_by(email=form.email.data).first():
@@ -120,6 +168,7 @@ def user_registration():
         )
         db.session.add(new_user)
         db.session.commit()
+        invalidate_department_user_count()
         flash('Registered successfully.', 'success')
 
         return redirect(url_for('users.login'))
@@ -170,8 +219,7 @@ def add_user():
         # Adds user to database
         new_user = User(
             email=email,
-            password_hash=generate_password_hash(
-                rand_password),
+            password_hash=hash_password(rand_password),
             firstname=firstname,
             lastname=lastname,
             department_id=department_id,
@@ -181,16 +229,12 @@ def add_user():
             created_by=current_user.id,
         )
         db.session.add(new_user)
-        db.session.commit()
-        flash('User added successfully.', 'success')
 
-        # Send email to new user
-        msg = Message(
+        # Queue email to new user
+        queue_email(
             "KudoTrio - New User",
             recipients=[email],
-            sender="noreply@healthtrio.com",
-        )
-        msg.body = f"""
+            body=f"""
         Hello {firstname},
 
         You have been added as a user.
@@ -203,8 +247,12 @@ def add_user():
 
         Please login and change your password.
         {url_for('users.login', _external=True)}
-        """
-        mail.send(msg)
+        """,
+        )
+
+        db.session.commit()
+        invalidate_department_user_count()
+        flash('User added successfully.', 'success')
 
         return redirect(url_for('core.index'))
 
@@ -231,10 +279,11 @@ def change_password(user_id):
         return "You are not authorized to view this page.", 401
 
     if form.validate_on_submit():
-        user.password_hash = generate_password_hash(form.password.data)
+        user.password_hash = hash_password(form.password.data)
         user.updated_date = datetime.utcnow()
         user.updated_by = current_user.id
         db.session.commit()
+        invalidate_identity(user.id)
         flash('Password changed successfully.', 'success')
         return redirect(url_for('core.index'))
 
@@ -265,19 +314,15 @@ def force_password_change(user_id):
             random.choices(string.ascii_lowercase + string.digits, k=12)
         )
 
-        user.password_hash = generate_password_hash(rand_password)
+        user.password_hash = hash_password(rand_password)
         user.updated_date = datetime.utcnow()
         user.updated_by = current_user.id
-        db.session.commit()
-        flash('User password changed successfully.', 'success')
 
-        # Send email to new user
-        msg = Message(
+        # Queue email to user
+        queue_email(
             "KudoTrio - Forced Password Change",
             recipients=[user.email],
-            sender="noreply@healthtrio.com",
-        )
-        msg.body = f"""
+            body=f"""
         Hello {user.firstname},
 
         You're password has been changed by an administrator.
@@ -287,8 +332,12 @@ def force_password_change(user_id):
 
         Please login and change your password.
         {url_for('users.login', _external=True)}
-        """
-        mail.send(msg)
+        """,
+        )
+
+        db.session.commit()
+        invalidate_identity(user.id)
+        flash('User password changed successfully.', 'success')
 
         return redirect(url_for('settings.settings_users'))
 
@@ -318,6 +367,8 @@ def change_status(user_id):
         user.updated_date = datetime.utcnow()
         user.updated_by = current_user.id
         db.session.commit()
+        invalidate_department_user_count()
+        invalidate_identity(user.id)
         flash(f'User status changed to {user.status} successfully.', 'success')
         return redirect(url_for('core.index'))
 
@@ -339,78 +390,43 @@ def profile(user_id):
     user = User.query.get_or_404(user_id)
 
     # Get Kudos
-    CreatingUser = db.aliased(User, name="CreatingUser")
-    CreatingUserDepartment = db.aliased(
-        Departments, name="CreatingUserDepartment")
-    ReceivingUser = db.aliased(User, name="ReceivingUser")
-    ReceivingUserDepartment = db.aliased(
-        Departments, name="ReceivingUserDepartment")
-
-    kudos_submitted = (
-        db.session.query(
-            Kudo.id,
-            Kudo.submitting_user_id,
-            Kudo.receiving_user_id,
-            Kudo.kudo_message,
-            Kudo.created_date,
-            CreatingUser.firstname.label("creating_user_firstname"),
-            CreatingUser.lastname.label("creating_user_lastname"),
-            CreatingUser.department_id,
-            CreatingUserDepartment.name.label("creating_user_department_name"),
-            ReceivingUser.firstname.label("receiving_user_firstname"),
-            ReceivingUser.lastname.label("receiving_user_lastname"),
-            ReceivingUser.department_id,
-            ReceivingUserDepartment.name.label(
-                "receiving_user_department_name"),
-        )
-        .outerjoin(CreatingUser,
-                   CreatingUser.id == Kudo.submitting_user_id)
-        .outerjoin(CreatingUserDepartment,
-                   CreatingUserDepartment.id == CreatingUser.department_id)
-        .outerjoin(ReceivingUser,
-                   ReceivingUser.id == Kudo.receiving_user_id)
-        .outerjoin(ReceivingUserDepartment,
-                   ReceivingUserDepartment.id == ReceivingUser.department_id)
-        .filter(Kudo.submitting_user_id == user_id)
-        .order_by(Kudo.created_date.desc())
-        .limit(10)
-    )
-
-    kudos_received = (
-        db.session.query(
-            Kudo.id,
-            Kudo.submitting_user_id,
-            Kudo.receiving_user_id,
-            Kudo.kudo_message,
-            Kudo.created_date,
-            CreatingUser.firstname.label("creating_user_firstname"),
-            CreatingUser.lastname.label("creating_user_lastname"),
-            CreatingUser.department_id,
-            CreatingUserDepartment.name.label("creating_user_department_name"),
-            ReceivingUser.firstname.label("receiving_user_firstname"),
-            ReceivingUser.lastname.label("receiving_user_lastname"),
-            ReceivingUser.department_id,
-            ReceivingUserDepartment.name.label(
-                "receiving_user_department_name"),
-        )
-        .outerjoin(CreatingUser,
-                   CreatingUser.id == Kudo.submitting_user_id)
-        .outerjoin(CreatingUserDepartment,
-                   CreatingUserDepartment.id == CreatingUser.department_id)
-        .outerjoin(ReceivingUser,
-                   ReceivingUser.id == Kudo.receiving_user_id)
-        .outerjoin(ReceivingUserDepartment,
-                   ReceivingUserDepartment.id == ReceivingUser.department_id)
-        .filter(Kudo.receiving_user_id == user_id)
-        .order_by(Kudo.created_date.desc())
-        .limit(10)
-    )
+    (
+        (kudos_submitted, kudos_submitted_cursor),
+        (kudos_received, kudos_received_cursor),
+    ) = profile_kudo_feeds(user_id)
+    kudo_counts = db.session.get(KudoUserCount, user_id)
 
     return render_template('users/profile.html',
                            title='User Profile',
                            user=user,
+                           kudo_counts=kudo_counts,
                            kudos_submitted=kudos_submitted,
-                           kudos_received=kudos_received)
+                           kudos_submitted_cursor=kudos_submitted_cursor,
+                           kudos_received=kudos_received,
+                           kudos_received_cursor=kudos_received_cursor)
+
+
+# Users - Search
+@users_bp.route('/users/search')
+@login_required
+def user_search():
+    """
+    Returns the active users matching the search as select2 results.
+    The logged in user is left out, as they cannot send themselves a kudo.
+    """
+
+    users = search_users(request.args.get('q', ''),
+                         exclude_user_id=current_user.id)
+
+    return jsonify(results=[
+        {
+            'id': user.id,
+            'text': f'{user.firstname} {user.lastname}' + (
+                f' ({user.department_name})' if user.department_name else ''
+            ),
+        }
+        for user in users
+    ])
 
 
 # Users - Edit Profile
@@ -458,7 +474,11 @@ def edit_profile(user_id):
         user.role = form.role.data
         user.updated_date = datetime.utcnow()
         user.updated_by = current_user.id
+        # Names and departments are shown on the kudos dashboard
+        bump_data_version(KUDOS_DATA)
         db.session.commit()
+        invalidate_department_user_count()
+        invalidate_identity(user.id)
         flash('User updated successfully.', 'success')
         return redirect(url_for('users.profile', user_id=user.id))
 
@@ -479,18 +499,28 @@ def bulk_upload_users():
     1. Learn how to format the CSV
     2. Select a CSV to upload
 
-    This function will return the file and redirect to the confirm page.
+    The file is parsed and validated once, into staged rows, and the admin
+    is redirected to the confirm page.
     """
 
     if request.method == "POST":
         csv_file = request.files["csvFile"]
-        if csv_file:
-            filename = secure_filename(csv_file.filename)
-            csv_file.save(filename)
-            # Redirect to users bulk upload preview
-            return redirect(url_for('users.confirm_users', filename=filename))
-        else:
+        if not csv_file:
             flash('No file uploaded.', 'danger')
+        elif not csv_file.filename.endswith('.csv'):
+            flash('Invalid file format. Please upload a CSV file.', 'danger')
+        else:
+            try:
+                user_import = stage_user_upload(csv_file.stream,
+                                                created_by=current_user.id)
+            except (UnicodeDecodeError, csv.Error):
+                db.session.rollback()
+                flash('Invalid CSV file. Please upload a UTF-8 CSV file.',
+                      'danger')
+            else:
+                # Redirect to users bulk upload preview
+                return redirect(url_for('users.confirm_users',
+                                        import_id=user_import.id))
 
     return render_template(
         "users/users_bulk_upload.html",
@@ -499,111 +529,84 @@ def bulk_upload_users():
 
 
 # Users - Bulk Upload Users - CSV Upload Preview
-@users_bp.route('/bulk_upload_users/confirm/<filename>',
+@users_bp.route('/bulk_upload_users/confirm/<int:import_id>',
                 methods=['GET', 'POST'])
 @login_required
 @admin_required
-def confirm_users(filename):
+def confirm_users(import_id):
     """
     This page will:
-    1. Verify the content of the CSV matches what's needed.
+    1. Show the staged rows of the CSV and any validation errors.
     2. Bulk create the users
     """
 
-    # Verify file extension
-    if not filename.endswith('.csv'):
-        flash('Invalid file format. Please upload a CSV file.', 'danger')
-        os.remove(filename)
-        return redirect(url_for('users.bulk_upload_users'))
-
-    # Parse CSV file and verify content
-    users = []
-    with open(filename, 'r') as file:
-        csv_reader = csv.reader(file)
-        next(csv_reader)  # Skip header row
-        for row in csv_reader:
-            if len(row) != 5:
-                flash("""
-Invalid CSV format. Please make sure all columns are provided.
-                    """,
-                      'danger'
-                      )
-                os.remove(filename)
-                return redirect(url_for('users.bulk_upload_users'))
-            users.append({
-                'first_name': row[0],
-                'last_name': row[1],
-                'email': row[2],
-                'department': row[3],
-                'role': row[4]
-            })
-
-    # Create the users
-    if request.method == 'POST':
-        for user_data in users:
-            user_data_email = user_data['email']
-
-            # Skip if user already exists
-            if User.query.filter_by(email=user_data_email).first():
-                continue
-
-            # Generate a random password
-            rand_password = "".join(
-                random.choices(string.ascii_lowercase + string.digits, k=12)
-            )
-            # Look up department id by the department name
-            department_name = user_data['department']
-            department = Departments.query.filter_by(
-                name=department_name).first()
-            if department:
-                department_id = department.id
-                # Create user using the existing user creation function
-                new_user = User(
-                    email=user_data['email'],
-                    password_hash=generate_password_hash(rand_password),
-                    firstname=user_data['first_name'],
-                    lastname=user_data['last_name'],
-                    department_id=department_id,
-                    role=user_data['role'],
-                    status="active",
-                    created_date=datetime.utcnow(),
-                    created_by=current_user.id,
-                )
-                db.session.add(new_user)
-
-                # Send email to new user
-                msg = Message(
-                    "KudoTrio - Forced Password Change",
-                    recipients=[new_user.email],
-                    sender="noreply@healthtrio.com",
-                )
-                msg.body = f"""
-                Hello {new_user.firstname},
-
-                You're password has been changed by an administrator.
-
-                Your temporary password is:
-                {rand_password}
-
-                Please login and change your password.
-                {url_for('users.login', _external=True)}
-                """
-                mail.send(msg)
-            else:
-                flash(
-                    f"Department '{department_name}' does not exist.",
-                    'danger'
-                )
-                os.remove(filename)
-                return redirect(url_for('users.bulk_upload_users'))
+    user_import = UserImport.query.get_or_404(import_id)
 
-        db.session.commit()
-        os.remove(filename)
-        flash('Users created successfully.', 'success')
-        return redirect(url_for('settings.settings_users'))
+    # Uploads that were already imported only have a status page
+    if user_import.status != "staged":
+        return redirect(url_for('users.user_import_status',
+                                import_id=import_id))
+
+    # Queue the users for the import worker
+    if request.method == 'POST':
+        start_user_import(
+            import_id,
+            imported_by=current_user.id,
+            login_url=url_for('users.login', _external=True),
+        )
+        return redirect(url_for('users.user_import_status',
+                                import_id=import_id))
+
+    users = (
+        UserImportRow.query
+        .filter_by(import_id=import_id)
+        .order_by(UserImportRow.row_number)
+        .paginate(page=request.args.get('page', 1, type=int),
+                  per_page=100, error_out=False)
+    )
 
     return render_template(
         "users/users_bulk_upload_confirm.html",
         title="Confirm Users",
+        user_import=user_import,
         users=users
     )
+
+
+# Users - Bulk Upload Users - Import Status
+@users_bp.route('/bulk_upload_users/import/<int:import_id>')
+@login_required
+@admin_required
+def user_import_status(import_id):
+    """
+    Shows the progress of a bulk user import.
+    """
+
+    user_import = UserImport.query.get_or_404(import_id)
+
+    return render_template(
+        "users/users_bulk_upload_progress.html",
+        title="Importing Users",
+        user_import=user_import,
+    )
+
+
+# Users - Bulk Upload Users - Import Progress
+@users_bp.route('/bulk_upload_users/import/<int:import_id>/progress')
+@login_required
+@admin_required
+def user_import_progress(import_id):
+    """
+    Returns the progress of a bulk user import as JSON.
+    """
+
+    user_import = UserImport.query.get_or_404(import_id)
+
+    return jsonify(
+        status=user_import.status,
+        total_rows=user_import.total_rows,
+        processed_rows=user_import.processed_rows,
+        created_count=user_import.created_count,
+        skipped_count=user_import.skipped_count,
+        error=user_import.error,
+    )
@@ -31,3 +31,42 @@ def browserChrome():
 
     # Quit the browser after the test is completed
     b.quit()
+
+
+@pytest.fixture(scope="session")
+def test_app(tmp_path_factory):
+    # One app for the session, kept away from the development database
+    from src import create_app
+
+    return create_app({
+        "TESTING": True,
+        "WTF_CSRF_ENABLED": False,
+        "SECRET_KEY": "testing",
+        # Cheap hashes, the real parameters are slow on purpose
+        "PASSWORD_HASH_METHOD": "pbkdf2:sha256:1000",
+        "SQLITE_LOCATION": str(tmp_path_factory.mktemp("instance")),
+    })
+
+
+@pytest.fixture
+def app(test_app):
+    from src import db
+    from src.users import identity_cache
+    from src.kudos.dashboard_cache import clear_fragments
+    from src.users.login_throttle import reset_login_throttle
+    from src.kudos.leaderboards import reset_leaderboards
+    from src.settings.get_department_user_count import (
+        invalidate_department_user_count,
+    )
+
+    # Start every test from an empty database and empty process caches
+    with test_app.app_context():
+        db.drop_all()
+        db.create_all()
+        identity_cache._identities.clear()
+        invalidate_department_user_count()
+        clear_fragments()
+        reset_login_throttle()
+        reset_leaderboards()
+        yield test_app
+        db.session.remove()
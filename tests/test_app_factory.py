@@ -0,0 +1,52 @@
+"""
+Tests if the app factory builds isolated apps from its config and the web
+app starts without the CLI only dependencies.
+"""
+
+# Imports
+import os
+from sqlalchemy import inspect
+from src import create_app, db
+from benchmarks.startup import CLI_ONLY_MODULES, measure_startup
+
+
+def test_create_app_config(tmp_path):
+    """
+    Tests if the config overrides the environment and the files of the app
+    follow its SQLite location.
+    """
+
+    app = create_app({
+        "TESTING": True,
+        "SQLITE_LOCATION": str(tmp_path),
+        "MEME_THUMBNAIL_WIDTH": 200,
+    })
+
+    assert app.config["SQLALCHEMY_DATABASE_URI"] == (
+        "sqlite:///" + os.path.join(str(tmp_path), "database.db"))
+    assert app.config["MEME_CACHE_DIR"] == os.path.join(str(tmp_path),
+                                                        "meme_cache")
+    assert app.config["MEME_THUMBNAIL_WIDTH"] == 200
+    assert {"core", "commands", "users", "settings", "kudos",
+            "memes"} <= set(app.blueprints)
+
+    # Tables created for one app are not seen by another
+    with app.app_context():
+        db.create_all()
+        assert "kudos" in inspect(db.engine).get_table_names()
+    os.makedirs(tmp_path / "other")
+    other = create_app({"SQLITE_LOCATION": str(tmp_path / "other")})
+    with other.app_context():
+        assert inspect(db.engine).get_table_names() == []
+
+
+def test_startup_skips_cli_modules(tmp_path):
+    """
+    Tests if a new worker serves its first request without importing the
+    modules only CLI commands need.
+    """
+
+    result, _ = measure_startup(str(tmp_path))
+
+    assert result["total_ms"] > 0
+    assert not set(CLI_ONLY_MODULES) & set(result["modules"])
@@ -0,0 +1,96 @@
+"""
+Tests if the static assets are built with fingerprinted names and served
+precompressed with immutable caching.
+"""
+
+# Imports
+import gzip
+import json
+import shutil
+import brotli
+import pytest
+from flask import url_for
+from src.assets.assets import build_assets, load_manifest
+
+
+@pytest.fixture
+def static_folder(app, tmp_path):
+    # Build a copy of the static folder, so src/static is left alone
+    static_folder = tmp_path / "static"
+    shutil.copytree(app.static_folder, static_folder)
+    original_folder = app.static_folder
+    original_manifest = app.extensions["assets_manifest"]
+
+    manifest = build_assets(str(static_folder))
+    app.static_folder = str(static_folder)
+    app.extensions["assets_manifest"] = manifest
+    app.extensions.pop("assets_built_files", None)
+
+    yield static_folder
+
+    app.static_folder = original_folder
+    app.extensions["assets_manifest"] = original_manifest
+    app.extensions.pop("assets_built_files", None)
+
+
+def test_build_assets(app, static_folder):
+    """
+    Tests if the manifest points to fingerprinted copies and the CSS font
+    references are rewritten.
+    """
+
+    manifest = load_manifest(app)
+    assert manifest == json.loads(
+        (static_folder / "dist" / "manifest.json").read_text())
+
+    built_css = manifest["plugins/fontawesome/css/solid.min.css"]
+    assert built_css.startswith("dist/plugins/fontawesome/css/solid.min.")
+    css = (static_folder / built_css).read_text()
+    built_font = manifest["plugins/fontawesome/webfonts/fa-solid-900.woff2"]
+    assert "../webfonts/" + built_font.rsplit("/", 1)[1] in css
+    assert "fa-solid-900.woff2)" not in css
+
+    assert gzip.decompress(
+        (static_folder / (built_css + ".gz")).read_bytes()
+    ).decode() == css
+    assert brotli.decompress(
+        (static_folder / (built_css + ".br")).read_bytes()
+    ).decode() == css
+
+    with app.test_request_context():
+        assert url_for("static", filename="css/custom.css") == (
+            "/static/" + manifest["css/custom.css"])
+
+
+def test_serve_assets(app, static_folder):
+    """
+    Tests if built assets are served precompressed with immutable caching.
+    """
+
+    client = app.test_client()
+    with app.test_request_context():
+        url = url_for("static", filename="js/kudo_feed.js")
+
+    response = client.get(url, headers={"Accept-Encoding": "gzip, br"})
+    assert response.status_code == 200
+    assert response.content_encoding == "br"
+    assert response.mimetype in ("text/javascript", "application/javascript")
+    assert response.cache_control.immutable
+    assert response.cache_control.max_age == 365 * 24 * 60 * 60
+    assert "Accept-Encoding" in response.vary
+    source = (static_folder / "js" / "kudo_feed.js").read_bytes()
+    assert brotli.decompress(response.data) == source
+
+    response = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert response.content_encoding == "gzip"
+    assert gzip.decompress(response.data) == source
+
+    response = client.get(url)
+    assert response.content_encoding is None
+    assert response.data == source
+
+    # Files outside the manifest are served as before
+    response = client.get("/static/js/kudo_feed.js")
+    assert response.status_code == 200
+    assert not response.cache_control.immutable
+    response.close()
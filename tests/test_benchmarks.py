@@ -0,0 +1,70 @@
+"""
+Tests if the route benchmarks summarize latencies and flag regressions
+against the baseline.
+"""
+
+# Imports
+from benchmarks.routes import percentile, summarize, compare_results
+from benchmarks.startup import slowest_imports
+
+
+def test_percentile():
+    """
+    Tests the nearest-rank percentiles.
+    """
+
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile(values, 99) == 99
+    assert percentile([7], 99) == 7
+
+    summary = summarize([0.001] * 99 + [0.5], [3] * 99 + [4])
+    assert summary["p50_ms"] == 1.0
+    assert summary["p99_ms"] == 1.0
+    assert summary["queries"] == 3
+
+
+def test_compare_results():
+    """
+    Tests if slower routes and extra queries are flagged, and noise is not.
+    """
+
+    baseline = {"small": {
+        "/kudos": {"p95_ms": 10.0, "queries": 2},
+        "/kudos/create": {"p95_ms": 1.0, "queries": 1},
+    }}
+
+    assert compare_results({"small": {
+        "/kudos": {"p95_ms": 12.4, "queries": 2},
+        "/kudos/create": {"p95_ms": 2.9, "queries": 1},
+        "/settings/users": {"p95_ms": 500.0, "queries": 9},
+    }, "large": {"/kudos": {"p95_ms": 900.0, "queries": 9}}}, baseline) == []
+
+    regressions = compare_results({"small": {
+        "/kudos": {"p95_ms": 12.6, "queries": 3},
+        "/kudos/create": {"p95_ms": 3.1, "queries": 1},
+    }}, baseline)
+    assert regressions == [
+        "small /kudos: p95 12.6 ms, baseline 10.0 ms",
+        "small /kudos: 3 queries, baseline 2",
+        "small /kudos/create: p95 3.1 ms, baseline 1.0 ms",
+    ]
+
+
+def test_slowest_imports():
+    """
+    Tests if the -X importtime report is read down to the nesting depth.
+    """
+
+    report = "\n".join([
+        "import time: self [us] | cumulative | imported package",
+        "import time:       500 |       9000 | src",
+        "import time:       300 |       6000 |   flask",
+        "import time:      4000 |       4000 |     werkzeug",
+        "import time:      2500 |       2500 | src.kudos.views",
+    ])
+
+    assert slowest_imports(report, 2) == [("src", 9.0), ("flask", 6.0)]
+    assert slowest_imports(report, 5, max_depth=0) == [
+        ("src", 9.0), ("src.kudos.views", 2.5)]
@@ -0,0 +1,130 @@
+"""
+Tests if bulk uploaded users are staged, validated and imported.
+"""
+
+# Imports
+import io
+from datetime import datetime, timedelta
+from src import db
+from src.models import (
+    User,
+    Departments,
+    OutboxEmail,
+    UserImport,
+    UserImportRow,
+)
+from src.users.bulk_import import (
+    stage_user_upload,
+    start_user_import,
+    claim_user_import,
+    run_import_worker,
+)
+
+
+def stage_csv(*rows):
+    """
+    Stages a CSV file made of the header and the given rows.
+    """
+
+    content = "First Name,Last Name,Email,Department,Role\n" + "".join(
+        f"{row}\n" for row in rows
+    )
+    return stage_user_upload(io.BytesIO(content.encode()), created_by=None)
+
+
+def test_stage_user_upload(app):
+    """
+    Tests if every row is staged with its validation error.
+    """
+
+    db.session.add(Departments(name="IT"))
+    db.session.commit()
+
+    user_import = stage_csv(
+        "Jane,Doe,jane@healthtrio.com,IT,user",
+        "John,Doe,john@healthtrio.com",
+        "John,Doe,not-an-email,IT,user",
+        "John,Doe,john@healthtrio.com,Nope,user",
+        "John,Doe,john@healthtrio.com,IT,boss",
+    )
+
+    assert user_import.status == "staged"
+    assert user_import.total_rows == 5
+    assert user_import.invalid_count == 4
+    errors = [
+        row.error for row in
+        UserImportRow.query.order_by(UserImportRow.row_number)
+    ]
+    assert errors == [
+        None,
+        "All 5 columns must be provided.",
+        "Invalid email.",
+        "Department 'Nope' does not exist.",
+        "Invalid role 'boss'.",
+    ]
+
+
+def test_import_users(app):
+    """
+    Tests if new users are created with an email and the others skipped.
+    """
+
+    app.config["BULK_IMPORT_HASH_WORKERS"] = 2
+    db.session.add(Departments(name="IT"))
+    db.session.add(User(email="known@healthtrio.com"))
+    db.session.commit()
+
+    user_import = stage_csv(
+        "Jane,Doe,new1@healthtrio.com,IT,user",
+        "Jane,Doe,known@healthtrio.com,IT,user",
+        "Jane,Doe,new2@healthtrio.com,IT,admin",
+        "Jane,Doe,new1@healthtrio.com,IT,user",
+        "Jane,Doe,invalid,IT,user",
+    )
+    assert start_user_import(user_import.id, imported_by=None,
+                             login_url="http://localhost/login")
+    assert not start_user_import(user_import.id, imported_by=None,
+                                 login_url="http://localhost/login")
+    run_import_worker(once=True)
+
+    assert user_import.status == "completed"
+    assert user_import.processed_rows == 5
+    assert user_import.created_count == 2
+    assert user_import.skipped_count == 3
+    new_user = User.query.filter_by(email="new2@healthtrio.com").one()
+    assert (new_user.department_id, new_user.role) == (1, "admin")
+    assert new_user.password_hash.startswith("pbkdf2")
+    assert OutboxEmail.query.count() == 2
+    assert UserImportRow.query.count() == 0
+
+
+def test_stopped_import_is_claimed_again(app):
+    """
+    Tests if an import whose worker stopped is run again after its lease,
+    and failed after its last attempt.
+    """
+
+    app.config.update(IMPORT_LEASE_SECONDS=300, IMPORT_MAX_ATTEMPTS=2)
+    db.session.add(Departments(name="IT"))
+    db.session.commit()
+    user_import = stage_csv("Jane,Doe,jane@healthtrio.com,IT,user")
+    start_user_import(user_import.id, imported_by=None, login_url="")
+
+    # A worker claims the import and stops before finishing
+    assert claim_user_import() == user_import.id
+    assert claim_user_import() is None
+
+    def stop_worker():
+        user_import.updated_date = datetime.utcnow() - timedelta(minutes=6)
+        db.session.commit()
+
+    stop_worker()
+    assert claim_user_import() == user_import.id
+    db.session.refresh(user_import)
+    assert (user_import.status, user_import.attempts) == ("running", 2)
+
+    stop_worker()
+    assert claim_user_import() is None
+    db.session.refresh(user_import)
+    assert user_import.status == "failed"
+    assert UserImport.query.filter_by(status="running").count() == 0
@@ -0,0 +1,97 @@
+"""
+Tests if the kudos dashboard is cached until a kudo changes and answers
+conditional requests with 304.
+"""
+
+# Imports
+from datetime import datetime
+import pytest
+from flask import g
+from sqlalchemy import event
+from src import db
+from src.models import (
+    User,
+    Departments,
+    Kudo,
+)
+from src.kudos.rollups import record_kudo_rollups
+from src.kudos.dashboard_cache import KUDOS_DATA, bump_data_version
+
+
+def _add_kudo(message):
+    kudo = Kudo(submitting_user_id=1, receiving_user_id=2,
+                kudo_message=message, created_date=datetime.utcnow())
+    db.session.add(kudo)
+    db.session.flush()
+    record_kudo_rollups(kudo)
+    bump_data_version(KUDOS_DATA)
+    db.session.commit()
+
+
+def _client(app, user_id):
+    # The app context outlives the requests, so forget the last user
+    g.pop("_login_user", None)
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = str(user_id)
+        session["_fresh"] = True
+    return client
+
+
+@pytest.fixture
+def statements(app):
+    # Records the SQL statements run while the test is running
+    executed = []
+
+    def record(conn, cursor, statement, *args):
+        executed.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", record)
+    yield executed
+    event.remove(db.engine, "before_cursor_execute", record)
+
+
+def test_dashboard_cache(app, statements):
+    """
+    Tests if the charts and feed are only queried after a kudo is added,
+    and unchanged pages answer 304 for the same user only.
+    """
+
+    db.session.add(Departments(name="IT"))
+    db.session.add(User(email="jane@healthtrio.com", firstname="Jane",
+                        lastname="Doe", department_id=1, status="active"))
+    db.session.add(User(email="john@healthtrio.com", firstname="John",
+                        lastname="Doe", department_id=1, status="active"))
+    db.session.commit()
+    _add_kudo("First kudo")
+
+    client = _client(app, 1)
+    response = client.get("/kudos")
+    assert response.status_code == 200
+    assert "First kudo" in response.get_data(as_text=True)
+    assert response.cache_control.no_cache
+    etag = response.headers["ETag"]
+
+    # The cached charts and feed are used, the navbar is rendered again
+    statements.clear()
+    response = client.get("/kudos")
+    assert response.status_code == 200
+    assert "First kudo" in response.get_data(as_text=True)
+    assert not any("kudo_rollup" in sql or "FROM kudos" in sql
+                   for sql in statements)
+
+    response = client.get("/kudos", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert response.data == b""
+
+    # Another user sees their own navbar
+    response = _client(app, 2).get("/kudos", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+    _add_kudo("Second kudo")
+    response = _client(app, 1).get("/kudos", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert "Second kudo" in response.get_data(as_text=True)
+    assert response.headers["ETag"] != etag
@@ -0,0 +1,98 @@
+"""
+Tests if the dashboard chart endpoints return the data for the requested
+window and granularity, and answer conditional requests with 304.
+"""
+
+# Imports
+from datetime import date, datetime, timedelta
+import pytest
+from src import db
+from src.models import (
+    User,
+    Departments,
+    Kudo,
+)
+from src.kudos.rollups import record_kudo_rollups
+from src.kudos.dashboard_cache import KUDOS_DATA, bump_data_version
+from src.kudos.dashboard_charts import chart_range
+
+
+@pytest.fixture
+def client(app):
+    db.session.add(Departments(name="IT"))
+    db.session.add(User(email="jane@healthtrio.com", firstname="Jane",
+                        lastname="Doe", department_id=1, status="active"))
+    db.session.add(User(email="john@healthtrio.com", firstname="John",
+                        lastname="Doe", department_id=1, status="active"))
+    db.session.flush()
+
+    today = datetime.utcnow()
+    for days_ago in (0, 1, 1, 10, 200):
+        kudo = Kudo(submitting_user_id=1, receiving_user_id=2,
+                    kudo_message="Thanks!",
+                    created_date=today - timedelta(days=days_ago))
+        db.session.add(kudo)
+        db.session.flush()
+        record_kudo_rollups(kudo)
+    bump_data_version(KUDOS_DATA)
+    db.session.commit()
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = "1"
+        session["_fresh"] = True
+    return client
+
+
+def test_chart_range():
+    """
+    Tests if named windows, day counts and custom ranges are parsed.
+    """
+
+    today = date(2023, 6, 30)
+    assert chart_range(today=today) == (date(2023, 3, 3), today)
+    assert chart_range("week", today=today) == (date(2023, 6, 24), today)
+    assert chart_range("10", today=today) == (date(2023, 6, 21), today)
+    assert chart_range(start="2023-01-01", end="2023-01-31",
+                       today=today) == (date(2023, 1, 1), date(2023, 1, 31))
+
+    for window, start, end in [("never", None, None), ("0", None, None),
+                               (None, "2023-02-01", "2023-01-01"),
+                               (None, "2015-01-01", None)]:
+        with pytest.raises(ValueError):
+            chart_range(window, start, end, today=today)
+
+
+def test_dashboard_charts(client):
+    """
+    Tests if each chart covers its window and is cached per window.
+    """
+
+    response = client.get("/kudos/charts/counts?window=week&granularity=day")
+    assert response.status_code == 200
+    assert len(response.json["labels"]) == 7
+    assert response.json["data"][-2:] == [2, 1]
+    assert sum(response.json["data"]) == 3
+    etag = response.headers["ETag"]
+
+    response = client.get("/kudos/charts/counts?window=week&granularity=day",
+                          headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    response = client.get("/kudos/charts/counts?window=month&granularity=day",
+                          headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert sum(response.json["data"]) == 4
+
+    response = client.get("/kudos/charts/receivers?window=year")
+    assert response.json["labels"] == ["John Doe"]
+    assert response.json["data"] == [5]
+
+    response = client.get("/kudos/charts/departments")
+    assert response.json["labels"] == ["IT"]
+    assert response.json["data"] == [4]
+
+    assert client.get("/kudos/charts/nope").status_code == 404
+    assert client.get(
+        "/kudos/charts/counts?granularity=decade").status_code == 400
+    assert client.get("/kudos/charts/counts?window=-5").status_code == 400
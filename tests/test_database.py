@@ -0,0 +1,38 @@
+"""
+Tests if the database engine is configured from the settings.
+"""
+
+# Imports
+from src import db
+from src.database.database import database_url, engine_options
+
+
+def test_sqlite_pragmas(app):
+    """
+    Tests if SQLite connections use WAL and the configured timeouts.
+    """
+
+    connection = db.session.connection()
+    pragmas = {
+        pragma: connection.exec_driver_sql(f"PRAGMA {pragma}").scalar()
+        for pragma in ["journal_mode", "busy_timeout", "synchronous"]
+    }
+    assert pragmas == {
+        "journal_mode": "wal",
+        "busy_timeout": app.config["SQLITE_BUSY_TIMEOUT"],
+        "synchronous": 1,  # NORMAL
+    }
+
+
+def test_engine_options():
+    """
+    Tests if server databases get a pool size and in-memory SQLite does not.
+    """
+
+    assert database_url("postgres://db/kudos") == "postgresql://db/kudos"
+    server = engine_options("postgresql://db/kudos", pool_size=5,
+                            max_overflow=10, pool_recycle=1800)
+    assert (server["pool_size"], server["pool_recycle"]) == (5, 1800)
+    memory = engine_options("sqlite://", pool_size=5, max_overflow=10,
+                            pool_recycle=1800)
+    assert "pool_size" not in memory
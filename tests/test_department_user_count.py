@@ -0,0 +1,74 @@
+"""
+Tests if the department user counts are keyed by ID, cached and invalidated.
+"""
+
+# Imports
+import os
+from sqlalchemy import event
+from src import db
+from src.core.stamp_files import stamp_mtime
+from src.models import (
+    User,
+    Departments,
+)
+from src.settings.get_department_user_count import (
+    get_department_user_count,
+    invalidate_department_user_count,
+)
+
+
+def test_department_user_count(app):
+    """
+    Tests if departments with the same name are counted apart and if the
+    counts are read once until they are invalidated.
+    """
+
+    db.session.add_all([Departments(name="IT"), Departments(name="IT")])
+    db.session.add_all([
+        User(email="a@healthtrio.com", department_id=1),
+        User(email="b@healthtrio.com", department_id=2),
+        User(email="c@healthtrio.com", department_id=2),
+    ])
+    db.session.commit()
+    invalidate_department_user_count()
+
+    statements = []
+
+    def count_statement(*args):
+        statements.append(args[2])
+
+    event.listen(db.engine, "before_cursor_execute", count_statement)
+    try:
+        assert get_department_user_count() == {1: 1, 2: 2}
+        db.session.add(User(email="d@healthtrio.com", department_id=1))
+        db.session.commit()
+        assert get_department_user_count() == {1: 1, 2: 2}
+        assert len(statements) == 2  # GROUP BY and INSERT
+    finally:
+        event.remove(db.engine, "before_cursor_execute", count_statement)
+
+    invalidate_department_user_count()
+    assert get_department_user_count() == {1: 2, 2: 2}
+
+
+def test_department_user_count_other_process(app):
+    """
+    Tests if the counts are reloaded once another process invalidates them
+    through its stamp file, which is not the one of the identity cache.
+    """
+
+    db.session.add(Departments(name="IT"))
+    db.session.add(User(email="a@healthtrio.com", department_id=1))
+    db.session.commit()
+    identity_stamp = stamp_mtime(app.config["IDENTITY_CACHE_STAMP"])
+    invalidate_department_user_count()
+    assert get_department_user_count() == {1: 1}
+    assert stamp_mtime(app.config["IDENTITY_CACHE_STAMP"]) == identity_stamp
+
+    # Another process adds a user and touches the stamp file
+    db.session.add(User(email="b@healthtrio.com", department_id=1))
+    db.session.commit()
+    stamp = app.config["DEPARTMENT_USER_COUNT_STAMP"]
+    os.utime(stamp, ns=(0, os.stat(stamp).st_mtime_ns + 1))
+
+    assert get_department_user_count() == {1: 2}
@@ -0,0 +1,139 @@
+"""
+Tests if the meme template catalog is cached, snapshotted and refreshed
+against a local memegen.link stub.
+"""
+
+# Imports
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from src.kudos import generate_meme
+from src.kudos.generate_meme import meme_templates
+
+
+class MemegenStub(BaseHTTPRequestHandler):
+    """
+    Serves a fixed list of templates, or errors when told to.
+    """
+
+    templates = []
+    fail = False
+    requests = 0
+
+    def do_GET(self):
+        MemegenStub.requests += 1
+        if MemegenStub.fail or self.path != "/templates/":
+            self.send_response(500)
+            self.end_headers()
+            return
+        body = json.dumps(MemegenStub.templates).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def stub_template(template_id):
+    """
+    Returns a template as memegen.link lists it.
+    """
+
+    return {"id": template_id, "name": template_id.title(),
+            "_self": f"http://stub/templates/{template_id}"}
+
+
+@pytest.fixture
+def memegen(app, tmp_path):
+    # Start the stub server
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MemegenStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    MemegenStub.templates = [stub_template("buzz")]
+    MemegenStub.fail = False
+    MemegenStub.requests = 0
+    app.config.update(
+        MEMEGEN_API_URL=f"http://127.0.0.1:{server.server_port}",
+        MEME_TEMPLATES_TTL=3600,
+        MEME_TEMPLATES_TIMEOUT=1,
+        MEME_TEMPLATES_SNAPSHOT=str(tmp_path / "meme_templates.json"),
+    )
+
+    # Start from an empty cache
+    generate_meme._catalog.update(
+        templates=None, fetched_at=0.0, retry_at=0.0, refreshing=False
+    )
+
+    yield MemegenStub
+
+    server.shutdown()
+    server.server_close()
+
+
+def wait_for_refresh():
+    """
+    Waits for the background refresh to finish.
+    """
+
+    for _ in range(100):
+        if not generate_meme._catalog["refreshing"]:
+            return
+        time.sleep(0.01)
+
+
+def test_templates_are_cached(memegen):
+    """
+    Tests if the API is only called once while the catalog is fresh.
+    """
+
+    assert meme_templates()[0]["id"] == "buzz"
+    assert meme_templates()[0]["id"] == "buzz"
+    assert memegen.requests == 1
+
+
+def test_snapshot_survives_restart(memegen):
+    """
+    Tests if a new process is served from the on-disk snapshot.
+    """
+
+    meme_templates()
+    memegen.fail = True
+
+    # Simulate a restart by emptying the in-memory cache
+    generate_meme._catalog.update(templates=None, fetched_at=0.0)
+
+    assert meme_templates()[0]["id"] == "buzz"
+    assert memegen.requests == 1
+
+
+def test_stale_catalog_is_served_while_refreshing(app, memegen):
+    """
+    Tests if a stale catalog is returned at once and refreshed in the
+    background.
+    """
+
+    meme_templates()
+    app.config["MEME_TEMPLATES_TTL"] = 0
+    memegen.templates = [stub_template("doge")]
+
+    assert meme_templates()[0]["id"] == "buzz"
+    wait_for_refresh()
+    assert meme_templates()[0]["id"] == "doge"
+
+
+def test_failing_api_keeps_catalog(app, memegen):
+    """
+    Tests if a failing refresh keeps the last good catalog.
+    """
+
+    meme_templates()
+    app.config["MEME_TEMPLATES_TTL"] = 0
+    memegen.fail = True
+
+    meme_templates()
+    wait_for_refresh()
+    assert meme_templates()[0]["id"] == "buzz"
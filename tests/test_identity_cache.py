@@ -0,0 +1,48 @@
+"""
+Tests if logged in users are cached and dropped as soon as they change.
+"""
+
+# Imports
+import pytest
+from sqlalchemy import event
+from src import db
+from src.models import User, load_user
+from src.users.identity_cache import invalidate_identity
+
+
+def test_identity_cache(app):
+    """
+    Tests if the user is loaded once and locked out right after being
+    deactivated.
+    """
+
+    user = User(email="jane@healthtrio.com", firstname="Jane", role="admin",
+                status="active")
+    db.session.add(user)
+    db.session.commit()
+    user_id = user.id
+    db.session.expunge_all()
+    invalidate_identity(user_id)
+
+    statements = []
+
+    def count_statement(*args):
+        statements.append(args[2])
+
+    event.listen(db.engine, "before_cursor_execute", count_statement)
+    try:
+        identity = load_user(str(user_id))
+        assert load_user(str(user_id)) is identity
+        assert len(statements) == 1
+    finally:
+        event.remove(db.engine, "before_cursor_execute", count_statement)
+
+    assert (identity.firstname, identity.role) == ("Jane", "admin")
+    assert not hasattr(identity, "password_hash")
+    with pytest.raises(AttributeError):
+        identity.role = "user"
+
+    db.session.get(User, user_id).status = "inactive"
+    db.session.commit()
+    invalidate_identity(user_id)
+    assert load_user(str(user_id)) is None
@@ -0,0 +1,58 @@
+"""
+Tests if the kudo feed pages through every kudo exactly once.
+"""
+
+# Imports
+from datetime import datetime
+import pytest
+from src import db
+from src.models import (
+    User,
+    Departments,
+    Kudo,
+)
+from src.kudos.kudo_feed import kudo_feed_page, decode_feed_cursor
+
+
+def test_kudo_feed_page(app):
+    """
+    Tests if the pages follow each other without gaps or repeats, also
+    when kudos share the same created date.
+    """
+
+    db.session.add(Departments(name="IT"))
+    db.session.add(User(email="jane@healthtrio.com", department_id=1))
+    db.session.add(User(email="john@healthtrio.com", department_id=1))
+    db.session.flush()
+    for i in range(25):
+        db.session.add(Kudo(
+            submitting_user_id=1,
+            receiving_user_id=2,
+            kudo_message=f"Kudo {i}",
+            created_date=datetime(2023, 6, 1 + i // 3),
+        ))
+    db.session.commit()
+
+    seen = []
+    cursor = None
+    while True:
+        kudos, cursor = kudo_feed_page(cursor=cursor, limit=10,
+                                       receiving_user_id=2)
+        seen.extend(kudo.id for kudo in kudos)
+        if cursor is None:
+            break
+
+    expected = [
+        kudo.id for kudo in
+        Kudo.query.order_by(Kudo.created_date.desc(), Kudo.id.desc())
+    ]
+    assert seen == expected
+
+
+def test_decode_feed_cursor():
+    """
+    Tests if an invalid cursor raises a ValueError.
+    """
+
+    with pytest.raises(ValueError):
+        decode_feed_cursor("not-a-cursor")
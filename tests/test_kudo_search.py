@@ -0,0 +1,59 @@
+"""
+Tests if kudo messages are searched, ranked, highlighted and filtered.
+"""
+
+# Imports
+from datetime import date, datetime
+from src import db
+from src.models import (
+    User,
+    Departments,
+    Kudo,
+)
+from src.kudos.kudo_search import search_kudos
+
+
+def test_search_kudos(app):
+    """
+    Tests stemming, phrases, filters, highlighting and the index triggers.
+    """
+
+    db.session.add_all([Departments(name="IT"), Departments(name="HR")])
+    db.session.add_all([
+        User(email="a@healthtrio.com", department_id=1),
+        User(email="b@healthtrio.com", department_id=2),
+    ])
+    db.session.add_all([
+        Kudo(submitting_user_id=1, receiving_user_id=2,
+             kudo_message="Thanks for the Q3 migration <3",
+             created_date=datetime(2023, 9, 30)),
+        Kudo(submitting_user_id=2, receiving_user_id=1,
+             kudo_message="Great work on the migrations, Q3 was a blast",
+             created_date=datetime(2023, 10, 2)),
+        Kudo(submitting_user_id=2, receiving_user_id=1,
+             kudo_message="Lunch was great",
+             created_date=datetime(2023, 10, 3)),
+    ])
+    db.session.commit()
+
+    def found_ids(query, **filters):
+        kudos, _ = search_kudos(query, **filters)
+        return sorted(kudo["id"] for kudo in kudos)
+
+    assert found_ids("migration q3") == [1, 2]
+    assert found_ids('"q3 migration"') == [1]
+    assert found_ids("migration", start_date=date(2023, 10, 1)) == [2]
+    assert found_ids("migration", end_date=date(2023, 9, 30)) == [1]
+    assert found_ids("migration", department_id=2) == [1]
+    assert found_ids('") OR *') == []
+
+    kudos, has_next = search_kudos('"q3 migration"')
+    assert not has_next
+    assert kudos[0]["highlighted_message"] == (
+        "Thanks for the <mark>Q3 migration</mark> &lt;3"
+    )
+
+    # The index follows edited kudos
+    db.session.get(Kudo, 3).kudo_message = "Lunch after the migration"
+    db.session.commit()
+    assert found_ids("lunch migration") == [3]
@@ -0,0 +1,290 @@
+"""
+Tests if the in-memory leaderboards match the kudos of each window, as
+kudos are added by this process and by others, and if the dashboard
+charts are served from them.
+"""
+
+# Imports
+import threading
+from datetime import date, datetime, timedelta
+from sqlalchemy import event
+from src import db
+from src.models import (
+    User,
+    Departments,
+    Kudo,
+)
+from src.kudos import leaderboards
+from src.kudos.dashboard_cache import KUDOS_DATA, bump_data_version
+from src.kudos.rollups import (
+    record_kudo_rollups,
+    rebuild_kudo_rollups,
+    top_receivers,
+    kudos_count_by_department,
+)
+from src.kudos.dashboard_charts import (
+    CHART_WINDOWS,
+    DEFAULT_WINDOW_DAYS,
+    chart_data,
+)
+from src.kudos.leaderboards import (
+    LEADERBOARDS,
+    LEADERBOARD_WINDOWS,
+    Leaderboard,
+    rebuild_leaderboards,
+    reset_leaderboards,
+    record_kudo_leaderboards,
+    top_entries,
+)
+
+
+def add_users():
+    """
+    Adds two departments and three users, the last one without department.
+    """
+
+    db.session.add_all([Departments(name="IT"), Departments(name="HR")])
+    db.session.add_all([
+        User(email="a@healthtrio.com", firstname="Ann", lastname="A",
+             department_id=1, status="active"),
+        User(email="b@healthtrio.com", firstname="Bob", lastname="B",
+             department_id=2, status="active"),
+        User(email="c@healthtrio.com", firstname="Cat", lastname="C",
+             status="active"),
+    ])
+    db.session.flush()
+
+
+def add_kudo(submitter, receiver, created_date, kudo_id=None):
+    """
+    Adds a kudo, its rollups and a new data version, as every process does.
+    """
+
+    kudo = Kudo(id=kudo_id, submitting_user_id=submitter,
+                receiving_user_id=receiver, kudo_message="Thanks!",
+                created_date=created_date)
+    db.session.add(kudo)
+    db.session.flush()
+    record_kudo_rollups(kudo)
+    bump_data_version(KUDOS_DATA)
+    db.session.commit()
+    return kudo
+
+
+def all_entries():
+    """
+    Returns every entry of every leaderboard and window.
+    """
+
+    return {
+        (leaderboard, days): top_entries(leaderboard, days, None)
+        for leaderboard in LEADERBOARDS
+        for days in LEADERBOARD_WINDOWS + (None,)
+    }
+
+
+def test_leaderboard():
+    """
+    Tests if the highest counts come first, ties by the lowest key, and
+    removed counts leave the leaderboard.
+    """
+
+    leaderboard = Leaderboard({1: 2, 2: 1})
+    leaderboard.add(3)
+    leaderboard.add(2, 2)
+    leaderboard.add(1)
+
+    assert leaderboard.top(2) == [(1, 3), (2, 3)]
+    assert leaderboard.top() == [(1, 3), (2, 3), (3, 1)]
+
+    leaderboard.add(3, -1)
+    assert leaderboard.top() == [(1, 3), (2, 3)]
+    assert len(leaderboard) == 2
+
+
+def test_leaderboard_windows_match_charts():
+    """
+    Tests if every named and default chart window is kept in memory.
+    """
+
+    assert set(LEADERBOARD_WINDOWS) == (
+        set(CHART_WINDOWS.values()) | {DEFAULT_WINDOW_DAYS})
+
+
+def test_rebuild_leaderboards(app):
+    """
+    Tests if the leaderboards built from the rollups count each window,
+    and days leave the windows as they move.
+    """
+
+    add_users()
+    for submitter, receiver, day in [
+        (1, 2, datetime(2023, 6, 29)),
+        (1, 2, datetime(2023, 6, 27)),
+        (2, 1, datetime(2023, 6, 10)),
+        (3, 2, datetime(2023, 5, 15)),
+        (2, 3, datetime(2023, 1, 5)),
+        (3, 1, datetime(2022, 12, 1)),
+        (1, 3, datetime(2021, 1, 1)),
+    ]:
+        add_kudo(submitter, receiver, day)
+
+    today = date(2023, 6, 30)
+    rebuild_leaderboards(today)
+
+    def top(leaderboard, days, day=today):
+        return top_entries(leaderboard, days, None, day)
+
+    assert top("receivers", 7) == [(2, 2)]
+    assert top("receivers", 30) == [(2, 2), (1, 1)]
+    assert top("receivers", 90) == [(2, 3), (1, 1)]
+    assert top("receivers", 365) == [(2, 3), (1, 2), (3, 1)]
+    assert top("receivers", None) == [(2, 3), (1, 2), (3, 2)]
+    assert top("submitters", None) == [(1, 3), (2, 2), (3, 2)]
+    assert top("departments", 90) == [(2, 3), (1, 1)]
+    assert top("departments", None) == [(2, 3), (1, 2)]
+
+    # Days leave the windows as they move
+    assert top("receivers", 7, date(2023, 7, 3)) == [(2, 2)]
+    assert top("receivers", 7, date(2023, 7, 4)) == [(2, 1)]
+    assert top("receivers", 30, date(2023, 7, 10)) == [(2, 2)]
+    assert top("receivers", 7, date(2023, 7, 10)) == []
+    assert top("receivers", None, date(2023, 7, 10)) == [
+        (2, 3), (1, 2), (3, 2)]
+
+
+def test_incremental_leaderboards(app):
+    """
+    Tests if kudos of this process and of other processes are added once,
+    also when their ids are committed out of order, matching a rebuild.
+    """
+
+    add_users()
+    rebuild_leaderboards()
+    now = datetime.utcnow()
+
+    kudo = add_kudo(1, 2, now)
+    record_kudo_leaderboards(kudo, 2)
+    assert leaderboards._state["last_kudo_id"] == kudo.id
+    assert top_entries("departments", 7) == [(2, 1)]
+
+    # Created by another process, then a kudo of this process after it
+    add_kudo(3, 1, now)
+    kudo = add_kudo(2, 1, now - timedelta(days=400))
+    record_kudo_leaderboards(kudo, 1)
+    assert top_entries("receivers", None) == [(1, 2), (2, 1)]
+
+    # Ids 4 and 5 are committed after id 6
+    add_kudo(1, 3, now, kudo_id=6)
+    assert top_entries("receivers", 7) == [(1, 1), (2, 1), (3, 1)]
+    add_kudo(2, 3, now, kudo_id=4)
+    kudo = add_kudo(3, 2, now, kudo_id=5)
+    record_kudo_leaderboards(kudo, 2)
+    assert top_entries("receivers", 7) == [(2, 2), (3, 2), (1, 1)]
+
+    incremental = all_entries()
+    reset_leaderboards()
+    rebuild_leaderboards()
+    assert all_entries() == incremental
+
+    # Kudos removed by another process, the leaderboards are rebuilt
+    Kudo.query.delete()
+    rebuild_kudo_rollups()
+    assert top_entries("receivers", None) == []
+
+
+def test_catch_up_on_data_version(app):
+    """
+    Tests if reads only look for new kudos once the data version changed.
+    """
+
+    add_users()
+    add_kudo(1, 2, datetime.utcnow())
+    assert top_entries("receivers") == [(2, 1)]
+
+    statements = []
+
+    def count_statement(*args):
+        statements.append(args[2])
+
+    event.listen(db.engine, "before_cursor_execute", count_statement)
+    try:
+        assert top_entries("receivers") == [(2, 1)]
+        assert len(statements) == 1  # Data version
+
+        add_kudo(3, 2, datetime.utcnow())
+        statements.clear()
+        assert top_entries("receivers") == [(2, 2)]
+        assert any("kudos" in statement for statement in statements)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", count_statement)
+
+
+def test_rebuild_does_not_block_writers(app, monkeypatch):
+    """
+    Tests if a new kudo is recorded while the leaderboards are rebuilt,
+    and the rebuild reads it again once it is swapped in.
+    """
+
+    add_users()
+    rebuild_leaderboards()
+    read_leaderboards = leaderboards._read_leaderboards
+    reading = threading.Event()
+    release = threading.Event()
+
+    def slow_read_leaderboards(today):
+        result = read_leaderboards(today)
+        reading.set()
+        release.wait(5)
+        return result
+
+    monkeypatch.setattr(leaderboards, "_read_leaderboards",
+                        slow_read_leaderboards)
+
+    def rebuild_in_thread():
+        with app.app_context():
+            rebuild_leaderboards()
+
+    rebuild = threading.Thread(target=rebuild_in_thread)
+    rebuild.start()
+    assert reading.wait(5)
+
+    kudo = add_kudo(1, 2, datetime.utcnow())
+    record_kudo_leaderboards(kudo, 2)
+    assert leaderboards._state["last_kudo_id"] == kudo.id
+    release.set()
+    rebuild.join()
+
+    # The rebuild read no kudos, the new one is read by id
+    assert leaderboards._state["last_kudo_id"] == 0
+    assert top_entries("receivers", None) == [(2, 1)]
+
+
+def test_charts_from_leaderboards(app):
+    """
+    Tests if the charts of windows ending today match the rollups.
+    """
+
+    add_users()
+    today = datetime.utcnow()
+    for submitter, receiver, days_ago in [
+        (1, 2, 0), (3, 2, 2), (1, 2, 10), (2, 1, 40), (1, 3, 100),
+        (2, 3, 100), (1, 3, 200), (1, 2, 300),
+    ]:
+        add_kudo(submitter, receiver, today - timedelta(days=days_ago))
+
+    end_date = today.date()
+    for days in LEADERBOARD_WINDOWS:
+        start_date = end_date - timedelta(days=days - 1)
+        receivers = top_receivers(start_date, end_date)
+        data = chart_data("receivers", start_date, end_date)
+        assert data["labels"] == [f"{user.firstname} {user.lastname}"
+                                  for user in receivers]
+        assert data["data"] == [user.count for user in receivers]
+
+        departments = kudos_count_by_department(start_date, end_date)
+        data = chart_data("departments", start_date, end_date)
+        assert data["labels"] == [department.department_name
+                                  for department in departments]
+        assert data["data"] == [department.count
+                                for department in departments]
@@ -0,0 +1,122 @@
+"""
+Tests if login attempts are throttled per IP and email, before the user is
+looked up, and if the rejections are counted.
+"""
+
+# Imports
+from flask import g
+from src import create_app, db
+from src.models import User
+from src.users.login_throttle import (
+    MemoryBucketStore,
+    SQLiteBucketStore,
+    login_throttle_counters,
+    reset_login_throttle,
+)
+from src.users.passwords import hash_password
+
+
+def test_token_buckets(tmp_path):
+    """
+    Tests if the buckets allow a burst, refill over time and evict the
+    least recently used keys, in memory and in the shared store.
+    """
+
+    for store in (MemoryBucketStore(max_keys=2),
+                  SQLiteBucketStore(str(tmp_path / "throttle.db"))):
+        assert store.take("ip:a", 2, 1, now=100) == 0
+        assert store.take("ip:a", 2, 1, now=100) == 0
+        assert store.take("ip:a", 2, 1, now=100) == 1
+        assert store.take("ip:a", 2, 1, now=100.5) == 0.5
+        assert store.take("ip:a", 2, 1, now=101) == 0
+
+        store.increment("rejected_ip")
+        assert store.counters() == {
+            "attempts": 0, "rejected_ip": 1, "rejected_email": 0}
+
+    # The first key is evicted, so it starts again with a full bucket
+    store = MemoryBucketStore(max_keys=2)
+    store.take("ip:a", 1, 1, now=100)
+    store.take("ip:b", 1, 1, now=100)
+    store.take("ip:c", 1, 1, now=100)
+    assert store.take("ip:a", 1, 1, now=100) == 0
+    assert store.take("ip:c", 1, 1, now=100) == 1
+
+
+def test_login_throttle(app):
+    """
+    Tests if attempts over the burst get a 429 without a password check,
+    per email and per IP.
+    """
+
+    db.session.add(User(email="jane@healthtrio.com",
+                        password_hash=hash_password("secret"),
+                        status="active", role="admin"))
+    db.session.commit()
+    app.config.update(LOGIN_THROTTLE_EMAIL_BURST=2,
+                      LOGIN_THROTTLE_IP_BURST=4)
+    client = app.test_client()
+
+    try:
+        for _ in range(2):
+            response = client.post("/login", data={
+                "email": "Jane@healthtrio.com", "password": "wrong"})
+            assert response.status_code == 302
+
+        # The third attempt for the email is rejected, even if correct
+        response = client.post("/login", data={
+            "email": "jane@healthtrio.com", "password": "secret"})
+        assert response.status_code == 429
+        assert int(response.headers["Retry-After"]) == 30
+        assert b"Too many login attempts" in response.data
+
+        # Another email from the same IP, until the IP bucket is empty
+        response = client.post("/login", data={
+            "email": "john@healthtrio.com", "password": "wrong"})
+        assert response.status_code == 302
+        response = client.post("/login", data={
+            "email": "john@healthtrio.com", "password": "wrong"})
+        assert response.status_code == 429
+        assert int(response.headers["Retry-After"]) == 3
+    finally:
+        app.config.update(LOGIN_THROTTLE_EMAIL_BURST=5,
+                          LOGIN_THROTTLE_IP_BURST=20)
+
+    assert login_throttle_counters() == {
+        "attempts": 5, "rejected_ip": 1, "rejected_email": 1}
+
+    # Admins can read the counters
+    g.pop("_login_user", None)
+    with client.session_transaction() as session:
+        session["_user_id"] = "1"
+        session["_fresh"] = True
+    assert client.get("/settings/login_throttle").json["attempts"] == 5
+
+
+def test_login_throttle_behind_proxy(tmp_path):
+    """
+    Tests if clients behind a trusted proxy get their own IP bucket, and
+    the forwarded address is ignored when no proxy is trusted.
+    """
+
+    for x_for, expected in [(1, [302, 302, 302]), (0, [302, 302, 429])]:
+        app = create_app({
+            "TESTING": True,
+            "WTF_CSRF_ENABLED": False,
+            "SECRET_KEY": "testing",
+            "SQLITE_LOCATION": str(tmp_path),
+            "PROXY_FIX_X_FOR": x_for,
+            "LOGIN_THROTTLE_IP_BURST": 2,
+        })
+        with app.app_context():
+            db.create_all()
+            reset_login_throttle()
+            client = app.test_client()
+            statuses = [
+                client.post("/login", data={
+                    "email": f"user{i}@healthtrio.com", "password": "x",
+                }, headers={"X-Forwarded-For": f"10.0.0.{i}"}).status_code
+                for i in range(3)
+            ]
+            reset_login_throttle()
+        assert statuses == expected
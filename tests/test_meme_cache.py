@@ -0,0 +1,149 @@
+"""
+Tests if meme images are fetched once from a local memegen.link stub and
+served from the cache as thumbnails.
+"""
+
+# Imports
+import io
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from PIL import Image
+from src import db
+from src.memes import meme_cache
+from src.kudos.dashboard_cache import KUDOS_DATA, get_data_version
+from src.models import (
+    User,
+    Kudo,
+    Meme,
+)
+
+
+class MemeImageStub(BaseHTTPRequestHandler):
+    """
+    Serves the same 800x600 PNG for every meme image.
+    """
+
+    requests = 0
+
+    def do_GET(self):
+        MemeImageStub.requests += 1
+        image = io.BytesIO()
+        Image.new("RGB", (800, 600), (200, 10, 10)).save(image, "PNG")
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.end_headers()
+        self.wfile.write(image.getvalue())
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def client(app, tmp_path):
+    # Start the stub server
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MemeImageStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    MemeImageStub.requests = 0
+    app.config.update(
+        MEMEGEN_API_URL=f"http://127.0.0.1:{server.server_port}",
+        MEME_CACHE_DIR=str(tmp_path / "meme_cache"),
+        MEME_THUMBNAIL_WIDTH=400,
+    )
+
+    db.session.add(User(email="jane@healthtrio.com", status="active"))
+    db.session.add(Kudo(submitting_user_id=1, receiving_user_id=1))
+    db.session.add(Meme(kudo_id=1, meme_template="buzz",
+                        meme_top_text="top", meme_bottom_text="bottom"))
+    db.session.commit()
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = "1"
+        session["_fresh"] = True
+
+    yield client
+
+    server.shutdown()
+    server.server_close()
+
+
+def test_meme_thumbnail(client):
+    """
+    Tests if the image is fetched once, without changing the dashboard data
+    version, and the thumbnail is served with caching headers.
+    """
+
+    version = get_data_version(KUDOS_DATA)
+    response = client.get("/memes/1/thumbnail")
+    assert response.status_code == 302
+    assert get_data_version(KUDOS_DATA) == version
+    thumbnail_url = response.location
+    assert client.get("/memes/1/thumbnail").location == thumbnail_url
+    assert MemeImageStub.requests == 1
+
+    response = client.get(thumbnail_url)
+    assert response.status_code == 200
+    assert response.cache_control.immutable
+    with Image.open(io.BytesIO(response.data)) as thumbnail:
+        assert thumbnail.size == (400, 300)
+
+    response = client.get(thumbnail_url,
+                          headers={"If-None-Match": response.headers["ETag"]})
+    assert response.status_code == 304
+
+    assert client.get("/memes/thumbnails/400/nope.png").status_code == 404
+
+
+def test_meme_fetched_once_by_concurrent_requests(client, app,
+                                                 monkeypatch):
+    """
+    Tests if requests waiting for a fetch share its lock until the last
+    one is done, so the image is fetched once.
+    """
+
+    download_image = meme_cache._download_image
+    fetching = threading.Event()
+    release = threading.Event()
+
+    def slow_download_image(url):
+        fetching.set()
+        release.wait(5)
+        return download_image(url)
+
+    monkeypatch.setattr(meme_cache, "_download_image", slow_download_image)
+
+    hashes = []
+
+    def cache_in_thread():
+        with app.app_context():
+            hashes.append(meme_cache.cache_meme_image(db.session.get(Meme, 1)))
+
+    threads = [threading.Thread(target=cache_in_thread) for _ in range(3)]
+    threads[0].start()
+    assert fetching.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    while meme_cache._fetch_locks[1][1] < 3:
+        time.sleep(0.01)
+
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert MemeImageStub.requests == 1
+    assert len(set(hashes)) == 1 and hashes[0] is not None
+    assert meme_cache._fetch_locks == {}
+
+
+def test_meme_decompression_bomb(client, monkeypatch):
+    """
+    Tests if an image with too many pixels is refused, not a server error.
+    """
+
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 100)
+
+    assert client.get("/memes/1/thumbnail").status_code == 502
+    assert db.session.get(Meme, 1).image_hash is None
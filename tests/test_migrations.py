@@ -0,0 +1,92 @@
+"""
+Tests if the migrations bring a database created before migrations were
+added to the schema of the models.
+"""
+
+# Imports
+import os
+from flask_migrate import Migrate, check, stamp, upgrade
+from sqlalchemy import inspect
+from src import create_app, db
+from src.database.database import include_in_migrations
+
+
+# Migrations folder of the app
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)),
+                              "migrations")
+
+# Tables and columns of the database before migrations were added
+AUDIT_COLUMNS = ["created_date", "created_by", "updated_date", "updated_by"]
+BASELINE_COLUMNS = {
+    "departments": ["id", "name"] + AUDIT_COLUMNS,
+    "users": ["id", "department_id", "email", "password_hash", "firstname",
+              "lastname", "role", "status"] + AUDIT_COLUMNS,
+    "kudos": ["id", "submitting_user_id", "receiving_user_id",
+              "kudo_message"] + AUDIT_COLUMNS,
+    "memes": ["id", "kudo_id", "meme_template", "meme_top_text",
+              "meme_bottom_text", "meme_url"] + AUDIT_COLUMNS,
+}
+
+
+def migrated_app(tmp_path):
+    """
+    Returns an app with migrations on its own empty database.
+    """
+
+    app = create_app({"TESTING": True, "SQLITE_LOCATION": str(tmp_path)})
+    Migrate(app, db, directory=MIGRATIONS_DIR,
+            include_name=include_in_migrations)
+    return app
+
+
+def test_initial_revision_is_baseline(tmp_path):
+    """
+    Tests if the initial revision creates the baseline tables only.
+    """
+
+    with migrated_app(tmp_path).app_context():
+        upgrade(MIGRATIONS_DIR, "00a7a50a6526")
+        inspector = inspect(db.engine)
+        assert set(inspector.get_table_names()) == (
+            set(BASELINE_COLUMNS) | {"alembic_version"})
+        for table, columns in BASELINE_COLUMNS.items():
+            assert [column["name"] for column
+                    in inspector.get_columns(table)] == columns
+
+
+def test_upgrade_baseline_database(tmp_path):
+    """
+    Tests if a baseline database stamped with the initial revision, as the
+    README describes, is upgraded to the schema of the models.
+    """
+
+    with migrated_app(tmp_path).app_context():
+        # The initial revision without its version table
+        upgrade(MIGRATIONS_DIR, "00a7a50a6526")
+        with db.engine.begin() as connection:
+            connection.execute(db.text("DROP TABLE alembic_version"))
+
+        stamp(MIGRATIONS_DIR, "00a7a50a6526")
+        upgrade(MIGRATIONS_DIR)
+        check(MIGRATIONS_DIR)
+        assert "kudo_rollup_receivers" in inspect(db.engine).get_table_names()
+
+
+def test_search_indexes_match_models(app, tmp_path):
+    """
+    Tests if the migrations create the same search tables and triggers as
+    the models, which create them with the other tables.
+    """
+
+    def search_objects(engine):
+        with engine.connect() as connection:
+            return set(connection.execute(db.text(
+                "SELECT type, name FROM sqlite_master "
+                "WHERE type = 'trigger' OR name LIKE '%search%'"
+            )))
+
+    created = search_objects(db.engine)
+    with migrated_app(tmp_path).app_context():
+        upgrade(MIGRATIONS_DIR)
+        assert search_objects(db.engine) == created
+    assert ("table", "user_search_vocab") in created
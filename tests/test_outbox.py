@@ -0,0 +1,166 @@
+"""
+Tests if outbox emails are delivered, retried and dead-lettered.
+"""
+
+# Imports
+from datetime import datetime, timedelta
+import pytest
+from flask_mail import Connection
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+from src import db, mail
+from src.models import OutboxEmail
+from src.outbox.outbox import (
+    queue_email,
+    send_outbox_batch,
+    redact_outbox_emails,
+    requeue_dead_emails,
+)
+
+
+def queue_test_email():
+    """
+    Queues and commits a test email.
+    """
+
+    email = queue_email("KudoTrio - Test", recipients=["a@healthtrio.com"],
+                        body="Hello")
+    db.session.commit()
+    return email
+
+
+def make_due(email):
+    """
+    Makes a scheduled retry due right away.
+    """
+
+    email.next_attempt_date = datetime.utcnow()
+    db.session.commit()
+
+
+def test_outbox_sends_email(app):
+    """
+    Tests if a queued email is sent and marked as sent.
+    """
+
+    email = queue_test_email()
+
+    with mail.record_messages() as outbox:
+        assert send_outbox_batch() == 1
+
+    assert [msg.subject for msg in outbox] == ["KudoTrio - Test"]
+    assert email.status == "sent"
+    assert email.body is None
+    assert send_outbox_batch() == 0
+
+
+def test_outbox_retries_and_dead_letters(app, monkeypatch):
+    """
+    Tests if a failing email backs off and ends up dead.
+    """
+
+    def failing_send(self, message, envelope_from=None):
+        raise ConnectionError("SMTP is down")
+
+    monkeypatch.setattr(Connection, "send", failing_send)
+    app.config.update(OUTBOX_MAX_ATTEMPTS=3, OUTBOX_BACKOFF_SECONDS=30)
+    email = queue_test_email()
+
+    # First failure - retried later with backoff
+    send_outbox_batch()
+    assert email.status == "pending"
+    assert email.attempts == 1
+    assert email.next_attempt_date > datetime.utcnow()
+    assert send_outbox_batch() == 0
+
+    # Last failure - dead
+    make_due(email)
+    send_outbox_batch()
+    make_due(email)
+    send_outbox_batch()
+    assert email.status == "dead"
+    assert email.last_error == "SMTP is down"
+    assert OutboxEmail.query.filter_by(status="dead").count() == 1
+
+
+def test_outbox_commits_each_email(app, monkeypatch):
+    """
+    Tests if emails sent before a worker crash stay sent, and an email
+    that crashes the worker uses up its attempts.
+    """
+
+    send = Connection.send
+
+    def crashing_send(self, message, envelope_from=None):
+        if message.subject == "KudoTrio - Crash":
+            raise KeyboardInterrupt()
+        return send(self, message, envelope_from)
+
+    monkeypatch.setattr(Connection, "send", crashing_send)
+    app.config.update(OUTBOX_MAX_ATTEMPTS=1)
+    sent = queue_test_email()
+    crash = queue_email("KudoTrio - Crash", recipients=["b@healthtrio.com"],
+                        body="Boom")
+    db.session.commit()
+
+    with mail.record_messages():
+        with pytest.raises(KeyboardInterrupt):
+            send_outbox_batch()
+    db.session.rollback()
+
+    assert sent.status == "sent"
+    assert crash.status == "sending"
+    assert crash.attempts == 1
+
+    # Once the lease runs out, the email is dead instead of sent again
+    make_due(crash)
+    assert send_outbox_batch() == 0
+    assert crash.status == "dead"
+
+
+def test_outbox_database_error(app, monkeypatch):
+    """
+    Tests if an email is retried when saving it as sent fails, and the
+    session can be used again afterwards.
+    """
+
+    def failing_flush(session, flush_context, instances):
+        if any(email.status == "sent" for email in session.dirty
+               if isinstance(email, OutboxEmail)):
+            raise OperationalError("UPDATE", {}, Exception("disk I/O error"))
+
+    app.config.update(OUTBOX_MAX_ATTEMPTS=3)
+    event.listen(db.session, "before_flush", failing_flush)
+    try:
+        email = queue_test_email()
+        with mail.record_messages() as outbox:
+            assert send_outbox_batch() == 1
+    finally:
+        event.remove(db.session, "before_flush", failing_flush)
+
+    assert len(outbox) == 1
+    assert email.status == "pending"
+    assert email.attempts == 1
+    assert "disk I/O error" in email.last_error
+
+
+def test_outbox_redacts_dead_emails(app):
+    """
+    Tests if dead emails lose their body after the retention and are then
+    no longer requeued.
+    """
+
+    app.config.update(OUTBOX_MAX_ATTEMPTS=1, OUTBOX_DEAD_RETENTION_HOURS=72)
+    recent = queue_test_email()
+    old = queue_test_email()
+    for email in (recent, old):
+        email.status = "dead"
+    old.created_date = datetime.utcnow() - timedelta(hours=73)
+    db.session.commit()
+
+    assert redact_outbox_emails() == 1
+    assert recent.body == "Hello"
+    assert old.body is None
+    assert requeue_dead_emails() == 1
+    assert recent.status == "pending"
+    assert old.status == "dead"
@@ -0,0 +1,115 @@
+"""
+Tests if passwords are hashed in the process pool, a full pool is refused
+and outdated hashes are replaced at login.
+"""
+
+# Imports
+import pytest
+from werkzeug.security import generate_password_hash
+from src import db
+from src.models import User
+from src.users.passwords import (
+    PasswordHasherBusy,
+    _executor,
+    check_password,
+    hash_password,
+    needs_rehash,
+)
+
+
+def test_hash_and_check_password(app):
+    """
+    Tests if the hashes use the configured parameters, in the pool and
+    inline.
+    """
+
+    password_hash = hash_password("secret")
+    assert password_hash.startswith("pbkdf2:sha256:1000$")
+    assert check_password(password_hash, "secret")
+    assert not check_password(password_hash, "wrong")
+    assert not check_password(None, "secret")
+    assert not needs_rehash(password_hash)
+
+    # The pool processes are not forked from this threaded process
+    executor, _ = _executor(2, 32)
+    assert executor._mp_context.get_start_method() != "fork"
+
+    app.config["PASSWORD_HASH_WORKERS"] = 0
+    try:
+        assert check_password(hash_password("secret"), "secret")
+    finally:
+        app.config["PASSWORD_HASH_WORKERS"] = 2
+
+
+def test_needs_rehash(app):
+    """
+    Tests if hashes with other parameters are outdated.
+    """
+
+    assert needs_rehash(generate_password_hash("secret",
+                                               "pbkdf2:sha256:500"))
+    assert needs_rehash(generate_password_hash("secret",
+                                               "pbkdf2:sha256:1000", 8))
+    assert needs_rehash("not a hash")
+
+    app.config["PASSWORD_HASH_METHOD"] = "pbkdf2"
+    try:
+        assert not needs_rehash(generate_password_hash("secret",
+                                                       "pbkdf2:sha256:500"))
+    finally:
+        app.config["PASSWORD_HASH_METHOD"] = "pbkdf2:sha256:1000"
+
+
+def test_full_pool(app):
+    """
+    Tests if a hash is refused with a 503 when the pool is full.
+    """
+
+    db.session.add(User(email="jane@healthtrio.com",
+                        password_hash=hash_password("secret"),
+                        status="active"))
+    db.session.commit()
+
+    app.config["PASSWORD_HASH_QUEUE_SIZE"] = 1
+    _, slots = _executor(2, 1)
+    slots.acquire()
+    try:
+        with pytest.raises(PasswordHasherBusy) as error:
+            hash_password("secret")
+        assert error.value.code == 503
+        assert error.value.get_response().headers["Retry-After"] == "2"
+
+        response = app.test_client().post("/login", data={
+            "email": "jane@healthtrio.com", "password": "secret",
+        }, follow_redirects=True)
+        assert b"The server is busy" in response.data
+    finally:
+        slots.release()
+        app.config["PASSWORD_HASH_QUEUE_SIZE"] = 32
+
+
+def test_rehash_on_login(app):
+    """
+    Tests if an outdated hash is replaced after a successful login only.
+    """
+
+    outdated = generate_password_hash("secret", "pbkdf2:sha256:500")
+    db.session.add(User(email="jane@healthtrio.com", password_hash=outdated,
+                        status="active"))
+    db.session.commit()
+    client = app.test_client()
+
+    response = client.post("/login", data={
+        "email": "jane@healthtrio.com", "password": "wrong",
+    }, follow_redirects=True)
+    assert b"Invalid email or password." in response.data
+    assert db.session.get(User, 1).password_hash == outdated
+
+    response = client.post("/login", data={
+        "email": "jane@healthtrio.com", "password": "secret",
+    }, follow_redirects=True)
+    assert b"Login successful." in response.data
+    db.session.expire_all()
+    password_hash = db.session.get(User, 1).password_hash
+    assert password_hash.startswith("pbkdf2:sha256:1000$")
+    assert check_password(password_hash, "secret")
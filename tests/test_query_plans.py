@@ -0,0 +1,104 @@
+"""
+Tests if the main kudo queries are served by indexes.
+The queries are captured while they run and then explained with
+EXPLAIN QUERY PLAN, so the check follows the queries as they change.
+"""
+
+# Imports
+from datetime import date, datetime
+import pytest
+from sqlalchemy import event
+from src import db
+from src.kudos.kudo_feed import kudo_feed, profile_kudo_feeds
+from src.kudos.rollups import (
+    kudos_count_by_period,
+    top_receivers,
+    top_submitters,
+    kudos_count_by_department,
+)
+
+
+# Main queries
+START_DATE = date(2023, 1, 1)
+END_DATE = date(2023, 6, 30)
+CURSOR = (datetime(2023, 6, 1), 100)
+MAIN_QUERIES = {
+    "kudo feed": lambda: kudo_feed().all(),
+    "profile - kudos": lambda: profile_kudo_feeds(1),
+    "kudo feed - submitter": lambda: kudo_feed(
+        submitting_user_id=1).all(),
+    "kudo feed - receiver": lambda: kudo_feed(
+        receiving_user_id=1).all(),
+    "kudo feed - next page": lambda: kudo_feed(before=CURSOR).all(),
+    "kudo feed - department": lambda: kudo_feed(
+        department_id=1, before=CURSOR).all(),
+    "profile - kudos received next page": lambda: kudo_feed(
+        receiving_user_id=1, before=CURSOR).all(),
+    "dashboard - count": lambda: kudos_count_by_period(
+        START_DATE, END_DATE),
+    "dashboard - top receivers": lambda: top_receivers(
+        START_DATE, END_DATE),
+    "dashboard - top submitters": lambda: top_submitters(
+        START_DATE, END_DATE),
+    "dashboard - departments": lambda: kudos_count_by_department(
+        START_DATE, END_DATE),
+}
+
+
+def capture_statements(run_query):
+    """
+    Runs the query function and returns every statement it executed.
+    """
+
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(db.engine, "before_cursor_execute", capture)
+    try:
+        run_query()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", capture)
+
+    return statements
+
+
+def full_table_scans(statement, parameters):
+    """
+    Returns the query plan steps that read a whole table.
+    Walking an index is only accepted when it also gives the ORDER BY,
+    so a LIMIT can stop early; otherwise it is a full scan as well.
+    Reading the rows of a subquery is not a table scan.
+    """
+
+    plan = [
+        row.detail for row in db.session.connection().exec_driver_sql(
+            "EXPLAIN QUERY PLAN " + statement, parameters
+        )
+    ]
+    sorts_rows = "USE TEMP B-TREE FOR ORDER BY" in plan
+    subquery_scans = {
+        "SCAN " + detail.split()[-1] for detail in plan
+        if detail.startswith(("CO-ROUTINE", "MATERIALIZE"))
+    }
+
+    return [
+        detail for detail in plan
+        if detail.startswith("SCAN")
+        and detail not in subquery_scans
+        and ("INDEX" not in detail or sorts_rows)
+    ]
+
+
+@pytest.mark.parametrize("name", MAIN_QUERIES)
+def test_query_plan(app, name):
+    """
+    Tests if the query runs without a full table scan.
+    """
+
+    statements = capture_statements(MAIN_QUERIES[name])
+    assert statements
+
+    for statement, parameters in statements:
+        assert full_table_scans(statement, parameters) == [], statement
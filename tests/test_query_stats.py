@@ -0,0 +1,101 @@
+"""
+Tests if the queries of a request are reported in the Server-Timing header
+and slow or repeated queries are logged.
+"""
+
+# Imports
+import logging
+import pytest
+from src import create_app, db
+from src.models import User
+from src.database.query_stats import statement_summary
+
+
+@pytest.fixture
+def client(app):
+    db.session.add(User(email="jane@healthtrio.com", status="active"))
+    db.session.commit()
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = "1"
+        session["_fresh"] = True
+    return client
+
+
+def test_statement_summary():
+    """
+    Tests if statements are summarized without their values.
+    """
+
+    assert statement_summary(
+        "SELECT users.id FROM users WHERE users.email = ?") == "SELECT users"
+    assert statement_summary(
+        'INSERT INTO "kudos" (kudo_message) VALUES (?)') == "INSERT kudos"
+    assert statement_summary("UPDATE data_versions SET version=?") == (
+        "UPDATE data_versions")
+    assert statement_summary("PRAGMA foreign_keys") == "PRAGMA"
+
+
+def test_server_timing(app, client):
+    """
+    Tests if the query count, database time and slowest statements are sent
+    once enabled.
+    """
+
+    assert not app.config["SERVER_TIMING"]
+    assert "Server-Timing" not in client.get("/kudos").headers
+
+    app.config["SERVER_TIMING"] = True
+    try:
+        response = client.get("/kudos")
+    finally:
+        app.config["SERVER_TIMING"] = False
+    assert response.status_code == 200
+    metrics = response.headers["Server-Timing"].split(", ")
+    assert metrics[0].startswith("db;dur=")
+    assert metrics[0].endswith('queries"')
+    assert metrics[1].startswith("db-1;dur=")
+    assert metrics[-1].startswith("app;dur=")
+
+
+def test_slow_and_repeated_queries(app, client, caplog):
+    """
+    Tests if slow statements and repeated statements are logged.
+    """
+
+    app.config.update(SLOW_QUERY_THRESHOLD_MS=1e-6, N_PLUS_ONE_THRESHOLD=1)
+    try:
+        with caplog.at_level(logging.WARNING):
+            client.get("/kudos")
+    finally:
+        app.config.update(SLOW_QUERY_THRESHOLD_MS=200, N_PLUS_ONE_THRESHOLD=10)
+
+    slow = [record for record in caplog.records
+            if record.name.endswith("slow_queries")]
+    assert slow
+    assert "kudos.kudos_landing_page" in slow[0].getMessage()
+    assert any("Possible N+1 queries in kudos.kudos_landing_page"
+               in record.getMessage() for record in caplog.records)
+
+
+def test_slow_query_log_handler(tmp_path):
+    """
+    Tests if apps created again in the process share one slow query log
+    handler.
+    """
+
+    log_path = str(tmp_path / "slow_queries.log")
+    for _ in range(3):
+        app = create_app({"TESTING": True, "SQLITE_LOCATION": str(tmp_path),
+                          "SLOW_QUERY_LOG": log_path})
+
+    logger = app.logger.getChild("slow_queries")
+    handlers = [handler for handler in logger.handlers
+                if getattr(handler, "baseFilename", None) == log_path]
+    try:
+        assert len(handlers) == 1
+    finally:
+        for handler in handlers:
+            logger.removeHandler(handler)
+            handler.close()
@@ -0,0 +1,143 @@
+"""
+Tests if the kudo dashboard rollups match the kudos table.
+"""
+
+# Imports
+from datetime import date, datetime, timedelta
+from sqlalchemy.dialects import mysql, postgresql
+from src import db
+from src.models import (
+    User,
+    Departments,
+    Kudo,
+    KudoReceiverRollup,
+    KudoSubmitterRollup,
+    KudoDepartmentRollup,
+    KudoUserCount,
+    DataVersion,
+)
+from src.database.upsert import upsert_statement
+from src.kudos.dashboard_cache import bump_data_version
+from src.kudos.rollups import (
+    _increment_rollup,
+    _increment_user_count,
+    record_kudo_rollups,
+    rebuild_kudo_rollups,
+    kudos_count_by_period,
+    top_receivers,
+    kudos_count_by_department,
+)
+
+
+def rollup_rows():
+    """
+    Returns the content of every rollup table and of the user kudo counts.
+    """
+
+    user_counts = sorted(
+        (row.user_id, row.sent_count, row.received_count)
+        for row in KudoUserCount.query.all()
+    )
+    return [user_counts] + [
+        sorted(
+            (row.day, getattr(row, key), row.count)
+            for row in model.query.all()
+        )
+        for model, key in [
+            (KudoReceiverRollup, "user_id"),
+            (KudoSubmitterRollup, "user_id"),
+            (KudoDepartmentRollup, "department_id"),
+        ]
+    ]
+
+
+def test_rollups(app):
+    """
+    Tests if incremental rollups match a full rebuild.
+    """
+
+    # Departments and users
+    db.session.add_all([Departments(name="IT"), Departments(name="HR")])
+    db.session.add_all([
+        User(email="a@healthtrio.com", firstname="Ann", lastname="A",
+             department_id=1),
+        User(email="b@healthtrio.com", firstname="Bob", lastname="B",
+             department_id=2),
+        User(email="c@healthtrio.com", firstname="Cat", lastname="C"),
+    ])
+    db.session.commit()
+
+    # Kudos created through the write path
+    now = datetime.utcnow()
+    for i, (submitter, receiver) in enumerate(
+        [(1, 2), (2, 1), (3, 1), (1, 2), (2, 3), (3, 2)]
+    ):
+        kudo = Kudo(submitting_user_id=submitter,
+                    receiving_user_id=receiver,
+                    kudo_message="Thanks!",
+                    created_date=now - timedelta(days=i * 20))
+        db.session.add(kudo)
+        db.session.flush()
+        record_kudo_rollups(kudo)
+    db.session.commit()
+
+    incremental = rollup_rows()
+    rebuild_kudo_rollups()
+    assert rollup_rows() == incremental
+    assert incremental[0] == [(1, 2, 2), (2, 2, 3), (3, 2, 1)]
+
+    # Dashboard reads
+    start_date = (now - timedelta(days=120)).date()
+    end_date = now.date()
+    monthly_counts = kudos_count_by_period(start_date, end_date, "month")
+    assert sum(count for _, count in monthly_counts) == 6
+    assert len(monthly_counts) in (5, 6)
+    weekly_counts = kudos_count_by_period(start_date, end_date, "week")
+    assert sum(count for _, count in weekly_counts) == 6
+    assert len(weekly_counts) in (18, 19)
+    top_receiver = top_receivers(start_date, end_date)[0]
+    assert (top_receiver.firstname, top_receiver.count) == ("Bob", 3)
+    department_counts = {
+        row.department_name: row.count
+        for row in kudos_count_by_department(start_date, end_date)
+    }
+    assert department_counts == {"IT": 2, "HR": 3}
+
+
+def test_rollup_rows_created_twice(app):
+    """
+    Tests if two writes creating the same rollup, user count and data
+    version rows add up instead of failing, on every database.
+    """
+
+    db.session.add(User(email="a@healthtrio.com"))
+    db.session.commit()
+
+    day = date(2023, 6, 30)
+    for _ in range(2):
+        _increment_rollup(KudoReceiverRollup, day=day, user_id=1)
+        _increment_user_count(1, KudoUserCount.received_count)
+        bump_data_version("test")
+    db.session.commit()
+
+    assert db.session.get(KudoReceiverRollup, (day, 1)).count == 2
+    assert db.session.get(KudoUserCount, 1).received_count == 2
+    assert db.session.get(DataVersion, "test").version == 2
+
+    # Server databases settle concurrent inserts in the statement itself
+    for dialect, clause in [
+        (postgresql.dialect(),
+         "ON CONFLICT (day, user_id) DO UPDATE "
+         "SET count = (kudo_rollup_receivers.count + %(count_1)s)"),
+        (mysql.dialect(),
+         "ON DUPLICATE KEY UPDATE "
+         "count = (kudo_rollup_receivers.count + %s)"),
+    ]:
+        statement = upsert_statement(
+            dialect.name, KudoReceiverRollup,
+            {"day": day, "user_id": 1, "count": 1},
+            {KudoReceiverRollup.count: KudoReceiverRollup.count + 1},
+        )
+        compiled = statement.compile(dialect=dialect)
+        assert str(compiled).endswith(") " + clause)
+        assert list(compiled.params.values())[-1] == 1
@@ -0,0 +1,88 @@
+"""
+Tests if seed_db builds the same skewed dataset for the same seed.
+"""
+
+# Imports
+from collections import Counter
+from datetime import datetime
+from src import db
+from src.models import (
+    User,
+    Departments,
+    Kudo,
+)
+from src.cli_commands.seed import seed_database
+from src.kudos.kudo_search import search_kudos
+
+
+def dataset():
+    """
+    Returns the seeded users and kudos, without their creation dates.
+    """
+
+    users = [
+        (user.id, user.department_id, user.email, user.firstname,
+         user.lastname, user.status)
+        for user in User.query.order_by(User.id)
+    ]
+    kudos = [
+        (kudo.id, kudo.submitting_user_id, kudo.receiving_user_id,
+         kudo.kudo_message)
+        for kudo in Kudo.query.order_by(Kudo.id)
+    ]
+    return users, kudos
+
+
+def test_seed_database(app):
+    """
+    Tests the row counts, the skew, the shared password hash, the search
+    index and that the same seed gives the same data.
+    """
+
+    counts = seed_database(users=200, departments=12, kudos=5000, seed=42,
+                           batch_size=1000)
+    assert counts == {"departments": 12, "users": 201, "kudos": 5000}
+    assert Departments.query.count() == 12
+    assert User.query.count() == 201
+    assert Kudo.query.count() == 5000
+
+    first = dataset()
+
+    # Kudos go between two different active users, oldest first
+    kudos = Kudo.query.order_by(Kudo.id).all()
+    assert all(k.submitting_user_id != k.receiving_user_id for k in kudos)
+    inactive = {user.id for user in User.query.filter_by(status="inactive")}
+    assert inactive
+    assert not any(k.submitting_user_id in inactive
+                   or k.receiving_user_id in inactive for k in kudos)
+    assert [k.created_date for k in kudos] == sorted(
+        k.created_date for k in kudos)
+    assert kudos[-1].created_date <= datetime.utcnow()
+
+    # A few users receive most kudos
+    received = Counter(k.receiving_user_id for k in kudos)
+    assert sum(count for _, count in received.most_common(20)) > 2500
+
+    # Every seeded user shares one hash, the admin user has its own
+    hashes = {
+        user.password_hash for user in
+        User.query.filter(User.email != "admin@healthtrio.com")
+    }
+    assert len(hashes) == 1
+    admin = User.query.filter_by(email="admin@healthtrio.com").one()
+    assert admin.check_password("admin@healthtrio.com")
+
+    # The search index is rebuilt and kept up to date again
+    word = kudos[0].kudo_message.split()[0].strip(".")
+    assert search_kudos(word)[0]
+    db.session.add(Kudo(submitting_user_id=1, receiving_user_id=2,
+                        kudo_message="Zyzzyva thanks"))
+    db.session.commit()
+    assert len(search_kudos("zyzzyva")[0]) == 1
+
+    # The same seed builds the same data
+    db.drop_all()
+    db.create_all()
+    seed_database(users=200, departments=12, kudos=5000, seed=42,
+                  batch_size=1000)
+    assert dataset() == first
@@ -0,0 +1,61 @@
+"""
+Tests if `flask serve` sets up Gunicorn to preload the app, recycle workers
+and build the app again on reload.
+"""
+
+# Imports
+from flask import Flask
+from src.cli_commands.server import (
+    KudoTrioServer,
+    _post_fork,
+    server_options,
+)
+
+
+def test_server_options(app):
+    """
+    Tests if the options are passed to Gunicorn with the preloaded app.
+    """
+
+    assert "serve" in app.cli.commands
+
+    server = KudoTrioServer(server_options(
+        bind="127.0.0.1:8001", workers=3, threads=4, max_requests=500,
+        max_requests_jitter=50, timeout=60, graceful_timeout=20,
+    ))
+    assert server.cfg.bind == ["127.0.0.1:8001"]
+    assert server.cfg.workers == 3
+    assert server.cfg.threads == 4
+    assert server.cfg.worker_class_str == "gthread"
+    assert server.cfg.max_requests == 500
+    assert server.cfg.graceful_timeout == 20
+    assert server.cfg.preload_app
+    assert server.cfg.post_fork is _post_fork
+
+    assert KudoTrioServer(server_options(
+        bind="127.0.0.1:8001", workers=1, threads=1, max_requests=0,
+        max_requests_jitter=0, timeout=30, graceful_timeout=30,
+    )).cfg.worker_class_str == "sync"
+
+
+def test_server_reload(app, monkeypatch, tmp_path):
+    """
+    Tests if a reload builds a new app for the new workers.
+    """
+
+    monkeypatch.setenv("SQLITE_LOCATION", str(tmp_path))
+    monkeypatch.setenv("FLASK_RUN_FROM_CLI", "true")
+    server = KudoTrioServer(server_options(
+        bind="127.0.0.1:8001", workers=1, threads=1, max_requests=0,
+        max_requests_jitter=0, timeout=30, graceful_timeout=30,
+    ))
+
+    first = server.wsgi()
+    assert isinstance(first, Flask)
+    # The web workers do not set up the migration commands
+    assert "migrate" not in first.extensions
+    assert server.wsgi() is first
+
+    server.reload()
+    assert server.wsgi() is not first
+    assert server.cfg.preload_app
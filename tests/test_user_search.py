@@ -0,0 +1,82 @@
+"""
+Tests if users are found by the typeahead search as they change.
+"""
+
+# Imports
+from src import db
+from src.models import (
+    User,
+    Departments,
+)
+from src.users.user_search import search_users, _edit_distance
+
+
+def found_ids(query, **kwargs):
+    """
+    Returns the IDs of the users found by the search.
+    """
+
+    return [user.id for user in search_users(query, **kwargs)]
+
+
+def test_search_users(app):
+    """
+    Tests prefix matching, the department and status of the users and the
+    fallback to users matching any of the words.
+    """
+
+    db.session.add_all([
+        Departments(name="Engineering"),
+        Departments(name="HR"),
+    ])
+    db.session.add_all([
+        User(email="jane.doe@healthtrio.com", firstname="Jane",
+             lastname="Doe", department_id=1, status="active"),
+        User(email="john.smith@healthtrio.com", firstname="John",
+             lastname="Smith", department_id=2, status="active"),
+        User(email="jo@healthtrio.com", firstname="Joan", lastname="Ames",
+             department_id=1, status="inactive"),
+    ])
+    db.session.commit()
+
+    assert found_ids("j") == [1, 2]
+    assert found_ids("j", exclude_user_id=1) == [2]
+    assert found_ids("john hr") == [2]
+    assert found_ids("xyz jane") == [1]
+    assert found_ids('") OR *') == []
+
+    # The index follows renamed users and departments
+    db.session.get(Departments, 1).name = "Platform"
+    db.session.get(User, 2).lastname = "Jones"
+    db.session.commit()
+    assert found_ids("plat") == [1]
+    assert found_ids("jones") == [2]
+
+
+def test_search_users_with_typos(app):
+    """
+    Tests if users are found with a typo in a word when no word starts
+    with the terms, and short words are not matched loosely.
+    """
+
+    assert _edit_distance("jonh", "john") == 1
+    assert _edit_distance("smiht", "smith") == 1
+    assert _edit_distance("jane", "joan") == 2
+
+    db.session.add_all([
+        User(email="john.smith@healthtrio.com", firstname="John",
+             lastname="Smith", status="active"),
+        User(email="jane.doe@healthtrio.com", firstname="Jane",
+             lastname="Doe", status="active"),
+        User(email="kate.jonhson@healthtrio.com", firstname="Kate",
+             lastname="Jonhson", status="active"),
+    ])
+    db.session.commit()
+
+    assert found_ids("jonh") == [3]
+    assert found_ids("jhon") == [1, 3]
+    assert found_ids("jhon smiht") == [1]
+    assert found_ids("smitt") == [1]
+    assert found_ids("jnae") == [2]
+    assert found_ids("jx") == []
+    assert found_ids("zzzz") == []